@@ -0,0 +1,314 @@
+"""
+A reproducible load test of the web-api.  Drives concurrent voter
+journeys:
+
+    get_blank_ballot -> cast_ballot -> verify_ballot_receipt
+        -> show_contest -> tally_contests
+
+either in-process against main:app (via the httpx ASGI transport, with
+the app lifespan running) or against a running server (--url).  The
+in-process run uses the --backend: the static mock data (mock), the
+latency realistic simulation (simulated, see simulated_backend.py), or
+a scratch copy of the ElectionData deployment the VoteTrackerPlus
+configuration points at (live): its upstream and generic workspace are
+cloned to a temporary directory, which the run points the configuration
+at and removes afterwards, so that the cast ballots do not pollute the
+real election.
+
+Reports the p50/p95/p99 latency and the throughput per endpoint, and
+writes the results as JSON (--output) so that releases can be compared.
+Run it from the src/vtp/web/api directory (after a make conjoin), for
+example via 'make bench'.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+import httpx
+
+
+def percentile(samples: list, fraction: float) -> float:
+    """Return the nearest rank percentile of the sorted samples"""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def choice_name(choice) -> str:
+    """Return the name of a choice - either a name or a dict with a name"""
+    return choice["name"] if isinstance(choice, dict) else choice
+
+
+def fill_ballot(blank_ballot: dict, rng: random.Random) -> dict:
+    """Return the blank ballot with random selections in every contest"""
+    ballot = json.loads(json.dumps(blank_ballot))
+    for contests in ballot.get("contests", {}).values():
+        for contest in contests:
+            for body in contest.values():
+                choices = list(enumerate(body.get("choices", [])))
+                if body.get("tally") == "rcv":
+                    count = rng.randint(1, len(choices)) if choices else 0
+                else:
+                    count = min(body.get("max", 1), len(choices))
+                body["selection"] = [
+                    f"{index}: {choice_name(choice)}"
+                    for index, choice in rng.sample(choices, count)
+                ]
+    return ballot
+
+
+class Recorder:
+    """Records the per endpoint latencies and errors"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    async def call(
+        self, client, endpoint: str, method: str, url: str, check=None, **kwargs
+    ):
+        """
+        Return the JSON response of a request, or None on an error - a
+        response failing check(response) being one
+        """
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            ok = response.status_code == 200 and "webapi_error" not in response.text
+            ok = ok and (check is None or bool(check(response.json())))
+        except (httpx.HTTPError, ValueError):
+            ok = False
+        self.latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            return None
+        return response.json()
+
+    def report(self, elapsed: float) -> dict:
+        """Return the per endpoint latency percentiles and throughput"""
+        report = {}
+        for endpoint, samples in self.latencies.items():
+            samples.sort()
+            report[endpoint] = {
+                "requests": len(samples),
+                "errors": self.errors.get(endpoint, 0),
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "mean_ms": round(statistics.fmean(samples) * 1000, 2),
+                "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+                "max_ms": round(samples[-1] * 1000, 2),
+            }
+        return report
+
+
+async def journey(client, recorder: Recorder, rng: random.Random) -> bool:
+    """Run one voter journey - returns whether it completed"""
+    blank = await recorder.call(
+        client, "get_blank_ballot", "GET", "/web-api/get_blank_ballot"
+    )
+    if blank is None:
+        return False
+    receipt = await recorder.call(
+        client,
+        "cast_ballot",
+        "POST",
+        "/web-api/cast_ballot",
+        json=fill_ballot(blank["blank_ballot"], rng),
+    )
+    if receipt is None:
+        return False
+    vote_store_id = receipt["vote_store_id"]
+    ballot_check = receipt["ballot_check"]
+    row = receipt["ballot_row"]
+    if (
+        await recorder.call(
+            client,
+            "verify_ballot_receipt",
+            "GET",
+            f"/web-api/verify_ballot_receipt/{vote_store_id}",
+            json={"ballot_check": ballot_check, "row_index": row},
+        )
+        is None
+    ):
+        return False
+    # the header row holds the "<uid> - <name>" contest labels and the
+    # voter's row the digests
+    contest = rng.randrange(len(ballot_check[0]))
+    uid = quote(ballot_check[0][contest].split(" - ")[0], safe="")
+    digest = ballot_check[int(row)][contest]
+    if (
+        await recorder.call(
+            client,
+            "show_contest",
+            "GET",
+            f"/web-api/show_contest/{vote_store_id}/{digest}",
+        )
+        is None
+    ):
+        return False
+    return (
+        await recorder.call(
+            client,
+            "tally_contests",
+            "GET",
+            f"/web-api/tally_contests/{vote_store_id}/{uid}/{digest}/3",
+            check=lambda body: body.get("tally_election_stdout"),
+        )
+        is not None
+    )
+
+
+async def voter(client, recorder: Recorder, rng: random.Random, journeys: list):
+    """Run journeys until none are left"""
+    while journeys:
+        journeys.pop()
+        await journey(client, recorder, rng)
+
+
+def git(path: str, *args) -> str:
+    """Return the stdout of a git command run in path"""
+    return subprocess.run(
+        ["git", *args], cwd=path, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+@contextlib.contextmanager
+def scratch_election_data():
+    """
+    Point the VoteTrackerPlus configuration at a scratch copy of its
+    ElectionData deployment for the duration of the with block: the
+    upstream is cloned (bare) and the generic workspace cloned from it
+    at the same paths relative to the runtime location, in a temporary
+    directory that is removed afterwards.
+    """
+    # pylint: disable=import-outside-toplevel,import-error,protected-access
+    from vtp.core.common import Globals
+    from vtp.core.webapi import WebAPI
+
+    runtime = Globals.get("DEFAULT_RUNTIME_LOCATION")
+    top = git(WebAPI.get_generic_ro_edf_dir(), "rev-parse", "--show-toplevel")
+    upstream = git(top, "remote", "get-url", "origin")
+    scratch = tempfile.mkdtemp(prefix="vtp-bench-")
+    try:
+        if os.path.isdir(upstream) and not os.path.relpath(
+            upstream, runtime
+        ).startswith(".."):
+            scratch_upstream = os.path.join(scratch, os.path.relpath(upstream, runtime))
+        else:
+            scratch_upstream = os.path.join(scratch, "ElectionData.git")
+        os.makedirs(os.path.dirname(scratch_upstream), exist_ok=True)
+        git(scratch, "clone", "--quiet", "--bare", upstream, scratch_upstream)
+        scratch_top = os.path.join(scratch, os.path.relpath(top, runtime))
+        os.makedirs(os.path.dirname(scratch_top), exist_ok=True)
+        git(scratch, "clone", "--quiet", scratch_upstream, scratch_top)
+        # the merge journal is kept with the scratch election too
+        os.environ.setdefault(
+            "VTP_MERGE_QUEUE_PATH", os.path.join(scratch, "vtp-merge-queue.db")
+        )
+        saved = Globals._config["DEFAULT_RUNTIME_LOCATION"]
+        Globals._config["DEFAULT_RUNTIME_LOCATION"] = scratch
+        try:
+            yield scratch
+        finally:
+            Globals._config["DEFAULT_RUNTIME_LOCATION"] = saved
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+async def run(args) -> dict:
+    """Run the benchmark and return its results"""
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+        lifespan = contextlib.nullcontext()
+    else:
+        sys.path.insert(0, os.getcwd())
+        # the backend is selected when main is imported
+        os.environ["VTP_BACKEND"] = args.backend
+        # pylint: disable=import-outside-toplevel
+        from main import app
+
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://bench",
+            timeout=args.timeout,
+        )
+        lifespan = app.router.lifespan_context(app)
+    recorder = Recorder()
+    journeys = list(range(args.journeys))
+    async with client, lifespan:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                voter(client, recorder, random.Random(args.seed + index), journeys)
+                for index in range(args.concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - start
+        stats = (await client.get("/web-api/stats")).json()
+    return {
+        "config": {
+            "target": args.url or f"in-process {args.backend}",
+            "concurrency": args.concurrency,
+            "journeys": args.journeys,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "elapsed_secs": round(elapsed, 3),
+        "journeys_per_sec": round(args.journeys / elapsed, 2),
+        "endpoints": recorder.report(elapsed),
+        "server_stats": stats,
+    }
+
+
+def main():
+    """Parse the arguments, run the benchmark and write the results"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--url", default="", help="benchmark a running server")
+    parser.add_argument(
+        "--backend",
+        choices=("live", "mock", "simulated"),
+        default="simulated",
+        help="the in-process backend",
+    )
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent voters")
+    parser.add_argument("--journeys", type=int, default=200, help="voter journeys")
+    parser.add_argument("--seed", type=int, default=0, help="the random seed")
+    parser.add_argument("--timeout", type=float, default=60, help="request timeout")
+    parser.add_argument("--output", default="", help="write the JSON results here")
+    args = parser.parse_args()
+    with (
+        scratch_election_data()
+        if args.backend == "live" and not args.url
+        else contextlib.nullcontext()
+    ):
+        results = asyncio.run(run(args))
+    for endpoint, report in results["endpoints"].items():
+        print(
+            f"{endpoint:24} {report['requests']:6} reqs {report['errors']:5} errs "
+            f"{report['throughput_rps']:9.2f} rps  p50 {report['p50_ms']:9.2f}ms  "
+            f"p95 {report['p95_ms']:9.2f}ms  p99 {report['p99_ms']:9.2f}ms"
+        )
+    print(f"{results['journeys_per_sec']} journeys/sec")
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as outfile:
+            json.dump(results, outfile, indent=2)
+            outfile.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+The admin endpoints of the web-api: the polls control, the saved
+request profiles (see profiler.py), and the bulk cast ballot ingestion
+(see bulk_cast.py).  The admin endpoints, and the profiling of a request
+on demand, require the VTP_ADMIN_TOKEN in the X-VTP-Admin-Token header -
+without a configured token they are refused.
+"""
+
+import hmac
+import os
+from typing import Awaitable, Callable
+
+from bulk_cast import BulkCast
+from executor import BackendExecutor
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from polls import Polls
+from profiler import Profiler
+
+# The token required by the admin endpoints - without one they are disabled
+ADMIN_TOKEN = os.getenv("VTP_ADMIN_TOKEN", "")
+DRAIN_TIMEOUT = float(os.getenv("VTP_DRAIN_TIMEOUT", "60"))
+
+
+def is_admin(request: Request) -> bool:
+    """
+    Return whether a request carries the admin token - never when no
+    token is configured
+    """
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(
+        request.headers.get("x-vtp-admin-token", "").encode("utf8"),
+        ADMIN_TOKEN.encode("utf8"),
+    )
+
+
+def check_admin(request: Request):
+    """Reject an admin request lacking the admin token"""
+    if not is_admin(request):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="admin token required"
+        )
+
+
+def admin_router(
+    polls: Polls,
+    flush_merges: Callable[[float], Awaitable[bool]],
+    drain_stats: Callable[[], Awaitable[dict]],
+    bulk_cast: Callable[[], BulkCast],
+) -> APIRouter:
+    """
+    Return the router of the admin endpoints.  A drain of the polls
+    waits for flush_merges and reports the drain_stats, and each bulk
+    cast upload is cast by a new bulk_cast().
+    """
+    router = APIRouter()
+
+    # Open, close and shut down (drain) the polls
+    #
+    # pylint: disable=line-too-long
+    # curl -i -X POST -H "X-VTP-Admin-Token: $VTP_ADMIN_TOKEN" http://127.0.0.1:8000/web-api/admin/polls/drain
+    @router.post("/web-api/admin/polls/{action}")
+    async def polls_admin(request: Request, action: str) -> dict:
+        """
+        Will open or close the polls, or shut them down (drain): close
+        the polls, wait for the in-flight casts to complete and the
+        pending CVR merges to be merged, and report the client
+        connection statistics.
+        """
+        check_admin(request)
+        if action == "open":
+            polls.open()
+        elif action == "close":
+            polls.close()
+        elif action == "drain":
+            drained = await polls.drain(flush_merges, DRAIN_TIMEOUT)
+            return {
+                "drained": drained,
+                "polls": polls.stats(),
+                **await drain_stats(),
+            }
+        else:
+            return {"webapi_error": f"unknown polls action ({action})"}
+        return {"polls": polls.stats()}
+
+    # The saved request profiles
+    #
+    # pylint: disable=line-too-long
+    # curl -i -H "X-VTP-Admin-Token: $VTP_ADMIN_TOKEN" http://127.0.0.1:8000/web-api/admin/profiles
+    @router.get("/web-api/admin/profiles")
+    async def list_profiles(request: Request) -> dict:
+        """Will list the saved profiles, the newest first"""
+        check_admin(request)
+        return {"profiles": await BackendExecutor.run("show", Profiler.profiles)}
+
+    @router.get("/web-api/admin/profiles/{name}")
+    async def get_profile(request: Request, name: str, format: str = "pstats"):
+        """
+        Will download a saved profile as a pstats file, or as text
+        (format=text) sorted by cumulative time with the time spent in
+        subprocesses (git) versus python
+        """
+        # pylint: disable=redefined-builtin
+        check_admin(request)
+        if not Profiler.valid(name) or not os.path.exists(Profiler.path(name)):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        if format == "text":
+            return PlainTextResponse(
+                await BackendExecutor.run("show", Profiler.text, name)
+            )
+        return FileResponse(
+            Profiler.path(name), media_type="application/octet-stream", filename=name
+        )
+
+    # Bulk cast ballot ingestion - an NDJSON upload of cast ballots
+    #
+    # pylint: disable=line-too-long
+    # curl -X POST -H "X-VTP-Admin-Token: $VTP_ADMIN_TOKEN" -H 'Content-Type: application/x-ndjson' --data-binary @ballots.ndjson http://127.0.0.1:8000/web-api/admin/cast_ballots
+    @router.post("/web-api/admin/cast_ballots")
+    async def cast_ballots(request: Request):
+        """
+        Will cast the NDJSON cast ballots of the request body in batches
+        and stream back the per ballot receipts (tagged with the
+        ballot's line number) as NDJSON, followed by a summary.  Meant
+        for seeding and replays - the polls admission control does not
+        apply.
+        """
+        check_admin(request)
+        upload = bulk_cast()
+        # the upload is read (and cast as it arrives) before the response
+        # starts, as the response stream cannot share the request stream
+        await upload.feed(request.stream())
+        return StreamingResponse(upload.results(), media_type="application/x-ndjson")
+
+    return router
@@ -11,7 +11,7 @@ and VoteTracker+ can function as designed.
 
 Without an ElectionData deployment VTP git commands cannot be
 executed.  Currently this state is configured by the _MOCK_MODE
-variable below.  When set, and when this repo is part of the
+variable below (set via VTP_BACKEND=mock).  When set, and when this repo is part of the
 VTP-dev-env parent repo (or when the VoteTrackerPlus and
 VTP-mock-election.US.xx repos are simply sibling repos of this one),
 the commands here do not call into the VoteTrackerPlus repo and
@@ -28,22 +28,72 @@ ballot-checks can be immediately produced upon casting a ballot.
 Regardless, for the time being the VTP-mock-election.US.xx also holds
 checkedin mock values for the data that the web-api and above layers
 need when running in mock mode.
+
+For latency realistic testing without an ElectionData deployment see
+simulated_backend.py (VTP_BACKEND=simulated).
 """
 
-import json
+import functools
+import importlib
 import os
+import subprocess
+
+from ballot_cache import BlankBallotCache
+from bulk_cast import cast_each
+from fast_json import dumps
+from incremental_tally import IncrementalTallies, parse_lines, render_lines
+from metrics import Metrics
+from mock_store import MockStore
+from profiler import Profiler
+from read_replica import ReadReplica
+from repo_state import clone_workspace, head_digest, warm_object_store
+from response_compression import EncodedBody
+from result_cache import SingleFlightLruCache
+from workspace_locks import WorkspaceLocks
+
+# The VoteTrackerPlus classes and their modules.  The modules are only
+# imported on first use (or by the warm-up), which keeps the web-api
+# startup fast and lets the mock mode run without them.
+_VTP_MODULES = {
+    "Globals": "vtp.core.common",
+    "WebAPI": "vtp.core.webapi",
+    "AcceptBallotOperation": "vtp.ops.accept_ballot_operation",
+    "CastBallotOperation": "vtp.ops.cast_ballot_operation",
+    "MergeContestsOperation": "vtp.ops.merge_contests_operation",
+    "SetupVtpDemoOperation": "vtp.ops.setup_vtp_demo_operation",
+    "ShowContestsOperation": "vtp.ops.show_contests_operation",
+    "TallyContestsOperation": "vtp.ops.tally_contests_operation",
+    "VerifyBallotReceiptOperation": "vtp.ops.verify_ballot_receipt_operation",
+}
 
-from vtp.core.common import Globals
-from vtp.core.webapi import WebAPI
-from vtp.ops.accept_ballot_operation import AcceptBallotOperation
-from vtp.ops.cast_ballot_operation import CastBallotOperation
-from vtp.ops.setup_vtp_demo_operation import SetupVtpDemoOperation
-from vtp.ops.show_contests_operation import ShowContestsOperation
-from vtp.ops.tally_contests_operation import TallyContestsOperation
-from vtp.ops.verify_ballot_receipt_operation import VerifyBallotReceiptOperation
 
+@functools.cache
+def _vtp(name: str):
+    """Return a VoteTrackerPlus class, importing its module on first use"""
+    return getattr(importlib.import_module(_VTP_MODULES[name]), name)
 
-class VtpBackend:
+
+def verify_pairs(item: dict) -> tuple[list, bool]:
+    """
+    Return the (contest uid, digest) pairs and the cvr flag of a batch
+    verification item - a row of digests ({"uids": [...], "digests":
+    [...]}) or a ballot receipt ({"ballot_check": ..., "row_index":
+    ...}), which is verified by the digests of its row
+    """
+    if "digests" in item:
+        uids, digests = list(item["uids"]), list(item["digests"])
+        if len(uids) != len(digests):
+            raise ValueError("the uids and digests differ in length")
+        return list(zip(uids, digests)), False
+    ballot_check, row = item["ballot_check"], int(item["row_index"])
+    if not 0 < row < len(ballot_check):
+        raise IndexError(f"row_index {row} is not a row of the ballot check")
+    # the header row names the contests as '<uid> - <name>'
+    uids = [str(uid).split(" - ", 1)[0] for uid in ballot_check[0]]
+    return list(zip(uids, ballot_check[row])), bool(item.get("cvr", False))
+
+
+class VtpBackend:  # pylint: disable=too-many-public-methods
     """
     Class to keep the namespace separate and allow the creation of a
     shim layer in the VTP-web-api repo so that this repo can easily
@@ -54,18 +104,19 @@ class VtpBackend:
     # backend demo constants
     ########
     # set mock mode
-    _MOCK_MODE = False
+    _MOCK_MODE = os.getenv("VTP_BACKEND") == "mock"
     # where the blank ballot is stored for the spring demo
     _MOCK_BLANK_BALLOT = "mock-data/blank-ballot.json"
     # where the cast-ballot.json file is stored for the spring demo
     _MOCK_CAST_BALLOT = "mock-data/cast-ballot.json"
     # where the ballot-check is stored for the spring demo
-    _MOCK_BALLOT_CHECK = "mock-data/receipt.26.csv"
-    _MOCK_VOTER_INDEX = 26
+    _MOCK_BALLOT_CHECK = "mock-data/receipt.70.json"
     # a mock contest content
     _MOCK_CONTEST_CONTENT = "mock-data/mock_contest.json"
     # default guid - making one up
     _MOCK_GUID = "01d963fd74100ee3f36428740a8efd8afd781839"
+    # default receipt digest - making one up as well
+    _MOCK_RECEIPT_DIGEST = "5a7e0c4f9a1d1c2b6e8f3d4c2b1a09f8e7d6c5b4"
     # default mock receipt log
     _MOCK_VERIFY_BALLOT_LOG = "mock-data/verify-ballot-doc.json"
     # default mock tally log
@@ -74,6 +125,146 @@ class VtpBackend:
     _MOCK_SHOW_CONTEST_LOG = "mock-data/show-contest-doc.json"
     # backend default address
     _ADDRESS = "123, Main Street, Concord, Massachusetts"
+    # the tally mode - either 'full' (a TallyContestsOperation recount),
+    # 'incremental' (see incremental_tally.py), or 'verify' (incremental
+    # checked against a TallyContestsOperation recount)
+    _TALLY_MODE = os.getenv("VTP_TALLY_MODE", "full")
+    # When set, the contests of the cast ballots are merged in batches
+    # via the merge queue (see merge_queue.py)
+    MERGE_CONTESTS = bool(os.getenv("MERGE_CONTESTS"))
+    # the ElectionData workspace the merge queue merges in (default a
+    # dedicated clone, see _merge_dir)
+    _MERGE_EDF_DIR = os.getenv("VTP_MERGE_EDF_DIR", "")
+    # the workspace the verify, tally and show reads run in - either
+    # 'guid' (the vote store's own) or 'replica' (a shared read replica,
+    # see read_replica.py) - and the replica (default a dedicated clone)
+    _READ_PATH = os.getenv("VTP_READ_PATH", "guid")
+    _READ_REPLICA_DIR = os.getenv("VTP_READ_REPLICA_DIR", "")
+    _READ_REPLICA_INTERVAL = float(os.getenv("VTP_READ_REPLICA_INTERVAL", "5"))
+    # the max bytes of git pack files the warm-up reads (0, no limit)
+    _WARM_UP_BYTES = int(os.getenv("VTP_WARMUP_PACK_BYTES", str(256 * 1024 * 1024)))
+
+    ########
+    # backend locks and caches
+    ########
+    # the read/write locks of the ElectionData workspaces
+    _locks = WorkspaceLocks()
+    # the resident mock data and the web-api responses built from it
+    _MOCK_RESPONSES = {
+        "get_blank_ballot": ("blank_ballot", "blank_ballot"),
+        "verify_ballot_receipt": ("verify_ballot", "verify_ballot_stdout"),
+        "verify_ballot_row": ("verify_ballot", "verify_ballot_stdout"),
+        "tally_contests": ("tally_contests", "tally_election_stdout"),
+        "show_contest": ("show_contest", "git_log"),
+        "show_versioned_receipt": ("show_contest", ""),
+    }
+    _mock_store = (
+        MockStore(
+            {
+                "blank_ballot": _MOCK_BLANK_BALLOT,
+                "cast_ballot": _MOCK_CAST_BALLOT,
+                "ballot_check": _MOCK_BALLOT_CHECK,
+                "verify_ballot": _MOCK_VERIFY_BALLOT_LOG,
+                "tally_contests": _MOCK_TALLY_CONTESTS_LOG,
+                "show_contest": _MOCK_SHOW_CONTEST_LOG,
+            },
+            bodies=list(_MOCK_RESPONSES.values()),
+            reload_interval=float(os.getenv("VTP_MOCK_RELOAD_INTERVAL", "0")),
+        )
+        if _MOCK_MODE
+        else None
+    )
+    # the blank ballots per ballot style of the generic ElectionData HEAD
+    _blank_ballots = BlankBallotCache()
+    # the (stdout, serialized response) tally results keyed by (HEAD,
+    # contests, digests, verbosity)
+    _tallies = SingleFlightLruCache(int(os.getenv("VTP_TALLY_CACHE_SIZE", "128")))
+    # the batch verification results keyed by (HEAD, item)
+    _verifications = SingleFlightLruCache(
+        int(os.getenv("VTP_VERIFY_CACHE_SIZE", "1024"))
+    )
+
+    @staticmethod
+    def stats() -> dict:
+        """Return the backend cache statistics"""
+        return {
+            "blank_ballots": VtpBackend._blank_ballots.stats(),
+            "tallies": VtpBackend._tallies.stats(),
+            "verifications": VtpBackend._verifications.stats(),
+            "incremental_tallies": IncrementalTallies.stats(),
+            "workspace_locks": VtpBackend._locks.stats(),
+            "read_replica": (
+                VtpBackend._read_replica().stats()
+                if VtpBackend._read_replica()
+                else None
+            ),
+            "mock_store": (
+                VtpBackend._mock_store.stats() if VtpBackend._mock_store else None
+            ),
+        }
+
+    @staticmethod
+    def warm_up_steps() -> dict:
+        """
+        Return the (name, callable) steps that warm the backend up
+        before the first voter: import the VoteTrackerPlus modules, load
+        the election configuration and the default blank ballot, read
+        the ElectionData object store into the page cache, and prime
+        the tally cache with the tally of the merged election
+        """
+        if VtpBackend._MOCK_MODE:
+            # the mock data is loaded (and the responses precomputed)
+            # when the backend is imported
+            return {}
+
+        def imports():
+            for name in _VTP_MODULES:
+                _vtp(name)
+
+        def object_store():
+            warm_object_store(
+                _vtp("WebAPI").get_generic_ro_edf_dir(), VtpBackend._WARM_UP_BYTES
+            )
+
+        return {
+            "imports": imports,
+            "blank_ballot": VtpBackend.get_blank_ballot,
+            "object_store": object_store,
+            "tally": functools.partial(VtpBackend.tally_merged, ""),
+        }
+
+    @staticmethod
+    def mock_response(endpoint: str) -> bytes | None:
+        """
+        In mock mode, will return the precomputed response body of a
+        web-api endpoint - otherwise None
+        """
+        if not VtpBackend._MOCK_MODE:
+            return None
+        return VtpBackend._mock_store.body(*VtpBackend._MOCK_RESPONSES[endpoint])
+
+    @staticmethod
+    def run_operation(operation, **kwargs):
+        """
+        Run a backend operation, recording its latency in the metrics
+        and profiling it when the request is profiled
+        """
+        name = type(operation).__name__
+        with Metrics.track("operation", name):
+            return Profiler.run(name, operation.run, **kwargs)
+
+    @staticmethod
+    def lock_vote_store(vote_store_id: str, write: bool = False):
+        """
+        Will return a context manager holding the read (or write) lock
+        of the guid workspace of a vote store
+        """
+        if VtpBackend._MOCK_MODE:
+            # there are no guid workspaces
+            return VtpBackend._locks.hold(vote_store_id, write=write)
+        return VtpBackend._locks.hold(
+            _vtp("WebAPI").get_guid_based_edf_dir(vote_store_id), write=write
+        )
 
     @staticmethod
     def get_vote_store_id() -> str:
@@ -83,10 +274,12 @@ class VtpBackend:
         if VtpBackend._MOCK_MODE:
             # in mock mode there is no guid - make one up
             return VtpBackend._MOCK_GUID
-        operation = SetupVtpDemoOperation(
-            election_data_dir=WebAPI.get_generic_ro_edf_dir(),
+        election_data_dir = _vtp("WebAPI").get_generic_ro_edf_dir()
+        operation = _vtp("SetupVtpDemoOperation")(
+            election_data_dir=election_data_dir,
         )
-        return operation.run(guid_client_store=True)
+        with VtpBackend._locks.read(election_data_dir):
+            return VtpBackend.run_operation(operation, guid_client_store=True)
 
     @staticmethod
     def get_blank_ballot(voter_address: str = "") -> dict:
@@ -97,42 +290,76 @@ class VtpBackend:
         """
         if VtpBackend._MOCK_MODE:
             # in mock mode there is no guid - make one up
-            with open(VtpBackend._MOCK_BLANK_BALLOT, "r", encoding="utf8") as infile:
-                json_doc = json.load(infile)
+            json_doc = VtpBackend._mock_store.get("blank_ballot")
             #            import pdb; pdb.set_trace()
             return json_doc
-        # Get a/the blank ballot from the backend
-        operation = CastBallotOperation(
-            election_data_dir=WebAPI.get_generic_ro_edf_dir(),
-        )
         # If there is no address, for now use the mock default
         if voter_address == "":
             voter_address = VtpBackend._ADDRESS
-        return operation.run(
-            an_address=voter_address,
-            return_blank_ballot=True,
+        # The blank ballot only changes when the election data does
+        election_data_dir = _vtp("WebAPI").get_generic_ro_edf_dir()
+        head = head_digest(election_data_dir)
+        blank_ballot = VtpBackend._blank_ballots.get(head, voter_address)
+        if blank_ballot is not None:
+            return blank_ballot
+        # Get a/the blank ballot from the backend
+        operation = _vtp("CastBallotOperation")(
+            election_data_dir=election_data_dir,
         )
+        with VtpBackend._locks.read(election_data_dir):
+            blank_ballot = VtpBackend.run_operation(
+                operation,
+                an_address=voter_address,
+                return_blank_ballot=True,
+            )
+        VtpBackend._blank_ballots.put(head, voter_address, blank_ballot)
+        return blank_ballot
 
     @staticmethod
     def get_all_guid_workspaces() -> list:
         """
         Will return a list of all the existing guid workspaces
         """
-        return SetupVtpDemoOperation.get_all_guid_workspaces()
+        if VtpBackend._MOCK_MODE:
+            return []
+        return _vtp("SetupVtpDemoOperation").get_all_guid_workspaces()
+
+    @staticmethod
+    def get_guid_workspace_dir(guid: str) -> str:
+        """
+        Will return the top level directory of a guid workspace, which
+        is the guid named directory holding the guid based ElectionData
+        clone, or the empty string if there is no such directory.
+        """
+        if VtpBackend._MOCK_MODE:
+            return ""
+        path = _vtp("WebAPI").get_guid_based_edf_dir(guid)
+        while path and path != os.path.dirname(path):
+            # the guid may be split into a <guid[:2]>/<guid[2:]> path
+            if os.path.basename(path) in (guid, guid[2:]):
+                return path
+            path = os.path.dirname(path)
+        return ""
 
     @staticmethod
     def mock_get_cast_ballot() -> dict:
         """Mock only - return a static cast ballot"""
-        with open(VtpBackend._MOCK_CAST_BALLOT, "r", encoding="utf8") as infile:
-            json_doc = json.load(infile)
+        json_doc = VtpBackend._mock_store.get("cast_ballot")
         return json_doc
 
     @staticmethod
-    def mock_get_ballot_check() -> tuple[list, int, str]:
-        """Mock only - return a static cast ballot"""
-        with open(VtpBackend._MOCK_BALLOT_CHECK, "r", encoding="utf8") as infile:
-            json_doc = json.load(infile)
-        return json_doc["ballot_check"], json_doc["ballot_row"], json_doc["qr_svg"]
+    def mock_get_ballot_check() -> tuple[list, int, str, str]:
+        """
+        Mock only - return a static ballot check, voter index, (empty)
+        qr image and receipt digest
+        """
+        json_doc = VtpBackend._mock_store.get("ballot_check")
+        return (
+            json_doc["ballot-check"],
+            json_doc["vote-index"],
+            "",
+            VtpBackend._MOCK_RECEIPT_DIGEST,
+        )
 
     @staticmethod
     def cast_ballot(
@@ -146,23 +373,137 @@ class VtpBackend:
             # Just return a mock ballot-check and voter-index
             return VtpBackend.mock_get_ballot_check()
         # handle the incoming ballot and return the ballot-check and voter-index
-        operation = AcceptBallotOperation(
-            election_data_dir=WebAPI.get_guid_based_edf_dir(vote_store_id),
+        election_data_dir = _vtp("WebAPI").get_guid_based_edf_dir(vote_store_id)
+        operation = _vtp("AcceptBallotOperation")(
+            election_data_dir=election_data_dir,
         )
-        # When testing in sequential cast-ballot mode, maybe merge each ballot
-        # as cast
-        merge_p = bool(os.getenv("MERGE_CONTESTS"))
         # Returns a 2D (ballot check) array, index, a base64 encoded
         # qr_img, receipt_digest tuple
-        return operation.run(
-            cast_ballot_json=cast_ballot,
-            # the demo wants to version receipts
-            version_receipts=True,
-            # until there is a backend tabulation server running, merge
-            # the contests in the client's vote_store_id
-            merge_contests=merge_p,
+        with VtpBackend._locks.write(election_data_dir):
+            return VtpBackend.run_operation(
+                operation,
+                cast_ballot_json=cast_ballot,
+                # the demo wants to version receipts
+                version_receipts=True,
+                # the contests are merged (in batches) by the merge queue
+                merge_contests=False,
+            )
+
+    @staticmethod
+    def cast_ballots(vote_store_id: str, cast_ballots: list) -> list:
+        """
+        Will cast a batch of cast ballots one after the other in one
+        guid workspace, holding its write lock once for the batch (see
+        bulk_cast.py).  Returns the per ballot ballot-check, voter-index
+        and receipt digest, or error.
+        """
+        if VtpBackend._MOCK_MODE:
+            return cast_each(lambda _: VtpBackend.mock_get_ballot_check(), cast_ballots)
+        election_data_dir = _vtp("WebAPI").get_guid_based_edf_dir(vote_store_id)
+
+        def cast(cast_ballot: dict) -> tuple[list, int, str, str]:
+            operation = _vtp("AcceptBallotOperation")(
+                election_data_dir=election_data_dir,
+            )
+            return VtpBackend.run_operation(
+                operation,
+                cast_ballot_json=cast_ballot,
+                version_receipts=True,
+                merge_contests=False,
+            )
+
+        with VtpBackend._locks.write(election_data_dir):
+            return cast_each(cast, cast_ballots)
+
+    @staticmethod
+    @functools.cache
+    def _merge_dir() -> str:
+        """
+        Return the ElectionData workspace the merges run in - by default
+        a clone of the upstream dedicated to the merges, so that a merge
+        neither moves the HEAD of the generic workspace (which the blank
+        ballot cache is keyed on) nor holds its write lock
+        """
+        return VtpBackend._MERGE_EDF_DIR or clone_workspace(
+            _vtp("WebAPI").get_generic_ro_edf_dir(), "merge"
         )
 
+    @staticmethod
+    def merge_contests(flush: bool = False):
+        """
+        Will merge the pushed contest branches of the cast ballots into
+        the main branch - all of them, whichever worker cast them.
+        Unless flushing (the polls are drained), the merge operation
+        keeps its minimum of pending CVRs unmerged.  Until there is a
+        backend tabulation server running, this is called by the merge
+        queue.
+        """
+        if VtpBackend._MOCK_MODE:
+            # nothing to merge
+            return
+        election_data_dir = VtpBackend._merge_dir()
+        operation = _vtp("MergeContestsOperation")(
+            election_data_dir=election_data_dir,
+        )
+        with VtpBackend._locks.write(election_data_dir):
+            VtpBackend.run_operation(operation, remote=True, flush=flush)
+        if VtpBackend._read_replica():
+            VtpBackend._read_replica().refresh()
+
+    @staticmethod
+    @functools.cache
+    def _read_replica() -> ReadReplica | None:
+        """Return the shared read replica, in the replica read mode"""
+        if VtpBackend._MOCK_MODE or VtpBackend._READ_PATH != "replica":
+            return None
+        return ReadReplica(
+            VtpBackend._READ_REPLICA_DIR
+            or clone_workspace(_vtp("WebAPI").get_generic_ro_edf_dir(), "replica"),
+            VtpBackend.update_read_replica,
+            interval=VtpBackend._READ_REPLICA_INTERVAL,
+        )
+
+    @staticmethod
+    def update_read_replica(replica_dir: str):
+        """
+        Will fast forward the read replica to its upstream.  The merges
+        land in the merge workspace directly, so when that is the replica
+        there is nothing to do.
+        """
+        if os.path.realpath(replica_dir) == os.path.realpath(VtpBackend._merge_dir()):
+            return
+        # fetch without the lock - only the fast forward holds it
+        subprocess.run(
+            ["git", "fetch", "--quiet"],
+            cwd=replica_dir,
+            check=True,
+            capture_output=True,
+        )
+        with VtpBackend._locks.write(replica_dir):
+            subprocess.run(
+                ["git", "merge", "--ff-only", "--quiet", "@{upstream}"],
+                cwd=replica_dir,
+                check=True,
+                capture_output=True,
+            )
+
+    @staticmethod
+    def _read_dir(vote_store_id: str, digests: list) -> str:
+        """
+        Return the ElectionData workspace a read of a vote store runs
+        in - the shared read replica when it has all the digests the
+        read refers to, otherwise the guid workspace of the vote store
+        """
+        replica = VtpBackend._read_replica()
+        if replica and replica.has(digests):
+            return replica.path
+        return _vtp("WebAPI").get_guid_based_edf_dir(vote_store_id)
+
+    @staticmethod
+    def _receipt_digests(ballot_check: list) -> list:
+        """Return the digests of a ballot check (below its header row)"""
+        return [digest for row in ballot_check[1:] for digest in row]
+
     @staticmethod
     def verify_ballot_receipt(
         vote_store_id: str,
@@ -176,21 +517,23 @@ class VtpBackend:
         """
         if VtpBackend._MOCK_MODE:
             # Just return a mock verify ballot string
-            with open(
-                VtpBackend._MOCK_VERIFY_BALLOT_LOG, "r", encoding="utf8"
-            ) as infile:
-                json_doc = json.load(infile)
+            json_doc = VtpBackend._mock_store.get("verify_ballot")
             return json_doc
         # handle the incoming ballot and return the ballot-check and voter-index
-        operation = VerifyBallotReceiptOperation(
-            election_data_dir=WebAPI.get_guid_based_edf_dir(vote_store_id),
-            stdout_printing=False,
+        election_data_dir = VtpBackend._read_dir(
+            vote_store_id, VtpBackend._receipt_digests(ballot_check)
         )
-        return operation.run(
-            receipt_data=ballot_check,
-            row=str(vote_index),
-            cvr=cvr,
+        operation = _vtp("VerifyBallotReceiptOperation")(
+            election_data_dir=election_data_dir,
+            stdout_printing=False,
         )
+        with VtpBackend._locks.read(election_data_dir):
+            return VtpBackend.run_operation(
+                operation,
+                receipt_data=ballot_check,
+                row=str(vote_index),
+                cvr=cvr,
+            )
 
     @staticmethod
     def verify_ballot_row(
@@ -204,21 +547,93 @@ class VtpBackend:
         """
         if VtpBackend._MOCK_MODE:
             # Just return a mock verify ballot string
-            with open(
-                VtpBackend._MOCK_VERIFY_DIGESTS_LOG, "r", encoding="utf8"
-            ) as infile:
-                json_doc = json.load(infile)
+            json_doc = VtpBackend._mock_store.get("verify_ballot")
             return json_doc
         # handle the incoming ballot and return the ballot-check and voter-index
-        operation = VerifyBallotReceiptOperation(
-            election_data_dir=WebAPI.get_guid_based_edf_dir(vote_store_id),
+        election_data_dir = VtpBackend._read_dir(vote_store_id, digests.split(","))
+        operation = _vtp("VerifyBallotReceiptOperation")(
+            election_data_dir=election_data_dir,
             stdout_printing=False,
         )
         # the first row is the header line
-        return operation.run(
-            receipt_data=[uids.split(","), digests.split(",")], row="1", uids=True
+        with VtpBackend._locks.read(election_data_dir):
+            return VtpBackend.run_operation(
+                operation,
+                receipt_data=[uids.split(","), digests.split(",")],
+                row="1",
+                uids=True,
+            )
+
+    @staticmethod
+    def verify_ballot_batch(
+        vote_store_id: str,
+        items: list,
+    ) -> list:
+        """
+        Endpoint #4c: will verify a batch of items, each item being
+        either a ballot receipt ({"ballot_check": ..., "row_index": ...})
+        or a row of digests ({"uids": [...], "digests": [...]}).  All the
+        items share one operation and each digest is verified on its
+        own, so that a digest is only verified once per HEAD however
+        many items (in this batch or the previous ones) contain it.
+        Returns per item, in order, the list of its per digest
+        verifications.
+        """
+        if VtpBackend._MOCK_MODE:
+            # Just return a mock verify ballot string per item
+            json_doc = VtpBackend._mock_store.get("verify_ballot")
+            return [{"verify_ballot_stdout": json_doc} for _ in items]
+        digests = []
+        for item in items:
+            try:
+                digests.extend(digest for _, digest in verify_pairs(item)[0])
+            except (KeyError, IndexError, TypeError, ValueError):
+                # the malformed items are reported per item
+                pass
+        election_data_dir = VtpBackend._read_dir(vote_store_id, digests or [""])
+        head = head_digest(election_data_dir)
+        operation = _vtp("VerifyBallotReceiptOperation")(
+            election_data_dir=election_data_dir,
+            stdout_printing=False,
+        )
+        with VtpBackend._locks.read(election_data_dir):
+            return VtpBackend._verify_items(head, operation, items)
+
+    @staticmethod
+    def _verify_digest(head: str, operation, uid: str, digest: str, cvr: bool):
+        """Verify a digest with a shared operation, once per HEAD"""
+        # the first row is the header line
+        return VtpBackend._verifications.get_or_compute(
+            (head, uid, digest, cvr),
+            functools.partial(
+                VtpBackend.run_operation,
+                operation,
+                receipt_data=[[uid], [digest]],
+                row="1",
+                uids=True,
+                cvr=cvr,
+            ),
         )
 
+    @staticmethod
+    def _verify_items(head: str, operation, items: list) -> list:
+        """Verify the batch items with a shared operation"""
+        results = []
+        for item in items:
+            try:
+                pairs, cvr = verify_pairs(item)
+                results.append(
+                    {
+                        "verify_ballot_stdout": [
+                            VtpBackend._verify_digest(head, operation, uid, digest, cvr)
+                            for uid, digest in pairs
+                        ]
+                    }
+                )
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                results.append({"webapi_error": f"{type(error).__name__}: {error}"})
+        return results
+
     @staticmethod
     def tally_contests(
         vote_store_id: str,
@@ -231,11 +646,49 @@ class VtpBackend:
         """
         if VtpBackend._MOCK_MODE:
             # Just return a mock tally string
-            with open(
-                VtpBackend._MOCK_TALLY_CONTESTS_LOG, "r", encoding="utf8"
-            ) as infile:
-                json_doc = json.load(infile)
+            json_doc = VtpBackend._mock_store.get("tally_contests")
             return json_doc
+        return VtpBackend._tally(vote_store_id, contests, digests, verbosity)[0]
+
+    @staticmethod
+    def tally_contests_body(
+        vote_store_id: str,
+        contests: str,
+        digests: str,
+        verbosity: str,
+    ) -> EncodedBody:
+        """
+        Endpoint #5: will return the serialized tally_contests response,
+        which is cached (along with its compressed encodings) with the
+        tally
+        """
+        if VtpBackend._MOCK_MODE:
+            return EncodedBody(VtpBackend.mock_response("tally_contests"))
+        return VtpBackend._tally(vote_store_id, contests, digests, verbosity)[1]
+
+    @staticmethod
+    def tally_merged(contests: str) -> list:
+        """
+        Will tally the contests of the merged election, which is to say
+        of the merge ElectionData workspace - used by the live tally feed
+        """
+        if VtpBackend._MOCK_MODE:
+            return VtpBackend._mock_store.get("tally_contests")
+        return VtpBackend._tally_dir(
+            VtpBackend._merge_dir(),
+            contests,
+            "",
+            _vtp("Globals").get("DEFAULT_VERBOSITY"),
+        )[0]
+
+    @staticmethod
+    def _tally(
+        vote_store_id: str,
+        contests: str,
+        digests: str,
+        verbosity: str,
+    ) -> tuple[list, EncodedBody]:
+        """Return the (cached) tally stdout and its serialized response"""
         # Handle args
         if digests in ("None", "null"):
             digests = ""
@@ -244,17 +697,91 @@ class VtpBackend:
         if verbosity.isdigit():
             verbosity = int(verbosity)
         else:
-            verbosity = Globals.get("DEFAULT_VERBOSITY")
-        # handle the incoming ballot and return the ballot-check and voter-index
-        operation = TallyContestsOperation(
-            election_data_dir=WebAPI.get_guid_based_edf_dir(vote_store_id),
-            stdout_printing=False,
-            verbosity=verbosity,
+            verbosity = _vtp("Globals").get("DEFAULT_VERBOSITY")
+        return VtpBackend._tally_dir(
+            VtpBackend._read_dir(vote_store_id, digests.split(",") if digests else []),
+            contests,
+            digests,
+            verbosity,
+        )
+
+    @staticmethod
+    def _tally_dir(
+        election_data_dir: str,
+        contests: str,
+        digests: str,
+        verbosity: int,
+    ) -> tuple[list, EncodedBody]:
+        """Return the (cached) tally of an ElectionData workspace"""
+
+        def tally():
+            lines = tally_lines()
+            return lines, EncodedBody(dumps({"tally_election_stdout": lines}))
+
+        def tally_lines():
+            if VtpBackend._TALLY_MODE == "full":
+                return recount_lines()
+            with VtpBackend._locks.read(election_data_dir), Metrics.track(
+                "operation", "IncrementalTallies"
+            ):
+                lines = render_lines(
+                    IncrementalTallies.tally(election_data_dir, contests, digests)
+                )
+            if VtpBackend._TALLY_MODE == "verify":
+                return IncrementalTallies.check(
+                    election_data_dir, lines, recount_lines()
+                )
+            return lines
+
+        def recount_lines():
+            # handle the incoming ballot and return the ballot-check and voter-index
+            operation = _vtp("TallyContestsOperation")(
+                election_data_dir=election_data_dir,
+                stdout_printing=False,
+                verbosity=verbosity,
+            )
+            with VtpBackend._locks.read(election_data_dir):
+                return VtpBackend.run_operation(
+                    operation,
+                    contest_uid=contests,
+                    track_contests=digests,
+                )
+
+        # A tally only changes when the CVRs do, which is to say when
+        # the HEAD of the workspace moves - identical tallies of the
+        # same HEAD share one (possibly in-flight) result.
+        return VtpBackend._tallies.get_or_compute(
+            (head_digest(election_data_dir), contests, digests, verbosity),
+            tally,
         )
-        return operation.run(
-            contest_uid=contests,
-            track_contests=digests,
+
+    @staticmethod
+    def tally_contests_stream(
+        vote_store_id: str,
+        contests: str,
+        digests: str,
+    ):
+        """
+        Endpoint #5b: will return a generator of the structured tally
+        records - per contest a header record followed by one record
+        per RCV round - that computes each round as it is consumed.
+        The records are always computed by the incremental tally
+        engine as a backend recount only returns the final text.
+        """
+        if VtpBackend._MOCK_MODE:
+            # Just return the records of the mock tally
+            json_doc = VtpBackend._mock_store.get("tally_contests")
+            return iter(parse_lines(json_doc["tally-election-doc"]))
+        # Handle args
+        if digests in ("None", "null"):
+            digests = ""
+        if contests in ("None", "null"):
+            contests = ""
+        election_data_dir = VtpBackend._read_dir(
+            vote_store_id, digests.split(",") if digests else []
         )
+        with VtpBackend._locks.read(election_data_dir):
+            return IncrementalTallies.stream(election_data_dir, contests, digests)
 
     @staticmethod
     def show_contest(
@@ -266,18 +793,19 @@ class VtpBackend:
         """
         if VtpBackend._MOCK_MODE:
             # Just return a mock contest
-            with open(
-                VtpBackend._MOCK_SHOW_CONTEST_LOG, "r", encoding="utf8"
-            ) as infile:
-                json_doc = json.load(infile)
+            json_doc = VtpBackend._mock_store.get("show_contest")
             return json_doc
         # handle the show_contest
-        operation = ShowContestsOperation(
-            election_data_dir=WebAPI.get_guid_based_edf_dir(vote_store_id),
+        election_data_dir = VtpBackend._read_dir(vote_store_id, contests.split(","))
+        operation = _vtp("ShowContestsOperation")(
+            election_data_dir=election_data_dir,
             stdout_printing=False,
         )
         # Note that ShowContestsOperation.run will return a dictionary
-        return operation.run(contest_check=contests, webapi=True)
+        with VtpBackend._locks.read(election_data_dir):
+            return VtpBackend.run_operation(
+                operation, contest_check=contests, webapi=True
+            )
 
     @staticmethod
     def show_versioned_receipt(
@@ -290,15 +818,16 @@ class VtpBackend:
         """
         if VtpBackend._MOCK_MODE:
             # Just return a mock contest
-            with open(
-                VtpBackend._MOCK_SHOW_CONTEST_LOG, "r", encoding="utf8"
-            ) as infile:
-                json_doc = json.load(infile)
+            json_doc = VtpBackend._mock_store.get("show_contest")
             return json_doc
         # handle the show_contest
-        operation = ShowContestsOperation(
-            election_data_dir=WebAPI.get_guid_based_edf_dir(vote_store_id),
+        election_data_dir = VtpBackend._read_dir(vote_store_id, [digest])
+        operation = _vtp("ShowContestsOperation")(
+            election_data_dir=election_data_dir,
             stdout_printing=False,
         )
         # Note that ShowContestsOperation.run will return a dictionary
-        return operation.run(contest_check=digest, webapi=True, receipt=True)
+        with VtpBackend._locks.read(election_data_dir):
+            return VtpBackend.run_operation(
+                operation, contest_check=digest, webapi=True, receipt=True
+            )
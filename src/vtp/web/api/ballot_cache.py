@@ -0,0 +1,81 @@
+"""
+A cache of blank ballots.  Every voter address resolves to one of a
+small number of ballot styles (the ballot_subdir and active GGOs of
+the blank ballot), so the blank ballots are cached per style along
+with an address to style index.  The whole cache is tied to the HEAD
+digest of the ElectionData workspace it was built from and is dropped
+when that HEAD changes.
+"""
+
+import threading
+
+
+class BlankBallotCache:
+    """
+    Blank ballots keyed by ballot style plus an address to ballot
+    style index, both valid for a single ElectionData HEAD digest.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._head = ""
+        self._styles = {}
+        self._addresses = {}
+        # statistics
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def normalize_address(address: str) -> str:
+        """Normalize the case and white space of an address"""
+        return " ".join(address.lower().split())
+
+    @staticmethod
+    def ballot_style(blank_ballot: dict) -> tuple:
+        """Return the ballot style of a blank ballot"""
+        return (
+            blank_ballot.get("ballot_subdir", ""),
+            tuple(blank_ballot.get("active_ggos", [])),
+        )
+
+    def _check_head(self, head: str):
+        """Drop everything when the HEAD changes - requires the lock"""
+        if head != self._head:
+            if self._head:
+                self._invalidations += 1
+            self._head = head
+            self._styles.clear()
+            self._addresses.clear()
+
+    def get(self, head: str, address: str) -> dict | None:
+        """Return the cached blank ballot for address or None"""
+        with self._lock:
+            self._check_head(head)
+            style = self._addresses.get(BlankBallotCache.normalize_address(address))
+            if style is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            return self._styles[style]
+
+    def put(self, head: str, address: str, blank_ballot: dict):
+        """Cache the blank ballot of address"""
+        style = BlankBallotCache.ballot_style(blank_ballot)
+        with self._lock:
+            self._check_head(head)
+            # share the ballot object across all addresses of a style
+            self._styles.setdefault(style, blank_ballot)
+            self._addresses[BlankBallotCache.normalize_address(address)] = style
+
+    def stats(self) -> dict:
+        """Return the cache statistics"""
+        with self._lock:
+            return {
+                "head": self._head,
+                "styles": len(self._styles),
+                "addresses": len(self._addresses),
+                "hits": self._hits,
+                "misses": self._misses,
+                "invalidations": self._invalidations,
+            }
@@ -0,0 +1,259 @@
+"""
+Bulk cast ballot ingestion for the web-api.  Pre-filling the ballot
+cache or replaying the CVRs of a precinct one cast_ballot request at a
+time takes one round trip, one vote store and one workspace clone per
+ballot.  A BulkCast instead takes an NDJSON upload of cast ballots (one
+JSON cast ballot per line) and:
+
+- parses and validates the ballots as they are uploaded, the invalid
+  ones being answered right away,
+- groups the valid ones into batches,
+- has a small number of workers cast the batches, each worker casting
+  all of its batches one after the other in the one vote store (GUID
+  workspace) it holds for the whole ingestion, under a single write
+  lock per batch, and
+- hands each cast batch to the merge queue as one entry, so that the
+  contests of a batch are merged together.
+
+The git writes themselves are not grouped: the backend has no batched
+accept, so each ballot of a batch is still cast by its own
+AcceptBallotOperation (commits and push).  What a batch saves is the
+per ballot request, vote store (workspace clone), write lock and merge
+queue entry - the commit and push of each ballot remain, and bound the
+ingestion rate.
+
+A ballot failing in the backend stops its batch, as the failed accept
+may have left the workspace dirty: the rest of the batch is answered
+with a not cast error, and the worker continues in a new vote store.
+
+The per ballot receipts (or errors) are streamed back as NDJSON, tagged
+with the line number of the ballot, in completion order, followed by a
+summary line.  The upload is read in full before the response starts,
+so an upload is limited to max_ballots ballots, which bounds the
+receipts held meanwhile.  Once cast, a batch is recorded (cast_done)
+even when the client disconnects.
+"""
+
+import asyncio
+import json
+import time
+
+from executor import BackendExecutor
+from fast_json import dumps
+
+# the error of the ballots of a batch after a failed one
+NOT_CAST = "not cast - an earlier ballot of the batch failed"
+
+
+def validate_ballot(ballot) -> str:
+    """Return why a cast ballot is malformed, or the empty string"""
+    if not isinstance(ballot, dict):
+        return "a cast ballot must be an object"
+    contests = ballot.get("contests")
+    if not isinstance(contests, dict) or not contests:
+        return "a cast ballot must have a contests object"
+    for ggo, ggo_contests in contests.items():
+        if not isinstance(ggo_contests, list):
+            return f"the {ggo} contests must be a list"
+        for contest in ggo_contests:
+            if not isinstance(contest, dict):
+                return f"the {ggo} contests must be objects"
+            for name, body in contest.items():
+                if not isinstance(body, dict) or not isinstance(
+                    body.get("selection"), list
+                ):
+                    return f"the {name} contest must have a selection list"
+    return ""
+
+
+def cast_each(cast, cast_ballots: list, errors=Exception) -> list:
+    """
+    Return the per ballot receipts of casting a batch of cast ballots
+    one after the other via cast(cast_ballot), which returns the
+    (ballot-check, voter-index, qr image, receipt digest) of a cast
+    ballot.  A ballot failing with one of errors is answered with a
+    webapi_error, and stops the batch: the ballots after it are
+    answered as not cast.
+    """
+    receipts = []
+    for index, cast_ballot in enumerate(cast_ballots):
+        try:
+            # the qr image is not returned by the bulk ingestion
+            ballot_check, vote_index, _, receipt_digest = cast(cast_ballot)
+        except errors as error:  # pylint: disable=broad-exception-caught
+            receipts.append({"webapi_error": f"{type(error).__name__}: {error}"})
+            receipts += [{"webapi_error": NOT_CAST} for _ in cast_ballots[index + 1 :]]
+            break
+        receipts.append(
+            {
+                "ballot_check": ballot_check,
+                "ballot_row": vote_index,
+                "receipt_digest": receipt_digest,
+            }
+        )
+    return receipts
+
+
+async def ndjson_lines(chunks):
+    """Yield the (non empty) lines of a stream of NDJSON chunks"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+class BulkCast:  # pylint: disable=too-many-instance-attributes
+    """
+    One bulk ingestion.  acquire() returns a vote store, cast(vote_store_id,
+    ballots) casts a batch of ballots in it and returns the per ballot
+    receipts, and the cast_done(vote_store_id) coroutine is awaited
+    after each batch.  acquire and cast are blocking and are run in the
+    setup and cast pools.
+    """
+
+    # the kinds of the result queue items
+    _RESULT, _WORKER_DONE = 0, 1
+
+    def __init__(
+        self,
+        acquire,
+        cast,
+        cast_done,
+        *,
+        workers: int = 4,
+        batch_size: int = 50,
+        max_ballots: int = 2000,
+    ):
+        # pylint: disable=too-many-arguments
+        self._acquire = acquire
+        self._cast = cast
+        self._cast_done = cast_done
+        self._workers = max(workers, 1)
+        self._batch_size = max(batch_size, 1)
+        self._max_ballots = max(max_ballots, 1)
+        self._batches = asyncio.Queue(self._workers)
+        # a result per ballot, a refusal of the excess ballots and the
+        # done marker of each worker - so that a put never waits
+        self._results = asyncio.Queue(self._max_ballots + 1 + self._workers)
+        self._tasks = []
+        self._start = time.monotonic()
+        self._counts = {"ballots": 0, "cast": 0, "invalid": 0, "errors": 0}
+
+    async def feed(self, chunks):
+        """
+        Parse, validate and batch the uploaded ballots, returning once
+        the upload is read (the batches may still be casting)
+        """
+        self._tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self._workers)
+        ]
+        batch = []
+        number = 0
+        try:
+            async for line in ndjson_lines(chunks):
+                number += 1
+                if number > self._max_ballots:
+                    self._counts["invalid"] += 1
+                    error = f"more than {self._max_ballots} ballots - not read"
+                    self._results.put_nowait(
+                        (BulkCast._RESULT, {"line": number, "webapi_error": error})
+                    )
+                    break
+                self._counts["ballots"] += 1
+                try:
+                    ballot = json.loads(line)
+                    error = validate_ballot(ballot)
+                except ValueError as exc:
+                    error = f"invalid JSON: {exc}"
+                if error:
+                    self._counts["invalid"] += 1
+                    self._results.put_nowait(
+                        (BulkCast._RESULT, {"line": number, "webapi_error": error})
+                    )
+                    continue
+                batch.append((number, ballot))
+                if len(batch) >= self._batch_size:
+                    await self._batches.put(batch)
+                    batch = []
+            if batch:
+                await self._batches.put(batch)
+        except BaseException:
+            # the upload failed - drop the pending batches
+            for task in self._tasks:
+                task.cancel()
+            raise
+        for _ in self._tasks:
+            await self._batches.put(None)
+
+    async def _worker(self):
+        """Cast the batches in one vote store (at a time)"""
+        vote_store_id = None
+        try:
+            while True:
+                batch = await self._batches.get()
+                if batch is None:
+                    return
+                try:
+                    if vote_store_id is None:
+                        vote_store_id = await BackendExecutor.run(
+                            "setup", self._acquire
+                        )
+                    # a disconnect cancels the worker but not the casting
+                    # batch, whose bookkeeping must still be done
+                    receipts = await asyncio.shield(
+                        self._cast_batch(vote_store_id, [ballot for _, ballot in batch])
+                    )
+                except Exception as error:  # pylint: disable=broad-exception-caught
+                    receipts = [
+                        {"webapi_error": f"{type(error).__name__}: {error}"}
+                    ] * len(batch)
+                failed = False
+                for (number, _), receipt in zip(batch, receipts):
+                    if "webapi_error" in receipt:
+                        failed = True
+                        self._counts["errors"] += 1
+                    else:
+                        self._counts["cast"] += 1
+                        receipt = dict(receipt, vote_store_id=vote_store_id)
+                    self._results.put_nowait(
+                        (BulkCast._RESULT, {"line": number, **receipt})
+                    )
+                if failed:
+                    # the vote store may be dirty - continue in a new one
+                    vote_store_id = None
+        finally:
+            self._results.put_nowait((BulkCast._WORKER_DONE, None))
+
+    async def _cast_batch(self, vote_store_id: str, ballots: list) -> list:
+        """Cast a batch in a vote store and record it as cast"""
+        try:
+            return await BackendExecutor.run("cast", self._cast, vote_store_id, ballots)
+        finally:
+            await self._cast_done(vote_store_id)
+
+    async def results(self):
+        """Yield the NDJSON receipts as they are cast, then the summary"""
+        running = len(self._tasks)
+        try:
+            while running:
+                kind, result = await self._results.get()
+                if kind == BulkCast._WORKER_DONE:
+                    running -= 1
+                else:
+                    yield dumps(result) + b"\n"
+            yield dumps(
+                {
+                    "summary": dict(
+                        self._counts,
+                        secs=round(time.monotonic() - self._start, 3),
+                    )
+                }
+            ) + b"\n"
+        finally:
+            for task in self._tasks:
+                task.cancel()
@@ -0,0 +1,200 @@
+"""
+A content addressed cache of serialized web-api responses.  A show
+contest or show versioned receipt response is a function of git commit
+digests only and hence never changes, so the serialized response body
+is cached by request key.  The in-memory part of the cache is bounded
+by bytes and evicts the least recently used bodies to an on-disk spill
+directory, itself bounded by bytes, from where they are promoted back
+into memory on the next hit.  The spill directory is private to the
+process (a temporary directory removed on close) unless one is given,
+and the spilled files are tracked in memory so that trimming it does
+not rescan it.
+
+Since the bodies are immutable the ETag of a response is derived from
+the request key alone, which allows a conditional request to be
+answered with a 304 without touching the cache or the backend.
+"""
+
+import collections
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+# a full git commit digest (sha1 or sha256)
+_DIGEST = re.compile(r"^([0-9a-f]{40}|[0-9a-f]{64})$")
+
+
+def is_digest_list(digests: str) -> bool:
+    """Return whether digests is a comma separated list of full digests"""
+    return all(_DIGEST.match(digest) for digest in digests.split(","))
+
+
+class ContentCache:  # pylint: disable=too-many-instance-attributes
+    """
+    A byte bounded LRU cache of response bodies with an on-disk spill
+    directory.  A spill_dir of None spills to a private temporary
+    directory, an empty one disables spilling.
+    """
+
+    # the Cache-Control header value of an immutable response
+    CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+    def __init__(
+        self, max_bytes: int, spill_dir: str | None = None, max_spill_bytes: int = 0
+    ):
+        self._max_bytes = max_bytes
+        self._owns_spill_dir = spill_dir is None
+        if spill_dir is None:
+            spill_dir = tempfile.mkdtemp(prefix="vtp-content-cache-")
+        self._spill_dir = spill_dir
+        self._max_spill_bytes = max_spill_bytes
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        # the sizes of the spilled files, the least recently spilled first
+        self._spilled = collections.OrderedDict()
+        self._spilled_bytes = 0
+        self._lock = threading.Lock()
+        # statistics
+        self._hits = 0
+        self._spill_hits = 0
+        self._misses = 0
+        self._spills = 0
+        if self._spill_dir:
+            os.makedirs(self._spill_dir, exist_ok=True)
+            self._scan_spill_dir()
+
+    def _scan_spill_dir(self):
+        """Track the files of a given spill directory, oldest first"""
+        files = []
+        with os.scandir(self._spill_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".tmp"):
+                    continue
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._spilled[name] = size
+            self._spilled_bytes += size
+
+    @property
+    def spill_dir(self) -> str:
+        """Return the spill directory (empty when not spilling)"""
+        return self._spill_dir
+
+    def close(self):
+        """Remove the spill directory when it is private to the cache"""
+        if self._owns_spill_dir:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+
+    @staticmethod
+    def key_digest(key: str) -> str:
+        """Return the digest of a request key"""
+        return hashlib.sha256(key.encode("utf8")).hexdigest()
+
+    @staticmethod
+    def etag(key: str) -> str:
+        """Return the strong ETag of the response of a request key"""
+        return f'"{ContentCache.key_digest(key)[:32]}"'
+
+    @staticmethod
+    def etag_matches(if_none_match: str, etag: str) -> bool:
+        """Return whether an If-None-Match header matches etag"""
+        candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates
+
+    def _spill_path(self, key: str) -> str:
+        """Return the spill file of a key"""
+        return os.path.join(self._spill_dir, ContentCache.key_digest(key))
+
+    def get(self, key: str) -> bytes | None:
+        """Return the cached body of key, or None"""
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._hits += 1
+                self._entries.move_to_end(key)
+                return body
+        if self._spill_dir:
+            try:
+                with open(self._spill_path(key), "rb") as infile:
+                    body = infile.read()
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            if body is None:
+                self._misses += 1
+                return None
+            self._spill_hits += 1
+        # promote it back into memory
+        self.put(key, body)
+        return body
+
+    def put(self, key: str, body: bytes):
+        """Cache the body of key, spilling the least recently used"""
+        spilled = []
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key))
+            if len(body) > self._max_bytes:
+                spilled.append((key, body))
+            else:
+                self._entries[key] = body
+                self._bytes += len(body)
+            while self._bytes > self._max_bytes:
+                old_key, old_body = self._entries.popitem(last=False)
+                self._bytes -= len(old_body)
+                spilled.append((old_key, old_body))
+            self._spills += len(spilled)
+        if self._spill_dir and spilled:
+            for old_key, old_body in spilled:
+                self._spill(old_key, old_body)
+            self._trim_spill_dir()
+
+    def _spill(self, key: str, body: bytes):
+        """Write a body to the spill directory"""
+        name = ContentCache.key_digest(key)
+        with self._lock:
+            if name in self._spilled:
+                # refresh its position in the on-disk LRU order
+                self._spilled.move_to_end(name)
+                return
+        path = os.path.join(self._spill_dir, name)
+        temp = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp, "wb") as outfile:
+            outfile.write(body)
+        os.replace(temp, path)
+        with self._lock:
+            if name not in self._spilled:
+                self._spilled[name] = len(body)
+                self._spilled_bytes += len(body)
+
+    def _trim_spill_dir(self):
+        """Remove the oldest spill files beyond max_spill_bytes"""
+        removed = []
+        with self._lock:
+            while self._spilled and self._spilled_bytes > self._max_spill_bytes:
+                name, size = self._spilled.popitem(last=False)
+                self._spilled_bytes -= size
+                removed.append(name)
+        for name in removed:
+            try:
+                os.remove(os.path.join(self._spill_dir, name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        """Return the cache statistics"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self._max_bytes,
+                "hits": self._hits,
+                "spill_hits": self._spill_hits,
+                "misses": self._misses,
+                "spills": self._spills,
+                "spilled_bytes": self._spilled_bytes,
+            }
@@ -0,0 +1,152 @@
+"""
+Executor support for the web-api.  The VtpBackend methods are
+synchronous and nominally run a series of git commands in an
+ElectionData workspace.  Calling them directly from an async FastAPI
+endpoint blocks the uvicorn event loop for the duration of the git
+commands, which means that a single cast or tally stalls every other
+connected client, including the static pages and /web-api/version.
+
+The BackendExecutor below maintains one bounded pool per backend
+operation type (setup, ballot, cast, verify, tally, show, registry).
+The endpoints await BackendExecutor.run which hands the blocking call
+to the appropriate pool.  When a pool is full the call simply waits in
+the pool's queue - the event loop itself is never blocked.
+
+Each pool is sized via an environment variable read once when the
+pool is first used:
+
+    VTP_EXECUTOR_<TYPE>_WORKERS - the max number of concurrent workers
+
+where <TYPE> is the upper cased operation type, for example
+VTP_EXECUTOR_TALLY_WORKERS=2.  The pools are thread pools: the backend
+calls share in-process state with the web-api (the workspace pool and
+locks, the result caches, the merge queue), and most of the callables
+handed to the pools (bound methods holding locks, generators) cannot be
+pickled for a process pool anyway.  The git commands the backend runs
+are subprocesses, so the threads do not serialize on the GIL while
+they wait for them.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BackendExecutor:
+    """
+    Class to keep the namespace separate.  Maintains the per operation
+    type pools that run the blocking VtpBackend calls.
+    """
+
+    ########
+    # executor constants
+    ########
+    # the default number of workers per operation type
+    _DEFAULT_POOL_SIZES = {
+        "setup": 4,
+        "ballot": 4,
+        "cast": 4,
+        "verify": 4,
+        "tally": 2,
+        "show": 4,
+        "registry": 4,
+    }
+    # the default pool size of an unlisted operation type
+    _DEFAULT_POOL_SIZE = 2
+
+    ########
+    # executor state
+    ########
+    _pools: dict[str, ThreadPoolExecutor] = {}
+    _pool_sizes: dict[str, int] = {}
+    _submitted: dict[str, int] = {}
+    _pending: dict[str, int] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _env_name(op_type: str, suffix: str) -> str:
+        """Return the environment variable name for an op_type setting"""
+        return f"VTP_EXECUTOR_{op_type.upper()}_{suffix}"
+
+    @staticmethod
+    def get_pool(op_type: str) -> ThreadPoolExecutor:
+        """
+        Return the pool for the op_type, creating it on first use
+        """
+        with BackendExecutor._lock:
+            if op_type in BackendExecutor._pools:
+                return BackendExecutor._pools[op_type]
+            size = int(
+                os.getenv(
+                    BackendExecutor._env_name(op_type, "WORKERS"),
+                    BackendExecutor._DEFAULT_POOL_SIZES.get(
+                        op_type, BackendExecutor._DEFAULT_POOL_SIZE
+                    ),
+                )
+            )
+            if size < 1:
+                raise ValueError(
+                    f"the {op_type} executor pool requires at least one worker ({size})"
+                )
+            pool = ThreadPoolExecutor(
+                max_workers=size, thread_name_prefix=f"vtp-{op_type}"
+            )
+            BackendExecutor._pools[op_type] = pool
+            BackendExecutor._pool_sizes[op_type] = size
+            BackendExecutor._submitted[op_type] = 0
+            BackendExecutor._pending[op_type] = 0
+            return pool
+
+    @staticmethod
+    async def run(op_type: str, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) in the op_type pool and return its
+        result.  If the pool is busy the call waits in the pool queue
+        without blocking the event loop.
+        """
+        pool = BackendExecutor.get_pool(op_type)
+        # carry the request context into the worker thread
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, func, *args, **kwargs)
+        with BackendExecutor._lock:
+            BackendExecutor._submitted[op_type] += 1
+            BackendExecutor._pending[op_type] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, call)
+        finally:
+            with BackendExecutor._lock:
+                # the pools may have been shutdown in the meantime
+                if op_type in BackendExecutor._pending:
+                    BackendExecutor._pending[op_type] -= 1
+
+    @staticmethod
+    def stats() -> dict:
+        """
+        Return the per op_type pool size, the number of pending
+        (queued or running) calls, and the total number of submitted
+        calls.
+        """
+        with BackendExecutor._lock:
+            return {
+                op_type: {
+                    "workers": BackendExecutor._pool_sizes[op_type],
+                    "pending": BackendExecutor._pending[op_type],
+                    "submitted": BackendExecutor._submitted[op_type],
+                }
+                for op_type in BackendExecutor._pools
+            }
+
+    @staticmethod
+    def shutdown(wait: bool = True):
+        """Shutdown all the pools"""
+        with BackendExecutor._lock:
+            pools = list(BackendExecutor._pools.values())
+            BackendExecutor._pools.clear()
+            BackendExecutor._pool_sizes.clear()
+            BackendExecutor._submitted.clear()
+            BackendExecutor._pending.clear()
+        for pool in pools:
+            pool.shutdown(wait=wait)
@@ -0,0 +1,41 @@
+"""
+A fast JSON response path for the web-api.  The backend results (the
+tally stdout arrays, the git log dicts, the ballot-check matrices) are
+plain JSON data, so the endpoints that return them serialize them
+straight to bytes with FastJSONResponse - skipping FastAPI's
+jsonable_encoder walk - and the caches keep and serve those bytes.
+
+orjson is used when it is installed (pip install orjson), otherwise the
+standard library json module with compact separators.
+"""
+
+import json
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def dumps(content) -> bytes:
+    """Serialize JSON data to bytes"""
+    if orjson is not None:
+        # pylint: disable=no-member
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, ensure_ascii=False, separators=(",", ":"), default=str
+    ).encode("utf8")
+
+
+class FastJSONResponse(Response):  # pylint: disable=too-few-public-methods
+    """A JSON response serialized with dumps, or made of serialized bytes"""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        """Return the content serialized, or as is when already bytes"""
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
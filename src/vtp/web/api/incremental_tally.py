@@ -0,0 +1,662 @@
+"""
+An incremental tally engine for the web-api.  A TallyContestsOperation
+re-reads and re-counts every CVR of an election on every call.  While
+the polls are open the CVRs only ever get appended (merged), so the
+IncrementalTally below keeps a compact per contest ballot store (the
+ranked choices of each CVR as a small-int array) of the CVRs of one
+HEAD commit.  The ballot stores of a commit are the same in every clone
+of the ElectionData repo, so they are kept per commit rather than per
+workspace: all the GUID workspaces cloned at the same upstream HEAD
+share them, and the stores of a new HEAD are derived from those of its
+most recently used ancestor (a previous checkpoint) by folding in the
+CVR commits between the two.  The rounds are then re-run over the
+in-memory store.
+
+If none of the checkpoints is an ancestor of the HEAD (a reset, a
+garbage collected commit) the stores are built from scratch.  In
+verify mode every incremental tally is also recounted by the backend (a
+TallyContestsOperation) and the rendered lines of the two are compared
+- on a mismatch the recount wins, the first differing line is logged
+and all the ballot stores are dropped.
+
+The tally results are a list of structured records (one header record
+per contest followed by one record per round) which render_lines
+converts into the same console log style lines that the backend
+produces, and parse_lines converts such lines (the mock data) back
+into the records.
+"""
+
+import array
+import ast
+import collections
+import json
+import logging
+import re
+import subprocess
+import threading
+import time
+
+from repo_state import head_digest
+
+
+class ContestBallots:  # pylint: disable=too-many-instance-attributes
+    """
+    The compact ballot store of a single contest - the ranked choice
+    indices of all the CVRs are stored back to back in one array with
+    a second array holding the per CVR offsets.
+    """
+
+    def __init__(self, cvr: dict):
+        self.uid = cvr["uid"]
+        self.name = cvr.get("name", "")
+        self.tally = cvr.get("tally", "plurality")
+        self.max = int(cvr.get("max", 1))
+        self.win_by = float(cvr.get("win_by", 0.5))
+        self.choices = [choice["name"] for choice in cvr["choices"]]
+        self.rankings = array.array("H")
+        self.offsets = array.array("L", [0])
+        self.digests = []
+        self.digest_index = {}
+
+    def __len__(self) -> int:
+        return len(self.digests)
+
+    def append(self, digest: str, selection: list):
+        """Append the selection (the ranked choices) of a CVR"""
+        for choice in selection:
+            # a selection is nominally '<index>: <name>'
+            index, _, name = str(choice).partition(":")
+            if index.strip().isdigit():
+                index = int(index)
+            elif choice in self.choices:
+                index = self.choices.index(choice)
+            elif name.strip() in self.choices:
+                index = self.choices.index(name.strip())
+            else:
+                continue
+            if 0 <= index < len(self.choices):
+                self.rankings.append(index)
+        self.offsets.append(len(self.rankings))
+        self.digest_index[digest] = len(self.digests)
+        self.digests.append(digest)
+
+    def snapshot(self):
+        """Return a copy of the ballot store that later appends do not touch"""
+        copy = ContestBallots.__new__(ContestBallots)
+        copy.__dict__.update(self.__dict__)
+        copy.rankings = array.array("H", self.rankings)
+        copy.offsets = array.array("L", self.offsets)
+        copy.digests = list(self.digests)
+        copy.digest_index = dict(self.digest_index)
+        return copy
+
+    def ranking(self, ballot: int) -> array.array:
+        """Return the ranked choice indices of a ballot"""
+        return self.rankings[self.offsets[ballot] : self.offsets[ballot + 1]]
+
+
+def _tracked_choices(contest: ContestBallots, tracked: list, current) -> list:
+    """Return where the tracked digests currently land"""
+    landed = []
+    for digest in tracked:
+        if digest not in contest.digest_index:
+            continue
+        choice = current(contest.digest_index[digest])
+        landed.append(
+            {
+                "digest": digest,
+                "choice": None if choice is None else contest.choices[choice],
+            }
+        )
+    return landed
+
+
+def _header_record(contest: ContestBallots) -> dict:
+    """Return the header record of a contest tally"""
+    return {
+        "record": "contest",
+        "contest_uid": contest.uid,
+        "contest_name": contest.name,
+        "tally": contest.tally,
+        "max": contest.max,
+        "win_by": contest.win_by,
+        "scanned": len(contest),
+    }
+
+
+def _round_record(contest, number, counts, order, total, **fields) -> dict:
+    """Return a round record of a contest tally"""
+    record = {
+        "record": "round",
+        "contest_uid": contest.uid,
+        "round": number,
+        "total": total,
+        "counts": [[contest.choices[choice], counts[choice]] for choice in order],
+        "eliminated": [],
+        "tracked": [],
+        "final": False,
+        "winners": [],
+    }
+    record.update(fields)
+    return record
+
+
+def _ranked(contest: ContestBallots, counts: list, choices) -> list:
+    """
+    Return the choices as the backend lists them - by decreasing count,
+    ties in alphabetical order
+    """
+    return sorted(
+        choices, key=lambda choice: (-counts[choice], contest.choices[choice])
+    )
+
+
+def plurality_rounds(contest: ContestBallots, tracked: list):
+    """Yield the (single) round of a plurality contest"""
+    counts = [0] * len(contest.choices)
+    for ballot in range(len(contest)):
+        for choice in contest.ranking(ballot)[: contest.max]:
+            counts[choice] += 1
+    order = _ranked(contest, counts, range(len(counts)))
+
+    def current(ballot):
+        ranking = contest.ranking(ballot)
+        return ranking[0] if ranking else None
+
+    yield _round_record(
+        contest,
+        0,
+        counts,
+        order,
+        sum(counts),
+        tracked=_tracked_choices(contest, tracked, current),
+        final=True,
+        winners=[contest.choices[choice] for choice in order[: contest.max]],
+    )
+
+
+def rcv_rounds(contest: ContestBallots, tracked: list):
+    """
+    Yield the RCV rounds of a contest as they are computed.  Each
+    ballot sits in the pile of its highest ranked continuing choice
+    and only the ballots of the eliminated choices are re-routed
+    between rounds.  All the choices tied for last place are
+    eliminated together.  As in the backend, the eliminated choices
+    are listed (with a zero count) after the continuing ones, the most
+    recently eliminated first.
+    """
+    # pylint: disable=too-many-locals
+    rankings, offsets = contest.rankings, contest.offsets
+    continuing = set(range(len(contest.choices)))
+    piles = [[] for _ in contest.choices]
+    positions = array.array("L", offsets[:-1])
+
+    def route(ballot):
+        position, end = positions[ballot], offsets[ballot + 1]
+        while position < end and rankings[position] not in continuing:
+            position += 1
+        positions[ballot] = position
+        if position < end:
+            piles[rankings[position]].append(ballot)
+
+    def current(ballot):
+        position = positions[ballot]
+        if position < offsets[ballot + 1]:
+            return rankings[position]
+        return None
+
+    for ballot in range(len(contest)):
+        route(ballot)
+    eliminated = []
+    number = 0
+    while True:
+        counts = [
+            len(pile) if choice in continuing else 0
+            for choice, pile in enumerate(piles)
+        ]
+        total = sum(counts)
+        order = _ranked(contest, counts, continuing) + eliminated
+        landed = _tracked_choices(contest, tracked, current)
+        leader = order[0] if order else None
+        if (
+            total == 0
+            or counts[leader] > contest.win_by * total
+            or len(continuing) <= 1
+        ):
+            winners = [] if total == 0 else [contest.choices[leader]]
+            yield _round_record(
+                contest,
+                number,
+                counts,
+                order,
+                total,
+                tracked=landed,
+                final=True,
+                winners=winners,
+            )
+            return
+        lowest = min(counts[choice] for choice in continuing)
+        losers = [
+            choice
+            for choice in order
+            if choice in continuing and counts[choice] == lowest
+        ]
+        if len(losers) == len(continuing):
+            # everyone remaining is tied
+            yield _round_record(
+                contest,
+                number,
+                counts,
+                order,
+                total,
+                tracked=landed,
+                final=True,
+                winners=[contest.choices[choice] for choice in losers],
+            )
+            return
+        yield _round_record(
+            contest,
+            number,
+            counts,
+            order,
+            total,
+            tracked=landed,
+            eliminated=[contest.choices[choice] for choice in losers],
+        )
+        continuing.difference_update(losers)
+        eliminated = losers[::-1] + eliminated
+        for loser in losers:
+            pile, piles[loser] = piles[loser], []
+            for ballot in pile:
+                route(ballot)
+        number += 1
+
+
+def contest_records(contest: ContestBallots, tracked: list):
+    """Yield the header and round records of a contest tally"""
+    yield _header_record(contest)
+    if contest.tally == "rcv":
+        yield from rcv_rounds(contest, tracked)
+    else:
+        yield from plurality_rounds(contest, tracked)
+
+
+def render_lines(records) -> list:
+    """Render tally records as console log style lines"""
+    lines = []
+    header = {}
+    for record in records:
+        if record["record"] == "contest":
+            header = record
+            lines.append(
+                f"Scanned {record['scanned']} contests for contest "
+                f"({record['contest_name']}) uid={record['contest_uid']}, "
+                f"tally={record['tally']}, max={record['max']}, "
+                f"win-by>{record['win_by']}"
+            )
+            continue
+        if header["tally"] == "rcv":
+            lines.append(f"RCV: round {record['round']}")
+        if record["round"] == 0:
+            # the backend reports the tracked CVRs as it counts them
+            for landed in record["tracked"]:
+                choice = landed["choice"] if landed["choice"] else "(exhausted)"
+                lines.append(f"Counted {landed['digest']}: choice={choice}")
+        lines.append(f"Total vote count: {record['total']}")
+        if record["final"]:
+            lines.append(
+                f"Final results for contest {header['contest_name']} "
+                f"(uid={record['contest_uid']}):"
+            )
+            lines.extend(f"  {tuple(count)}" for count in record["counts"])
+        else:
+            lines.append(str([tuple(count) for count in record["counts"]]))
+    return lines
+
+
+_HEADER_LINE = re.compile(
+    r"Scanned (?P<scanned>\d+) contests for contest \((?P<name>.*)\) "
+    r"uid=(?P<uid>[^,]*), tally=(?P<tally>[^,]*), max=(?P<max>\d+), "
+    r"win-by>(?P<win_by>[0-9.]+)$"
+)
+_COUNTED_LINE = re.compile(r"Counted (?P<digest>\S+): choice=(?P<choice>.*)$")
+
+
+def _close_rounds(header: dict, rounds: list):
+    """
+    Fill in the eliminated choices and the winners of the parsed rounds
+    of a contest - as in rcv_rounds all the continuing choices tied for
+    last place are eliminated together
+    """
+    continuing = {name for name, _ in rounds[0]["counts"]} if rounds else set()
+    for record in rounds:
+        counts = {name: count for name, count in record["counts"] if name in continuing}
+        if not counts:
+            continue
+        if not record["final"]:
+            lowest = min(counts.values())
+            record["eliminated"] = [
+                name for name, count in counts.items() if count == lowest
+            ]
+            continuing.difference_update(record["eliminated"])
+        elif header["tally"] != "rcv":
+            record["winners"] = list(counts)[: header["max"]]
+        elif len(counts) > 1 and len(set(counts.values())) == 1:
+            # everyone remaining is tied
+            record["winners"] = list(counts)
+        elif record["total"]:
+            record["winners"] = list(counts)[:1]
+
+
+def _parse_round(record: dict, line: str):
+    """Parse a line of a tally round into its record"""
+    counted = _COUNTED_LINE.match(line)
+    if counted:
+        choice = counted["choice"]
+        record["tracked"].append(
+            {
+                "digest": counted["digest"],
+                "choice": None if choice == "(exhausted)" else choice,
+            }
+        )
+    elif line.startswith("Total vote count: "):
+        record["total"] = int(line.split()[-1])
+    elif line.startswith("Final results for contest "):
+        record["final"] = True
+    elif line.startswith("["):
+        record["counts"] = [list(count) for count in ast.literal_eval(line)]
+    elif line.startswith("  ("):
+        record["counts"].append(list(ast.literal_eval(line.strip())))
+
+
+def parse_lines(lines: list) -> list:
+    """
+    Return the tally records of console log style tally lines (the mock
+    data) - the inverse of render_lines.  The lines only show where the
+    tracked digests landed in the first round, so the later rounds have
+    no tracked entries.
+    """
+    records = []
+    contests = []
+    for line in lines:
+        header = _HEADER_LINE.match(line)
+        if header:
+            contests.append(
+                (
+                    {
+                        "record": "contest",
+                        "contest_uid": header["uid"],
+                        "contest_name": header["name"],
+                        "tally": header["tally"],
+                        "max": int(header["max"]),
+                        "win_by": float(header["win_by"]),
+                        "scanned": int(header["scanned"]),
+                    },
+                    [],
+                )
+            )
+            records.append(contests[-1][0])
+            continue
+        if not contests:
+            continue
+        header, rounds = contests[-1]
+        # a plurality tally has a single round and no round line
+        if line.startswith("RCV: round ") or (header["tally"] != "rcv" and not rounds):
+            rounds.append(
+                {
+                    "record": "round",
+                    "contest_uid": header["contest_uid"],
+                    "round": int(line.split()[-1]) if line.startswith("RCV:") else 0,
+                    "total": 0,
+                    "counts": [],
+                    "eliminated": [],
+                    "tracked": [],
+                    "final": False,
+                    "winners": [],
+                }
+            )
+            records.append(rounds[-1])
+        if rounds:
+            _parse_round(rounds[-1], line)
+    for header, rounds in contests:
+        _close_rounds(header, rounds)
+    return records
+
+
+class IncrementalTally:
+    """
+    The ballot stores of the CVRs of one commit (the checkpoint), read
+    from an ElectionData workspace
+    """
+
+    def __init__(self, election_data_dir: str):
+        self.election_data_dir = election_data_dir
+        self.lock = threading.Lock()
+        self.checkpoint = ""
+        self.contests = {}
+
+    @staticmethod
+    def read_cvrs(election_data_dir: str, revisions: str) -> list:
+        """
+        Return the (digest, CVR) pairs of the CVR commits in the
+        revisions range, oldest first.  Commits whose message is not a
+        CVR are skipped.
+        """
+        log = subprocess.run(
+            [
+                "git",
+                "log",
+                "--topo-order",
+                "--no-merges",
+                "--pretty=format:%H%x00%B%x1e",
+                revisions,
+            ],
+            cwd=election_data_dir,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        cvrs = []
+        for entry in log.split("\x1e"):
+            digest, _, body = entry.strip().partition("\x00")
+            if not body:
+                continue
+            try:
+                cvr = json.loads(body)["CVR"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            if isinstance(cvr, dict) and "uid" in cvr and "choices" in cvr:
+                cvrs.append((digest, cvr))
+        cvrs.reverse()
+        return cvrs
+
+    @staticmethod
+    def fold(contests: dict, cvrs: list):
+        """Append the CVRs to the contests ballot stores"""
+        for digest, cvr in cvrs:
+            if cvr["uid"] not in contests:
+                contests[cvr["uid"]] = ContestBallots(cvr)
+            contests[cvr["uid"]].append(digest, cvr.get("selection", []))
+
+    def _is_ancestor(self, checkpoint: str, head: str) -> bool:
+        """Return whether checkpoint is an ancestor of head"""
+        return (
+            subprocess.run(
+                ["git", "merge-base", "--is-ancestor", checkpoint, head],
+                cwd=self.election_data_dir,
+                check=False,
+                capture_output=True,
+            ).returncode
+            == 0
+        )
+
+    def update(self, head: str = "", bases: list = ()) -> int:
+        """
+        Bring the ballot stores to head (by default the workspace HEAD)
+        - requires the lock.  The CVRs added since the checkpoint are
+        folded in or, failing that, those added since the checkpoint of
+        the first of the bases (the IncrementalTally of other commits)
+        that is an ancestor of head, whose stores are copied.  Returns
+        the number of CVRs folded in or -1 when the ballot stores had
+        to be rebuilt.
+        """
+        head = head or head_digest(self.election_data_dir)
+        if head == self.checkpoint:
+            return 0
+        for base in [self, *bases]:
+            if base.checkpoint and self._is_ancestor(base.checkpoint, head):
+                cvrs = IncrementalTally.read_cvrs(
+                    self.election_data_dir, f"{base.checkpoint}..{head}"
+                )
+                if base is not self:
+                    self.contests = {
+                        uid: contest.snapshot()
+                        for uid, contest in base.contests.items()
+                    }
+                IncrementalTally.fold(self.contests, cvrs)
+                self.checkpoint = head
+                return len(cvrs)
+        self.contests = {}
+        IncrementalTally.fold(
+            self.contests, IncrementalTally.read_cvrs(self.election_data_dir, head)
+        )
+        self.checkpoint = head
+        return -1
+
+    @staticmethod
+    def select(contests: dict, contest_uids: str) -> list:
+        """Return the selected contests sorted by uid"""
+        if contest_uids in ("", "all"):
+            uids = sorted(contests)
+        else:
+            uids = sorted(uid for uid in contest_uids.split(",") if uid in contests)
+        return [contests[uid] for uid in uids]
+
+    def records(self, contest_uids: str, digests: str):
+        """Yield the tally records of the selected contests"""
+        tracked = [digest for digest in digests.split(",") if digest]
+        for contest in IncrementalTally.select(self.contests, contest_uids):
+            yield from contest_records(contest, tracked)
+
+
+class IncrementalTallies:
+    """
+    Class to keep the namespace separate.  Holds the IncrementalTally
+    of the most recently tallied HEAD commits, whichever workspaces
+    they were tallied in.  The IncrementalTally of a commit is built
+    once and then only read.
+    """
+
+    # the max number of commits with in-memory ballot stores
+    _MAX_HEADS = 8
+
+    _tallies = collections.OrderedDict()
+    _lock = threading.Lock()
+    _stats = collections.Counter()
+
+    @staticmethod
+    def get(election_data_dir: str, head: str = "") -> IncrementalTally:
+        """
+        Return the IncrementalTally of a HEAD commit (by default the
+        HEAD of the workspace), building it on first use from the
+        workspace
+        """
+        head = head or head_digest(election_data_dir)
+        with IncrementalTallies._lock:
+            tally = IncrementalTallies._tallies.get(head)
+            if tally is None:
+                tally = IncrementalTallies._tallies[head] = IncrementalTally(
+                    election_data_dir
+                )
+                while len(IncrementalTallies._tallies) > IncrementalTallies._MAX_HEADS:
+                    IncrementalTallies._tallies.popitem(last=False)
+            IncrementalTallies._tallies.move_to_end(head)
+            # the built tallies, the most recently used first
+            bases = [
+                base
+                for base in reversed(IncrementalTallies._tallies.values())
+                if base.checkpoint
+            ]
+        with tally.lock:
+            if tally.checkpoint != head:
+                folded = tally.update(head, bases)
+                if folded < 0:
+                    IncrementalTallies._count(rebuilds=1)
+                else:
+                    IncrementalTallies._count(folded_cvrs=folded)
+            else:
+                IncrementalTallies._count(shared=1)
+        return tally
+
+    @staticmethod
+    def _count(**counts):
+        """Bump the statistics counters"""
+        with IncrementalTallies._lock:
+            IncrementalTallies._stats.update(counts)
+
+    @staticmethod
+    def stream(election_data_dir: str, contest_uids: str, digests: str):
+        """
+        Return a generator of the tally records of the selected
+        contests which computes the rounds as they are consumed.  The
+        new CVRs are folded in up front, and as the ballot stores of a
+        commit are only read the generator holds no lock.
+        """
+        tally = IncrementalTallies.get(election_data_dir)
+        IncrementalTallies._count(streams=1)
+        return tally.records(contest_uids, digests)
+
+    @staticmethod
+    def tally(election_data_dir: str, contest_uids: str, digests: str) -> list:
+        """
+        Return the tally records of the selected contests of the
+        workspace HEAD, folding in the new CVRs first
+        """
+        start = time.monotonic()
+        tally = IncrementalTallies.get(election_data_dir)
+        records = list(tally.records(contest_uids, digests))
+        IncrementalTallies._count(
+            tallies=1, tally_usecs=int((time.monotonic() - start) * 1e6)
+        )
+        return records
+
+    @staticmethod
+    def check(election_data_dir: str, lines: list, recount_lines: list) -> list:
+        """
+        Check the rendered lines of an incremental tally against the
+        lines of a backend recount (a TallyContestsOperation) of the same
+        contests.  On a mismatch the recount wins and, as the ballot
+        stores of the other commits may be derived from the mismatched
+        ones, all of them are rebuilt on the next tallies.
+        """
+        IncrementalTallies._count(verifications=1)
+        if lines == recount_lines:
+            return lines
+        mismatch = next(
+            (
+                index
+                for index, (line, recount_line) in enumerate(zip(lines, recount_lines))
+                if line != recount_line
+            ),
+            min(len(lines), len(recount_lines)),
+        )
+        logging.error(
+            "incremental tally of %s does not match the recount at line %s: %r != %r",
+            election_data_dir,
+            mismatch,
+            lines[mismatch] if mismatch < len(lines) else None,
+            recount_lines[mismatch] if mismatch < len(recount_lines) else None,
+        )
+        IncrementalTallies._count(mismatches=1)
+        with IncrementalTallies._lock:
+            IncrementalTallies._tallies.clear()
+        return recount_lines
+
+    @staticmethod
+    def stats() -> dict:
+        """Return the incremental tally statistics"""
+        with IncrementalTallies._lock:
+            return dict(
+                IncrementalTallies._stats,
+                heads=len(IncrementalTallies._tallies),
+            )
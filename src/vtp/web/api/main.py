@@ -1,19 +1,408 @@
 """API endpoints for the VoteTrackerPlus backend"""
 
-from backend import VtpBackend
-from fastapi import FastAPI, status
-from fastapi.responses import RedirectResponse
+import asyncio
+import functools
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
+from admin import admin_router, is_admin
+from bulk_cast import BulkCast
+from content_cache import ContentCache, is_digest_list
+from executor import BackendExecutor
+from fast_json import FastJSONResponse, dumps
+from fastapi import (
+    FastAPI,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
+from merge_queue import MergeQueue
+from metrics import Metrics
+from polls import Polls, PollsBusy, PollsClosed
+from profiler import Profiler
+from response_compression import Compression, EncodedBody
+from starlette.routing import Match
+from tally_feed import (
+    InvalidSubscription,
+    TallyFeed,
+    TallyFeedFull,
+    ballot_uids,
+    feed_uids,
+)
+from vote_store_registry import POOLED, open_registry
+from warm_up import WarmUp
+from workspace_pool import WorkspacePool
+from workspace_reaper import WorkspaceReaper
 
 # from starlette.responses import FileResponse
 
-app = FastAPI()
+# the backend - the VoteTrackerPlus one (optionally in mock mode) or a
+# latency realistic simulation of it
+if os.getenv("VTP_BACKEND") == "simulated":
+    from simulated_backend import SimulatedBackend as VtpBackend
+else:
+    from backend import VtpBackend
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Start and stop the web-api support services"""
+    workspace_pool.start()
+    workspace_reaper.start()
+    if VtpBackend.MERGE_CONTESTS:
+        merge_queue.start()
+    tally_feed.start()
+    expiry = asyncio.create_task(expire_vote_store_ids())
+    # warm the backend up before (blocking) or while serving the voters
+    warming = asyncio.create_task(BackendExecutor.run("setup", warm_up.run))
+    if WARM_UP_MODE == "blocking":
+        await warming
+    yield
+    warming.cancel()
+    expiry.cancel()
+    tally_feed.stop()
+    merge_queue.stop()
+    workspace_reaper.stop()
+    workspace_pool.stop()
+    BackendExecutor.shutdown()
+    content_cache.close()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 ########
 # local variables
 ########
-# A dict to store VoteStoreIDs
-vote_store_ids = {}
+# The (dict like) registry of the VoteStoreIDs
+VOTE_STORE_TTL = float(os.getenv("VTP_VOTE_STORE_TTL", "3600"))
+vote_store_ids = open_registry(
+    os.getenv("VTP_VOTE_STORE_REGISTRY", "memory"), ttl=VOTE_STORE_TTL
+)
+
+
+def provision_workspace() -> str:
+    """
+    Provision a GUID workspace for the pool - registered as pooled, so
+    that the reapers of the other workers leave it alone, until it is
+    handed out
+    """
+    vote_store_id = VtpBackend.get_vote_store_id()
+    vote_store_ids.set(vote_store_id, POOLED)
+    return vote_store_id
+
+
+# The pre-provisioned GUID workspaces handed out to cast_ballot - none
+# in mock mode, which has no workspaces
+workspace_pool = WorkspacePool(
+    provision_workspace,
+    target_size=(
+        0
+        if os.getenv("VTP_BACKEND") == "mock"
+        else int(os.getenv("VTP_WORKSPACE_POOL_SIZE", "4"))
+    ),
+    refill_threads=int(os.getenv("VTP_WORKSPACE_POOL_THREADS", "1")),
+)
+# The startup warm-up - 'background' (the default), 'blocking' (before
+# serving), or 'off'
+WARM_UP_MODE = os.getenv("VTP_WARMUP", "background")
+warm_up = WarmUp(
+    {}
+    if WARM_UP_MODE == "off"
+    else {
+        **VtpBackend.warm_up_steps(),
+        "workspace_pool": functools.partial(
+            workspace_pool.wait_filled,
+            float(os.getenv("VTP_WARMUP_POOL_TIMEOUT", "60")),
+        ),
+    }
+)
+# The batched merges of the cast contests
+merge_queue = MergeQueue(
+    os.getenv(
+        "VTP_MERGE_QUEUE_PATH",
+        os.path.join(tempfile.gettempdir(), "vtp-merge-queue.db"),
+    ),
+    VtpBackend.merge_contests,
+    batch_size=int(os.getenv("VTP_MERGE_BATCH_SIZE", "50")),
+    max_age=float(os.getenv("VTP_MERGE_MAX_AGE", "5")),
+    max_attempts=int(os.getenv("VTP_MERGE_MAX_ATTEMPTS", "5")),
+)
+
+
+def mark_merged(merged_vote_store_ids: list):
+    """Mark the vote stores of a merged batch as merged"""
+    for vote_store_id in merged_vote_store_ids:
+        if vote_store_ids.get(vote_store_id) == "cast":
+            vote_store_ids[vote_store_id] = "merged"
+
+
+merge_queue.on_merged(mark_merged)
+# The live tallies pushed to the subscribers on each merge
+tally_feed = TallyFeed(
+    VtpBackend.tally_merged,
+    lambda: ballot_uids(VtpBackend.get_blank_ballot()),
+    max_subscribers=int(os.getenv("VTP_TALLY_FEED_MAX_SUBSCRIBERS", "1000")),
+    queue_size=int(os.getenv("VTP_TALLY_FEED_QUEUE", "4")),
+    max_contests=int(os.getenv("VTP_TALLY_FEED_MAX_CONTESTS", "32")),
+)
+TALLY_FEED_KEEPALIVE = float(os.getenv("VTP_TALLY_FEED_KEEPALIVE", "15"))
+merge_queue.on_merged(tally_feed.merged)
+# The background remover of the abandoned and merged GUID workspaces
+workspace_reaper = WorkspaceReaper(
+    VtpBackend.get_all_guid_workspaces,
+    VtpBackend.get_guid_workspace_dir,
+    vote_store_ids,
+    workspace_pool.is_ready,
+    lock=VtpBackend.lock_vote_store,
+    idle_ttl=float(os.getenv("VTP_WORKSPACE_IDLE_TTL", "7200")),
+    merged_ttl=float(os.getenv("VTP_WORKSPACE_MERGED_TTL", "3600")),
+    archive_dir=os.getenv("VTP_WORKSPACE_ARCHIVE_DIR", ""),
+    interval=float(os.getenv("VTP_WORKSPACE_REAPER_INTERVAL", "300")),
+)
+# The polls state and the cast_ballot admission control
+polls = Polls(
+    max_concurrent=int(os.getenv("VTP_CAST_CONCURRENCY", "8")),
+    max_waiting=int(os.getenv("VTP_CAST_QUEUE", "16")),
+    queue_timeout=float(os.getenv("VTP_CAST_QUEUE_TIMEOUT", "10")),
+    state=os.getenv("VTP_POLLS_STATE", "open"),
+)
+# The bulk cast ballot ingestion workers (vote stores), batch size and
+# ballots per upload
+BULK_CAST_WORKERS = int(os.getenv("VTP_BULK_CAST_WORKERS", "4"))
+BULK_CAST_BATCH = int(os.getenv("VTP_BULK_CAST_BATCH", "50"))
+BULK_CAST_MAX_BALLOTS = int(os.getenv("VTP_BULK_CAST_MAX_BALLOTS", "2000"))
+# The max number of receipts and rows per batch verification
+VERIFY_BATCH_MAX = int(os.getenv("VTP_VERIFY_BATCH_MAX", "1000"))
+# The serialized show_contest and show_versioned_receipt responses
+content_cache = ContentCache(
+    max_bytes=int(os.getenv("VTP_CONTENT_CACHE_BYTES", str(32 * 1024 * 1024))),
+    spill_dir=os.getenv("VTP_CONTENT_CACHE_DIR"),
+    max_spill_bytes=int(
+        os.getenv("VTP_CONTENT_CACHE_DISK_BYTES", str(512 * 1024 * 1024))
+    ),
+)
+
+
+async def registry(method, *args):
+    """
+    Call a vote store registry method - in the registry pool when it
+    blocks (a SQLite registry), so that it does not stall the event loop
+    """
+    if vote_store_ids.BLOCKING:
+        return await BackendExecutor.run("registry", method, *args)
+    return method(*args)
+
+
+async def expire_vote_store_ids():
+    """Periodically drop the abandoned VoteStoreIDs"""
+    if not VOTE_STORE_TTL:
+        return
+    while True:
+        await asyncio.sleep(max(VOTE_STORE_TTL / 4, 1))
+        await registry(vote_store_ids.expire)
+
+
+# The (compressed once) precomputed mock mode responses per endpoint
+mock_bodies = {}
+
+
+async def mock_response(endpoint: str, request: Request = None) -> Response | None:
+    """
+    Return the precomputed mock mode response of an endpoint, if any -
+    compressed when the endpoint's request is given
+    """
+    body = VtpBackend.mock_response(endpoint)
+    if body is None:
+        return None
+    if request is None:
+        return FastJSONResponse(body)
+    encoded = mock_bodies.get(endpoint)
+    if encoded is None or encoded.body is not body:
+        # the mock data was (re)loaded
+        encoded = mock_bodies[endpoint] = EncodedBody(body)
+    return await encoded_response(request, endpoint, "show", encoded)
+
+
+async def encoded_response(
+    request: Request, route: str, op_type: str, body: EncodedBody
+) -> Response:
+    """
+    Return the JSON response of a route, compressed (in the op_type
+    pool) with the encoding negotiated with the client
+    """
+    encoding = Compression.negotiate(route, request.headers.get("accept-encoding", ""))
+    encoding, content = await BackendExecutor.run(op_type, body.encode, encoding)
+    return FastJSONResponse(content, headers=Compression.headers(route, encoding))
+
+
+def is_error(result) -> bool:
+    """
+    Return whether a backend result is, or anywhere wraps, a
+    webapi_error - such as one of the contests of a show contest list
+    """
+    if isinstance(result, dict):
+        return "webapi_error" in result or any(map(is_error, result.values()))
+    if isinstance(result, list):
+        return any(map(is_error, result))
+    return False
+
+
+async def immutable_response(
+    request: Request, route: str, key: str, compute
+) -> Response:
+    """
+    Return the JSON response of an immutable (content addressed)
+    request key, either from the content cache or by awaiting
+    compute().  Conditional requests are answered with a 304.
+
+    The compressed responses are cached as well, under the key and
+    encoding, so that a body is compressed once per encoding.  A
+    webapi_error result (a digest not merged yet) is neither cached
+    nor served as immutable.
+    """
+    encoding = Compression.negotiate(route, request.headers.get("accept-encoding", ""))
+    encoded_key = f"{key};{encoding}"
+    etag = ContentCache.etag(key)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": ContentCache.CACHE_CONTROL,
+        **Compression.headers(route),
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if encoding and ContentCache.etag_matches(
+        if_none_match, ContentCache.etag(encoded_key)
+    ):
+        # the 304 carries the ETag of the encoded representation
+        headers["ETag"] = ContentCache.etag(encoded_key)
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if ContentCache.etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if encoding:
+        body = content_cache.get(encoded_key)
+        if body is not None:
+            headers["ETag"] = ContentCache.etag(encoded_key)
+            headers["Content-Encoding"] = encoding
+            return FastJSONResponse(body, headers=headers)
+    body = content_cache.get(key)
+    if body is None:
+        result = await compute()
+        body = await BackendExecutor.run("show", dumps, result)
+        if is_error(result):
+            return await encoded_response(request, route, "show", EncodedBody(body))
+        await BackendExecutor.run("show", content_cache.put, key, body)
+    if encoding and Compression.compressible(len(body)):
+        body = await BackendExecutor.run("show", Compression.compress, body, encoding)
+        await BackendExecutor.run("show", content_cache.put, encoded_key, body)
+        headers["ETag"] = ContentCache.etag(encoded_key)
+        headers["Content-Encoding"] = encoding
+    return FastJSONResponse(body, headers=headers)
+
+
+def refused_response(exc: Exception) -> JSONResponse:
+    """Return the 503 response of a voter refused by the polls"""
+    headers = {}
+    if isinstance(exc, PollsBusy):
+        headers["Retry-After"] = str(exc.retry_after)
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"webapi_error": str(exc)},
+        headers=headers,
+    )
+
+
+async def flush_merges(timeout: float) -> bool:
+    """Wait up to timeout seconds for the pending merges to be merged"""
+    if not VtpBackend.MERGE_CONTESTS:
+        return True
+    return await BackendExecutor.run("setup", merge_queue.flush, timeout)
+
+
+async def drain_stats() -> dict:
+    """Return the merge queue and vote store statistics of a drain"""
+    return {
+        "merge_queue": merge_queue.stats(),
+        "vote_store_ids": await registry(vote_store_ids.stats),
+    }
+
+
+async def bulk_cast_done(vote_store_id: str):
+    """Register and queue the merge of a vote store a bulk cast cast in"""
+    await registry(vote_store_ids.set, vote_store_id, "cast")
+    if VtpBackend.MERGE_CONTESTS:
+        await BackendExecutor.run("cast", merge_queue.enqueue, vote_store_id)
+    else:
+        # the merges (if any) are not the web-api's - refresh the feed
+        tally_feed.changed()
+
+
+app.include_router(
+    admin_router(
+        polls,
+        flush_merges,
+        drain_stats,
+        functools.partial(
+            BulkCast,
+            workspace_pool.acquire,
+            VtpBackend.cast_ballots,
+            bulk_cast_done,
+            workers=BULK_CAST_WORKERS,
+            batch_size=BULK_CAST_BATCH,
+            max_ballots=BULK_CAST_MAX_BALLOTS,
+        ),
+    )
+)
+
+
+def route_template(scope: dict) -> str:
+    """Return the template of the route matching a request scope"""
+    for route in app.router.routes:
+        if route.matches(scope)[0] == Match.FULL:
+            return getattr(route, "path", "other")
+    return "unmatched"
+
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    """Record the latency, in-flight and error counts of each route"""
+    labels = (request.method, route_template(request.scope))
+    start = Metrics.start("http", labels)
+    error = True
+    try:
+        response = await call_next(request)
+        error = response.status_code >= 500
+        return response
+    finally:
+        Metrics.finish("http", labels, start, error)
+
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """
+    Profile the backend operations of the requests asked for by an
+    admin (X-VTP-Profile) or picked by the sampling rate
+    """
+    if not (
+        (request.headers.get("x-vtp-profile") and is_admin(request))
+        or Profiler.sampled()
+    ):
+        return await call_next(request)
+    profile_id, token = Profiler.activate()
+    try:
+        response = await call_next(request)
+    finally:
+        Profiler.deactivate(token)
+    response.headers["X-VTP-Profile-Id"] = profile_id
+    return response
 
 
 # mount a static root for the static pages
@@ -43,6 +432,61 @@ async def webapi_version() -> dict:
     return {"version": "0.1.0"}
 
 
+# The readiness of the web-api server
+@app.get("/web-api/health")
+async def webapi_health() -> dict:
+    """
+    Return whether the web-api server is ready - a 503 until the
+    startup warm-up is over
+    """
+    ready = warm_up.ready
+    return JSONResponse(
+        status_code=(
+            status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+        ),
+        content={
+            "status": "ready" if ready else "warming",
+            "warm_up": warm_up.stats(),
+            "polls": polls.stats()["state"],
+        },
+    )
+
+
+# a web-api server statistics endpoint
+@app.get("/web-api/stats")
+async def webapi_stats() -> dict:
+    """Return the web-api server statistics"""
+    return {
+        "executor": BackendExecutor.stats(),
+        "vote_store_ids": await registry(vote_store_ids.stats),
+        "backend": VtpBackend.stats(),
+        "workspace_pool": workspace_pool.stats(),
+        "workspace_reaper": workspace_reaper.stats(),
+        "merge_queue": merge_queue.stats(),
+        "tally_feed": tally_feed.stats(),
+        "content_cache": content_cache.stats(),
+        "compression": Compression.stats(),
+        "polls": polls.stats(),
+        "warm_up": warm_up.stats(),
+    }
+
+
+# The route and backend operation latencies in the Prometheus text format
+@app.get("/web-api/metrics", response_class=PlainTextResponse)
+async def webapi_metrics() -> str:
+    """Return the latency histograms, in-flight and error counts"""
+    return PlainTextResponse(
+        Metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+# The polls state and client connection statistics
+@app.get("/web-api/polls")
+async def polls_state() -> dict:
+    """Return the polls state and the client connection statistics"""
+    return {"polls": polls.stats()}
+
+
 # Endpoint #2
 #
 # pylint: disable=line-too-long
@@ -50,9 +494,18 @@ async def webapi_version() -> dict:
 @app.get("/web-api/get_blank_ballot")
 async def get_blank_ballot(voter_address: str = "") -> dict:
     """Return an blank ballot for a given VoteStoreID"""
-
-    blank_ballot = VtpBackend.get_blank_ballot(voter_address)
-    return {"blank_ballot": blank_ballot}
+    try:
+        polls.check_open()
+    except PollsClosed as exc:
+        return refused_response(exc)
+    response = await mock_response("get_blank_ballot")
+    if response is not None:
+        return response
+
+    blank_ballot = await BackendExecutor.run(
+        "ballot", VtpBackend.get_blank_ballot, voter_address
+    )
+    return FastJSONResponse({"blank_ballot": blank_ballot})
 
 
 # Testing Endpoint - reuse existin (backend) GUIDs
@@ -61,9 +514,13 @@ async def get_blank_ballot(voter_address: str = "") -> dict:
 @app.post("/web-api/restore_existing_guids")
 async def restore_existing_guids() -> dict:
     """Will restore the existing vote_store_id's"""
-    guids = VtpBackend.get_all_guid_workspaces()
-    for guid in guids:
-        vote_store_ids[guid] = "restored"
+    guids = await BackendExecutor.run("setup", VtpBackend.get_all_guid_workspaces)
+
+    def restore():
+        for guid in guids:
+            vote_store_ids.set(guid, "restored")
+
+    await registry(restore)
     return {"restored": guids}
 
 
@@ -79,36 +536,58 @@ async def cast_ballot(
     Uploads a castballot.  Will first create a guid workspace and use
     that to run the backend code.
 
-    Returns the GUID, ballot_receipt, row_index, and qr_svg image
+    Returns the GUID, ballot_receipt, row_index, and qr_svg image.
+    Returns a 503 (with a Retry-After when busy) when the polls are not
+    open or the backend is saturated.
     """
     # breakpoint()
+    try:
+        async with polls.admit_cast():
+            return await cast_admitted_ballot(incoming_ballot_data)
+    except (PollsBusy, PollsClosed) as exc:
+        return refused_response(exc)
 
-    # create a new VoteStoreID
-    vote_store_id = VtpBackend.get_vote_store_id()
-    vote_store_ids[vote_store_id] = "uncast"
-    # leftover checks from previous implementation
-    if vote_store_id not in vote_store_ids:
-        return {"webapi_error": "VoteStoreID not found"}
-    if vote_store_ids[vote_store_id] == "cast":
-        return {"webapi_error": "This ballot has already been cast"}
+
+async def cast_admitted_ballot(incoming_ballot_data: dict) -> dict:
+    """Cast a ballot admitted by the polls"""
+    # get a new VoteStoreID from the pool of ready workspaces
+    vote_store_id = await BackendExecutor.run("setup", workspace_pool.acquire)
+    # a pooled workspace is a fresh, never cast, vote store
+    await registry(vote_store_ids.set, vote_store_id, "uncast")
 
     # Don't know why pylint is complaining about leftside=4 and
     # rightside=3 regarding the return tuple - it is 4 and 4
     # respectively.
     #
     # pylint: disable=unbalanced-tuple-unpacking
-    ballot_check, vote_index, qr_svg, receipt_digest = VtpBackend.cast_ballot(
+    ballot_check, vote_index, qr_svg, receipt_digest = await BackendExecutor.run(
+        "cast",
+        VtpBackend.cast_ballot,
         vote_store_id,
         incoming_ballot_data,
     )
-    vote_store_ids[vote_store_id] = "cast"
-    return {
-        "vote_store_id": vote_store_id,
-        "ballot_check": ballot_check,
-        "ballot_row": vote_index,
-        "encoded_qr": qr_svg,
-        "receipt_digest": receipt_digest,
-    }
+    await registry(vote_store_ids.set, vote_store_id, "cast")
+    if VtpBackend.MERGE_CONTESTS:
+        await BackendExecutor.run("cast", merge_queue.enqueue, vote_store_id)
+    else:
+        # the merges (if any) are not the web-api's - refresh the feed
+        tally_feed.changed()
+    return FastJSONResponse(
+        {
+            "vote_store_id": vote_store_id,
+            "ballot_check": ballot_check,
+            "ballot_row": vote_index,
+            "encoded_qr": qr_svg,
+            "receipt_digest": receipt_digest,
+        }
+    )
+
+
+# The merge queue depth and merge lag
+@app.get("/web-api/merge_queue")
+async def merge_queue_stats() -> dict:
+    """Return the merge queue depth, merge lag, and batch statistics"""
+    return {"merge_queue": merge_queue.stats()}
 
 
 # Endpoint #4a
@@ -124,10 +603,15 @@ async def verify_ballot_receipt(
     Will verify the ballot-receipt and return STDOUT (that is rendered
     by the client side javascript).
     """
-    if vote_store_id not in vote_store_ids:
+    if await registry(vote_store_ids.get, vote_store_id) is None:
         return {"webapi_error": "VoteStoreID not found"}
+    response = await mock_response("verify_ballot_receipt")
+    if response is not None:
+        return response
     # breakpoint()
-    ballot_check_stdout = VtpBackend.verify_ballot_receipt(
+    ballot_check_stdout = await BackendExecutor.run(
+        "verify",
+        VtpBackend.verify_ballot_receipt,
         vote_store_id,
         incoming_receipt_data["ballot_check"],
         incoming_receipt_data["row_index"],
@@ -149,11 +633,16 @@ async def verify_ballot_row(
     Will verify the supllied list of digests.  Note - will not scale
     to large numbers of digests.
     """
-    if vote_store_id not in vote_store_ids:
+    if await registry(vote_store_ids.get, vote_store_id) is None:
         return {"webapi_error": "VoteStoreID not found"}
+    response = await mock_response("verify_ballot_row")
+    if response is not None:
+        return response
     # breakpoint()
     return {
-        "verify_ballot_stdout": VtpBackend.verify_ballot_row(
+        "verify_ballot_stdout": await BackendExecutor.run(
+            "verify",
+            VtpBackend.verify_ballot_row,
             vote_store_id,
             uids,
             digests,
@@ -161,6 +650,53 @@ async def verify_ballot_row(
     }
 
 
+# Endpoint #4c
+#
+# pylint: disable=line-too-long
+# curl -i -X POST -H 'Content-Type: application/json' -d '{"rows": [{"uids": ["0001"], "digests": ["6ca91dbca44515587f59294107eee63dc480aa7b"]}]}' http://127.0.0.1:8000/web-api/verify_ballot_batch/$GUID
+@app.post("/web-api/verify_ballot_batch/{vote_store_id}")
+async def verify_ballot_batch(
+    vote_store_id: str,
+    incoming_batch_data: dict,
+) -> dict:
+    """
+    Will verify a batch of ballot receipts and/or rows of digests in
+    one request.  The body contains an optional "receipts" list (each
+    with a "ballot_check" and "row_index") and an optional "rows" list
+    (each with parallel "uids" and "digests" lists).  Returns the per
+    item results in the same order - a batch of more than
+    VTP_VERIFY_BATCH_MAX items is refused.
+    """
+    if await registry(vote_store_ids.get, vote_store_id) is None:
+        return {"webapi_error": "VoteStoreID not found"}
+    receipts = incoming_batch_data.get("receipts", [])
+    rows = incoming_batch_data.get("rows", [])
+    if not (isinstance(receipts, list) and isinstance(rows, list)) or not all(
+        isinstance(item, dict) for item in receipts + rows
+    ):
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={"webapi_error": "receipts and rows must be lists of objects"},
+        )
+    if len(receipts) + len(rows) > VERIFY_BATCH_MAX:
+        return JSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={"webapi_error": f"more than {VERIFY_BATCH_MAX} receipts and rows"},
+        )
+    results = await BackendExecutor.run(
+        "verify",
+        VtpBackend.verify_ballot_batch,
+        vote_store_id,
+        receipts + rows,
+    )
+    return FastJSONResponse(
+        {
+            "receipts": results[: len(receipts)],
+            "rows": results[len(receipts) :],
+        }
+    )
+
+
 # Endpoint #5
 #
 # To manually test #4 do something like:
@@ -168,6 +704,7 @@ async def verify_ballot_row(
 # curl -i -X GET -H 'Content-Type: application/json' http://127.0.0.1:8000/web-api/tally_contests/d08a278a9a6b82040d505b9aae194efb72cceb0e/0001/8bef5f87658c40bbe7dcda814422a59e844b204d
 @app.get("/web-api/tally_contests/{vote_store_id}/{contests}/{digests}/{verbosity}")
 async def tally_contests(
+    request: Request,
     vote_store_id: str,
     contests: str,
     digests: str,
@@ -183,20 +720,172 @@ async def tally_contests(
 
     Note that the backend returns STDOUT as an array of text lines.
     """
-    if vote_store_id not in vote_store_ids:
+    if await registry(vote_store_ids.get, vote_store_id) is None:
         return {"webapi_error": "VoteStoreID not found"}
-    tally_contests_stdout = VtpBackend.tally_contests(
+    response = await mock_response("tally_contests", request)
+    if response is not None:
+        return response
+    # the serialized (and compressed) response is cached along with the tally
+    body = await BackendExecutor.run(
+        "tally",
+        VtpBackend.tally_contests_body,
         vote_store_id,
         contests,
         digests,
         verbosity,
     )
-    return {"tally_election_stdout": tally_contests_stdout}
+    return await encoded_response(request, "tally_contests", "tally", body)
+
+
+# Endpoint #5b
+#
+# pylint: disable=line-too-long
+# curl -N -H 'Accept: text/event-stream' http://127.0.0.1:8000/web-api/tally_contests_stream/d08a278a9a6b82040d505b9aae194efb72cceb0e/0001/None
+@app.get("/web-api/tally_contests_stream/{vote_store_id}/{contests}/{digests}")
+async def tally_contests_stream(
+    request: Request,
+    vote_store_id: str,
+    contests: str,
+    digests: str,
+):
+    """
+    Will stream the tally one structured record at a time as each RCV
+    round is computed - the round number, the per choice counts, the
+    eliminated choices, and where the tracked digests landed.
+
+    The records are streamed as NDJSON, or as Server-Sent Events when
+    the client accepts text/event-stream.
+    """
+    if await registry(vote_store_ids.get, vote_store_id) is None:
+        return {"webapi_error": "VoteStoreID not found"}
+    records = await BackendExecutor.run(
+        "tally",
+        VtpBackend.tally_contests_stream,
+        vote_store_id,
+        contests,
+        digests,
+    )
+    sse = "text/event-stream" in request.headers.get("accept", "")
+
+    async def stream():
+        while True:
+            # each round is computed in the tally pool
+            record = await BackendExecutor.run("tally", next, records, None)
+            if record is None:
+                return
+            if sse:
+                yield b"data: " + dumps(record) + b"\n\n"
+            else:
+                yield dumps(record) + b"\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+    )
+
+
+# Endpoint #5c
+#
+# The live tally feed over a WebSocket: send {"subscribe": ["0001"]} or
+# {"unsubscribe": ["0001"]} and receive {"contest": uid,
+# "tally_election_stdout": lines} messages whenever a merge changes the
+# tally of a subscribed contest.
+@app.websocket("/web-api/tally_feed")
+async def tally_feed_socket(websocket: WebSocket, contests: str = ""):
+    """
+    Will push the tally of the subscribed contests (initially the
+    contests query parameter) as it changes with each merge
+    """
+    await websocket.accept()
+    try:
+        subscription = tally_feed.open()
+    except TallyFeedFull as exc:
+        # 1013 - try again later
+        await websocket.close(code=1013, reason=str(exc))
+        return
+
+    async def send():
+        while True:
+            message = await subscription.receive()
+            await websocket.send_text(message.decode("utf8"))
+
+    async def receive():
+        while True:
+            request = await websocket.receive_json()
+            if not isinstance(request, dict):
+                raise InvalidSubscription("a tally feed request must be an object")
+            await tally_feed.subscribe(
+                subscription, feed_uids(request.get("subscribe", []))
+            )
+            tally_feed.unsubscribe(
+                subscription, feed_uids(request.get("unsubscribe", []))
+            )
+
+    try:
+        await tally_feed.subscribe(subscription, feed_uids(contests))
+        tasks = [asyncio.create_task(send()), asyncio.create_task(receive())]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            # a disconnect or an invalid request ends the subscription
+            error = task.exception()
+            if isinstance(error, ValueError):
+                # an invalid request or non JSON message
+                raise InvalidSubscription(str(error)) from error
+            if error and not isinstance(error, WebSocketDisconnect):
+                raise error
+    except InvalidSubscription as exc:
+        # 1008 - policy violation
+        await websocket.close(code=1008, reason=str(exc)[:120])
+    except WebSocketDisconnect:
+        pass
+    finally:
+        tally_feed.close(subscription)
+
+
+# The live tally feed as Server-Sent Events
+#
+# pylint: disable=line-too-long
+# curl -N http://127.0.0.1:8000/web-api/tally_feed/0001,0002
+@app.get("/web-api/tally_feed/{contests}")
+async def tally_feed_events(contests: str):
+    """
+    Will stream the tally of the contests as Server-Sent Events as it
+    changes with each merge
+    """
+    try:
+        subscription = tally_feed.open()
+    except TallyFeedFull as exc:
+        return refused_response(exc)
+
+    try:
+        await tally_feed.subscribe(subscription, feed_uids(contests))
+    except InvalidSubscription as exc:
+        tally_feed.close(subscription)
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={"webapi_error": str(exc)},
+        )
+
+    async def stream():
+        try:
+            while True:
+                message = await subscription.receive(TALLY_FEED_KEEPALIVE)
+                if message is None:
+                    yield b": keepalive\n\n"
+                else:
+                    yield b"data: " + message + b"\n\n"
+        finally:
+            tally_feed.close(subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
 
 
 # Endpoint #6
 @app.get("/web-api/show_contest/{vote_store_id}/{contest}")
 async def show_contest(
+    request: Request,
     vote_store_id: str,
     contest: str,
 ) -> dict:
@@ -204,27 +893,65 @@ async def show_contest(
     Will display the CVR contents, a.k.a. the git log of a specific
     commit digest.  The backend will convert the git log to json
     so that the client side can render that.
+
+    As a commit digest is immutable, so is the response - it is
+    cached and served with an ETag.
     """
-    if vote_store_id not in vote_store_ids:
+    if await registry(vote_store_ids.get, vote_store_id) is None:
         return {"webapi_error": "VoteStoreID not found"}
-    #    breakpoint()
-    git_log = VtpBackend.show_contest(vote_store_id, contest)
-    # import pdb; pdb.set_trace()
-    return {"git_log": git_log}
+    response = await mock_response("show_contest", request)
+    if response is not None:
+        return response
+
+    async def compute():
+        git_log = await BackendExecutor.run(
+            "show", VtpBackend.show_contest, vote_store_id, contest
+        )
+        return {"git_log": git_log}
+
+    if not is_digest_list(contest):
+        body = await BackendExecutor.run("show", dumps, await compute())
+        return await encoded_response(
+            request, "show_contest", "show", EncodedBody(body)
+        )
+    return await immutable_response(
+        request, "show_contest", f"show_contest/{contest}", compute
+    )
 
 
 # Endpoint #7
 @app.get("/web-api/show_versioned_receipt/{vote_store_id}/{digest}")
 async def show_versioned_receipt(
+    request: Request,
     vote_store_id: str,
     digest: str,
 ) -> dict:
     """
     Will return the contents of the versioned ballot receipt as an
     array of arrays (similar to cast_ballot above).
+
+    As a receipt digest is immutable, so is the response - it is
+    cached and served with an ETag.
     """
-    if vote_store_id not in vote_store_ids:
+    if await registry(vote_store_ids.get, vote_store_id) is None:
         return {"webapi_error": "VoteStoreID not found"}
-    #    breakpoint()
-    # import pdb; pdb.set_trace()
-    return VtpBackend.show_versioned_receipt(vote_store_id, digest)
+    response = await mock_response("show_versioned_receipt", request)
+    if response is not None:
+        return response
+
+    async def compute():
+        return await BackendExecutor.run(
+            "show", VtpBackend.show_versioned_receipt, vote_store_id, digest
+        )
+
+    if not is_digest_list(digest):
+        body = await BackendExecutor.run("show", dumps, await compute())
+        return await encoded_response(
+            request, "show_versioned_receipt", "show", EncodedBody(body)
+        )
+    return await immutable_response(
+        request,
+        "show_versioned_receipt",
+        f"show_versioned_receipt/{digest}",
+        compute,
+    )
@@ -0,0 +1,370 @@
+"""
+An asynchronous, batched and persistent queue of CVR merges.  Merging
+the contests of a cast ballot inline (MERGE_CONTESTS) puts a merge in
+the voter's request and only works when the ballots are cast one at a
+time.  Instead, the cast ballot's vote store id is appended to the
+MergeQueue, which returns immediately, and a background writer thread
+merges the pending casts in batches.  A batch is merged once it holds
+batch_size casts or once its oldest cast is max_age seconds old,
+whichever comes first, so the tallies become current within a bounded
+delay.
+
+Unless the queue is being flushed (the polls are drained), a merge may
+keep some of the CVRs unmerged (the merge operation's minimum of
+pending CVRs), so the casts of a batch merged without a flush are moved
+to the unflushed table instead of being reported as merged.  The
+on_merged callbacks are run after every merge (the merged election
+changed), but only with the vote store ids merged for sure: those of a
+flush merge and of the unflushed casts before it.  A flush runs a merge
+even when no cast is pending.
+
+The pending casts are journaled in a SQLite database so that they
+survive a restart - on start up the writer simply picks up where it
+left off.  The journal is only created once the queue is used (or, for
+the statistics, once it exists).
+
+Every web-api worker process runs a MergeQueue on the same journal, so
+the writers serialize on an exclusive lease (an flock of the journal's
+lock file): only the lease holder merges, and it merges the pending
+casts of all the workers.  A failed merge leaves its batch in the queue
+to be retried, up to max_attempts times - after which the batch is
+moved to the dead letter table, logged and reported in the statistics,
+so that it no longer blocks the merges behind it.
+"""
+
+import contextlib
+import fcntl
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+class MergeQueue:  # pylint: disable=too-many-instance-attributes
+    """
+    A journaled queue of cast vote store ids merged in batches by one
+    serialized writer calling merge(flush), flush being whether the
+    queue is being flushed (drained).
+    """
+
+    # seconds to wait before retrying a failed merge
+    _RETRY_DELAY = 5.0
+    # seconds between the polls for the writer lease and for the casts
+    # and merges of the other workers (which are not notified)
+    _POLL = 0.5
+
+    def __init__(
+        self,
+        path: str,
+        merge,
+        batch_size: int = 50,
+        max_age: float = 5.0,
+        max_attempts: int = 5,
+    ):
+        self._path = path
+        self._merge = merge
+        self._batch_size = max(batch_size, 1)
+        self._max_age = max_age
+        self._max_attempts = max(max_attempts, 1)
+        self._on_merged = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._flushing = 0
+        self._connection = None
+        # statistics
+        self._stats = {
+            "batches": 0,
+            "merged": 0,
+            "errors": 0,
+            "dead_lettered": 0,
+            "last_batch_size": 0,
+            "last_merge_secs": 0.0,
+            "last_merge_lag_secs": 0.0,
+        }
+
+    def _journal(self) -> sqlite3.Connection:
+        """Return the journal, creating it on first use - requires the lock"""
+        if self._connection is None:
+            connection = sqlite3.connect(
+                self._path, check_same_thread=False, timeout=30
+            )
+            with connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS pending ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                    "vote_store_id TEXT NOT NULL, enqueued REAL NOT NULL, "
+                    "attempts INTEGER NOT NULL DEFAULT 0)"
+                )
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS unflushed ("
+                    "id INTEGER PRIMARY KEY, "
+                    "vote_store_id TEXT NOT NULL, enqueued REAL NOT NULL)"
+                )
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS dead_letter ("
+                    "id INTEGER PRIMARY KEY, "
+                    "vote_store_id TEXT NOT NULL, enqueued REAL NOT NULL, "
+                    "attempts INTEGER NOT NULL, failed REAL NOT NULL)"
+                )
+            self._connection = connection
+        return self._connection
+
+    def on_merged(self, callback):
+        """
+        Register a callback(vote_store_ids) run after each merge with
+        the vote store ids it merged for sure - none unless it flushed
+        """
+        self._on_merged.append(callback)
+
+    def start(self):
+        """Start the writer thread"""
+        with self._cond:
+            self._stopped = False
+            self._journal()
+        self._thread = threading.Thread(
+            target=self._loop, name="vtp-merge-queue", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop the writer thread - the pending casts stay journaled"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._cond:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def enqueue(self, vote_store_id: str):
+        """Queue the merge of a cast vote store"""
+        with self._cond:
+            with self._journal() as journal:
+                journal.execute(
+                    "INSERT INTO pending (vote_store_id, enqueued) VALUES (?, ?)",
+                    (vote_store_id, time.time()),
+                )
+            self._cond.notify_all()
+
+    def _pending(self) -> tuple[int, float]:
+        """Return the (depth, oldest enqueue time) - requires the lock"""
+        depth, oldest = (
+            self._journal()
+            .execute("SELECT COUNT(*), MIN(enqueued) FROM pending")
+            .fetchone()
+        )
+        return depth, oldest or 0.0
+
+    def _unflushed(self) -> int:
+        """
+        Return the number of casts merged without a flush - requires the
+        lock
+        """
+        return self._journal().execute("SELECT COUNT(*) FROM unflushed").fetchone()[0]
+
+    def _due(self) -> bool:
+        """
+        Wait until a batch is due, returning False when stopped -
+        requires the lock
+        """
+        while not self._stopped:
+            depth, oldest = self._pending()
+            if self._flushing and (depth or self._unflushed()):
+                return True
+            if depth:
+                wait = oldest + self._max_age - time.time()
+                if depth >= self._batch_size or self._flushing or wait <= 0:
+                    return True
+                self._cond.wait(wait)
+            else:
+                self._cond.wait(MergeQueue._POLL)
+        return False
+
+    @contextlib.contextmanager
+    def _lease(self):
+        """
+        Hold the writer lease shared by the worker processes, yielding
+        whether it was taken (False when stopped while waiting for it)
+        """
+        with open(f"{self._path}.lock", "a", encoding="utf8") as lock_file:
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    with self._cond:
+                        if self._stopped:
+                            yield False
+                            return
+                        self._cond.wait(MergeQueue._POLL)
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _loop(self):
+        """Merge the batches until stopped"""
+        while True:
+            with self._cond:
+                if not self._due():
+                    return
+            with self._lease() as leased:
+                if not leased:
+                    return
+                merged = self._merge_batch()
+            if merged is not None:
+                for callback in self._on_merged:
+                    try:
+                        callback(merged)
+                    except Exception:  # pylint: disable=broad-exception-caught
+                        logging.exception("merge queue: an on merged callback failed")
+
+    def _merge_batch(self) -> list | None:
+        """
+        Merge the next batch of pending casts - requires the writer
+        lease.  Returns the vote store ids merged for sure, which are
+        those of a flushed batch and the unflushed ones, or None when
+        nothing was merged.
+        """
+        with self._cond:
+            # another worker may have merged the batch meanwhile
+            batch = (
+                self._journal()
+                .execute(
+                    "SELECT id, vote_store_id, enqueued, attempts FROM pending "
+                    "ORDER BY id LIMIT ?",
+                    (self._batch_size,),
+                )
+                .fetchall()
+            )
+            flush = bool(self._flushing)
+            if not batch and not (flush and self._unflushed()):
+                return None
+        vote_store_ids = [row[1] for row in batch]
+        ids = [(row[0],) for row in batch]
+        start = time.monotonic()
+        try:
+            self._merge(flush)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logging.exception("merge queue: could not merge %s", vote_store_ids)
+            with self._cond:
+                if batch:
+                    self._failed(batch)
+                else:
+                    self._stats["errors"] += 1
+                self._cond.wait(MergeQueue._RETRY_DELAY)
+            return None
+        with self._cond:
+            with self._journal() as journal:
+                if flush:
+                    vote_store_ids = [
+                        row[0]
+                        for row in journal.execute(
+                            "SELECT vote_store_id FROM unflushed ORDER BY id"
+                        )
+                    ] + vote_store_ids
+                    journal.execute("DELETE FROM unflushed")
+                else:
+                    # some of the CVRs may still be unmerged
+                    journal.executemany(
+                        "INSERT INTO unflushed (vote_store_id, enqueued) "
+                        "SELECT vote_store_id, enqueued FROM pending WHERE id = ?",
+                        ids,
+                    )
+                journal.executemany("DELETE FROM pending WHERE id = ?", ids)
+            if not batch:
+                self._cond.notify_all()
+                return vote_store_ids
+            self._stats["batches"] += 1
+            self._stats["merged"] += len(batch)
+            self._stats["last_batch_size"] = len(batch)
+            self._stats["last_merge_secs"] = round(time.monotonic() - start, 3)
+            self._stats["last_merge_lag_secs"] = round(time.time() - batch[0][2], 3)
+            self._cond.notify_all()
+        return vote_store_ids if flush else []
+
+    def _failed(self, batch: list):
+        """
+        Count a failed attempt to merge a batch, moving it to the dead
+        letter table after the max attempts - requires the lock
+        """
+        self._stats["errors"] += 1
+        ids = [(row[0],) for row in batch]
+        with self._journal() as journal:
+            journal.executemany(
+                "UPDATE pending SET attempts = attempts + 1 WHERE id = ?", ids
+            )
+            if max(row[3] for row in batch) + 1 < self._max_attempts:
+                return
+            journal.executemany(
+                "INSERT OR REPLACE INTO dead_letter "
+                "SELECT id, vote_store_id, enqueued, attempts, ? FROM pending "
+                "WHERE id = ?",
+                [(time.time(), row[0]) for row in batch],
+            )
+            journal.executemany("DELETE FROM pending WHERE id = ?", ids)
+        self._stats["dead_lettered"] += len(batch)
+        logging.error(
+            "merge queue: gave up merging %s after %s attempts",
+            [row[1] for row in batch],
+            self._max_attempts,
+        )
+        self._cond.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Merge everything pending now, and flush the unflushed merges,
+        waiting up to timeout seconds for the queue to drain.  Returns
+        whether it drained.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                while self._pending()[0] or self._unflushed():
+                    remaining = (
+                        None if deadline is None else deadline - time.monotonic()
+                    )
+                    if self._thread is None or (
+                        remaining is not None and remaining <= 0
+                    ):
+                        return False
+                    self._cond.wait(
+                        MergeQueue._POLL
+                        if remaining is None
+                        else min(remaining, MergeQueue._POLL)
+                    )
+                return True
+            finally:
+                self._flushing -= 1
+
+    def stats(self) -> dict:
+        """Return the queue depth, merge lag and batch statistics"""
+        with self._cond:
+            if self._connection is None and not os.path.exists(self._path):
+                depth, oldest, unflushed, dead = 0, 0.0, 0, 0
+            else:
+                depth, oldest = self._pending()
+                unflushed = self._unflushed()
+                dead = (
+                    self._journal()
+                    .execute("SELECT COUNT(*) FROM dead_letter")
+                    .fetchone()[0]
+                )
+            return dict(
+                self._stats,
+                depth=depth,
+                unflushed=unflushed,
+                dead_letter=dead,
+                merge_lag_secs=round(time.time() - oldest, 3) if depth else 0.0,
+                batch_size=self._batch_size,
+                max_age=self._max_age,
+                max_attempts=self._max_attempts,
+            )
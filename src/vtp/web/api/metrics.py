@@ -0,0 +1,165 @@
+"""
+Latency instrumentation of the web-api.  Every route (see the metrics
+middleware in main.py) and every VoteTrackerPlus backend operation
+(see VtpBackend, and SimulatedBackend for its simulated costs) records
+its latency in a fixed bucket histogram along with its in-flight count
+and error count.  Recording is a bucket bisect and a few counter
+updates under a lock - the Prometheus text exposition is only rendered
+when /web-api/metrics is scraped.
+
+The series are labelled by route template (not by the raw path) and by
+operation class name so that their number stays bounded.  Note that
+the latency of a streamed response is the time to its first byte.
+"""
+
+import bisect
+import contextlib
+import threading
+import time
+
+
+class _Series:  # pylint: disable=too-few-public-methods
+    """The histogram, in-flight and error counts of one label set"""
+
+    __slots__ = ("buckets", "count", "total", "in_flight", "errors")
+
+    def __init__(self, size: int):
+        self.buckets = [0] * size
+        self.count = 0
+        self.total = 0.0
+        self.in_flight = 0
+        self.errors = 0
+
+
+class Metrics:
+    """
+    Class to keep the namespace separate.  Maintains the latency
+    series of the metric families.
+    """
+
+    ########
+    # metrics constants
+    ########
+    # the histogram bucket upper bounds in seconds (plus +Inf)
+    _BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    # the metric families - their name prefix, help text and label names
+    _FAMILIES = {
+        "http": (
+            "vtp_http_request",
+            "web-api HTTP requests",
+            ("method", "route"),
+        ),
+        "operation": (
+            "vtp_backend_operation",
+            "VoteTrackerPlus backend operations",
+            ("operation",),
+        ),
+    }
+
+    ########
+    # metrics state
+    ########
+    _series: dict[str, dict[tuple, _Series]] = {family: {} for family in _FAMILIES}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def start(family: str, labels: tuple) -> float:
+        """Count a call as in flight and return its start time"""
+        with Metrics._lock:
+            series = Metrics._series[family].get(labels)
+            if series is None:
+                series = Metrics._series[family][labels] = _Series(
+                    len(Metrics._BUCKETS) + 1
+                )
+            series.in_flight += 1
+        return time.perf_counter()
+
+    @staticmethod
+    def finish(family: str, labels: tuple, start: float, error: bool = False):
+        """Record the latency (and error) of a call started at start"""
+        secs = time.perf_counter() - start
+        index = bisect.bisect_left(Metrics._BUCKETS, secs)
+        with Metrics._lock:
+            series = Metrics._series[family][labels]
+            series.in_flight -= 1
+            series.buckets[index] += 1
+            series.count += 1
+            series.total += secs
+            if error:
+                series.errors += 1
+
+    @staticmethod
+    @contextlib.contextmanager
+    def track(family: str, *labels: str):
+        """Record the latency of the with block - an exception is an error"""
+        start = Metrics.start(family, labels)
+        error = True
+        try:
+            yield
+            error = False
+        finally:
+            Metrics.finish(family, labels, start, error)
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        """Escape a label value"""
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    @staticmethod
+    def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+        """Return the rendered label set"""
+        pairs = [
+            f'{name}="{Metrics._escape(value)}"' for name, value in zip(names, values)
+        ]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}"
+
+    @staticmethod
+    def render() -> str:
+        """Return the metrics in the Prometheus text exposition format"""
+        # pylint: disable=too-many-locals
+        with Metrics._lock:
+            snapshot = {
+                family: [
+                    (labels, list(s.buckets), s.count, s.total, s.in_flight, s.errors)
+                    for labels, s in series.items()
+                ]
+                for family, series in Metrics._series.items()
+            }
+        lines = []
+        bounds = [str(bound) for bound in Metrics._BUCKETS] + ["+Inf"]
+        for family, rows in snapshot.items():
+            prefix, text, names = Metrics._FAMILIES[family]
+            lines += [
+                f"# HELP {prefix}_duration_seconds The latency of the {text}",
+                f"# TYPE {prefix}_duration_seconds histogram",
+            ]
+            for labels, buckets, count, total, _, _ in rows:
+                cumulative = 0
+                for bound, bucket in zip(bounds, buckets):
+                    cumulative += bucket
+                    label_set = Metrics._labels(names, labels, f'le="{bound}"')
+                    lines.append(
+                        f"{prefix}_duration_seconds_bucket{label_set} {cumulative}"
+                    )
+                label_set = Metrics._labels(names, labels)
+                lines.append(f"{prefix}_duration_seconds_sum{label_set} {total}")
+                lines.append(f"{prefix}_duration_seconds_count{label_set} {count}")
+            lines += [
+                f"# HELP {prefix}s_in_flight The {text} in flight",
+                f"# TYPE {prefix}s_in_flight gauge",
+            ]
+            lines += [
+                f"{prefix}s_in_flight{Metrics._labels(names, row[0])} {row[4]}"
+                for row in rows
+            ]
+            lines += [
+                f"# HELP {prefix}_errors_total The failed {text}",
+                f"# TYPE {prefix}_errors_total counter",
+            ]
+            lines += [
+                f"{prefix}_errors_total{Metrics._labels(names, row[0])} {row[5]}"
+                for row in rows
+            ]
+        return "\n".join(lines) + "\n"
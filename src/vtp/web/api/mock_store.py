@@ -0,0 +1,94 @@
+"""
+The resident mock data of the mock mode backend.  The mock-data JSON
+documents are loaded once, when the store is created, instead of being
+opened and parsed on every request, and the serialized response bodies
+built from them are computed once and then served as is.
+
+The documents are shared by all the requests and must be treated as
+read only.  When a reload interval is set the store checks (at most
+every interval seconds, on access) whether any of the files changed and
+if so reloads all of them, which allows the mock data to be edited
+while a front end load test is running.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class MockStore:
+    """The resident mock data documents and their response bodies"""
+
+    def __init__(self, files: dict, bodies: list = (), reload_interval: float = 0):
+        self._files = dict(files)
+        self._reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._checked = time.monotonic()
+        self._loads = 0
+        # the documents and their response bodies are swapped together
+        self._mtimes, docs = self._load()
+        self._data = (docs, {})
+        # precompute the (name, key) response bodies
+        for name, key in bodies:
+            self.body(name, key)
+
+    def _load(self) -> tuple[dict, dict]:
+        """Return the (mtimes, documents) of the files"""
+        mtimes = {}
+        docs = {}
+        for name, path in self._files.items():
+            mtimes[name] = os.stat(path).st_mtime_ns
+            with open(path, "r", encoding="utf8") as infile:
+                docs[name] = json.load(infile)
+        self._loads += 1
+        return mtimes, docs
+
+    def _check(self):
+        """Reload the files when any of them changed - at most every interval"""
+        now = time.monotonic()
+        if not self._reload_interval or now - self._checked < self._reload_interval:
+            return
+        with self._lock:
+            if now - self._checked < self._reload_interval:
+                return
+            self._checked = now
+            try:
+                changed = any(
+                    os.stat(path).st_mtime_ns != self._mtimes[name]
+                    for name, path in self._files.items()
+                )
+                if changed:
+                    self._mtimes, docs = self._load()
+                    self._data = (docs, {})
+            except (OSError, ValueError):
+                # keep serving the previous documents until the edit is complete
+                pass
+
+    def get(self, name: str):
+        """Return a (read only) document"""
+        self._check()
+        return self._data[0][name]
+
+    def body(self, name: str, key: str = "") -> bytes:
+        """
+        Return the serialized response body of a document, wrapped in a
+        {key: document} object when a key is given
+        """
+        self._check()
+        docs, bodies = self._data
+        body = bodies.get((name, key))
+        if body is None:
+            body = json.dumps({key: docs[name]} if key else docs[name]).encode("utf8")
+            bodies[(name, key)] = body
+        return body
+
+    def stats(self) -> dict:
+        """Return the store statistics"""
+        docs, bodies = self._data
+        return {
+            "documents": len(docs),
+            "bodies": len(bodies),
+            "loads": self._loads,
+            "reload_interval": self._reload_interval,
+        }
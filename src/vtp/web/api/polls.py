@@ -0,0 +1,190 @@
+"""
+The polls lifecycle and the admission control of cast_ballot.  Per the
+design notes the polls are opened (client connections proceed), closed
+(new voters are turned away) and shut down (drained: the in-flight casts
+and the pending CVR merges are finished and the connection statistics
+are reported).  The states are:
+
+    open       - ballots are handed out and cast
+    closed     - no new ballots are handed out or cast
+    draining   - closed, and waiting for the in-flight casts and merges
+    drained    - closed, with nothing in flight or pending
+
+While open, at most max_concurrent casts run at once and at most
+max_waiting more wait (for up to queue_timeout seconds) for a slot.
+Beyond that a cast is refused as busy with a Retry-After estimate
+derived from the recent cast latency, so that under a burst the
+server sheds load instead of letting the latency grow without limit.
+
+All the methods are called from the event loop thread.
+"""
+
+import asyncio
+import contextlib
+import math
+import time
+
+
+class PollsClosed(Exception):
+    """Raised when a voter is turned away because the polls are not open"""
+
+
+class PollsBusy(Exception):
+    """Raised when a cast is refused because the backend is saturated"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"the backend is busy, retry after {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class Polls:  # pylint: disable=too-many-instance-attributes
+    """The polls state and the cast_ballot admission control"""
+
+    STATES = ("open", "closed", "draining", "drained")
+
+    # the weight of the latest cast in the cast latency moving average
+    _LATENCY_WEIGHT = 0.2
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_waiting: int,
+        queue_timeout: float,
+        state: str = "open",
+    ):
+        if state not in Polls.STATES:
+            raise ValueError(f"unknown polls state ({state})")
+        self._max_concurrent = max(max_concurrent, 1)
+        self._max_waiting = max(max_waiting, 0)
+        self._queue_timeout = queue_timeout
+        self._state = state
+        self._slots = None
+        self._idle = None
+        self._in_flight = 0
+        self._waiting = 0
+        self._latency = 1.0
+        self._state_changed = time.time()
+        # statistics
+        self._stats = {
+            "admitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "refused_closed": 0,
+            "refused_busy": 0,
+            "max_in_flight": 0,
+            "max_waiting": 0,
+        }
+
+    @property
+    def state(self) -> str:
+        """The polls state"""
+        return self._state
+
+    def _set_state(self, state: str):
+        """Change the polls state"""
+        self._state = state
+        self._state_changed = time.time()
+
+    def _idle_event(self) -> asyncio.Event:
+        """Return the event set while no cast is in flight"""
+        if self._idle is None:
+            self._idle = asyncio.Event()
+            if not self._in_flight:
+                self._idle.set()
+        return self._idle
+
+    def open(self):
+        """Open the polls"""
+        self._set_state("open")
+
+    def close(self):
+        """Close the polls - the in-flight casts still complete"""
+        if self._state == "open":
+            self._set_state("closed")
+
+    def check_open(self):
+        """Raise PollsClosed unless the polls are open"""
+        if self._state != "open":
+            self._stats["refused_closed"] += 1
+            raise PollsClosed(f"the polls are {self._state}")
+
+    def retry_after(self) -> int:
+        """Return the seconds a refused voter should wait before retrying"""
+        queued = self._in_flight + self._waiting
+        return max(1, math.ceil(self._latency * (queued / self._max_concurrent + 1)))
+
+    @contextlib.asynccontextmanager
+    async def admit_cast(self):
+        """
+        Hold a cast slot, waiting for one when all are taken.  Raises
+        PollsClosed or PollsBusy when the cast is refused.
+        """
+        self.check_open()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_concurrent)
+        if self._slots.locked():
+            if self._waiting >= self._max_waiting:
+                self._stats["refused_busy"] += 1
+                raise PollsBusy(self.retry_after())
+            self._waiting += 1
+            self._stats["max_waiting"] = max(self._stats["max_waiting"], self._waiting)
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self._queue_timeout)
+            except asyncio.TimeoutError as exc:
+                self._stats["refused_busy"] += 1
+                raise PollsBusy(self.retry_after()) from exc
+            finally:
+                self._waiting -= 1
+        else:
+            await self._slots.acquire()
+        self._in_flight += 1
+        self._idle_event().clear()
+        self._stats["admitted"] += 1
+        self._stats["max_in_flight"] = max(
+            self._stats["max_in_flight"], self._in_flight
+        )
+        start = time.monotonic()
+        try:
+            yield
+            self._stats["completed"] += 1
+            self._latency += Polls._LATENCY_WEIGHT * (
+                time.monotonic() - start - self._latency
+            )
+        except BaseException:
+            self._stats["failed"] += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+            if not self._in_flight:
+                self._idle_event().set()
+
+    async def drain(self, flush, timeout: float) -> bool:
+        """
+        Shut down the polls: close them, wait up to timeout seconds for
+        the in-flight casts to complete and then for flush(remaining)
+        to finish the pending merges.  Returns whether it fully drained.
+        """
+        self._set_state("draining")
+        deadline = time.monotonic() + timeout
+        try:
+            await asyncio.wait_for(self._idle_event().wait(), timeout)
+        except asyncio.TimeoutError:
+            self._set_state("closed")
+            return False
+        drained = await flush(max(deadline - time.monotonic(), 0))
+        self._set_state("drained" if drained else "closed")
+        return drained
+
+    def stats(self) -> dict:
+        """Return the polls state and the client connection statistics"""
+        return dict(
+            self._stats,
+            state=self._state,
+            state_changed=self._state_changed,
+            in_flight=self._in_flight,
+            waiting=self._waiting,
+            max_concurrent=self._max_concurrent,
+            queue_limit=self._max_waiting,
+            cast_latency_secs=round(self._latency, 3),
+        )
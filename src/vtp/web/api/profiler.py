@@ -0,0 +1,159 @@
+"""
+On-demand profiling of the backend operations of a request.  A request
+is profiled when an admin asks for it (the X-VTP-Profile header, see
+main.py) or when it is sampled (VTP_PROFILE_SAMPLE_RATE).  The request
+id is kept in a context variable, which the BackendExecutor carries
+into its worker threads, so that each VtpBackend operation run for the
+request is run under cProfile and its stats are saved to the profile
+directory.  The directory is a bounded ring - the oldest profiles are
+removed beyond VTP_PROFILE_MAX_FILES.
+
+The saved files are regular pstats dumps.  The text rendering adds the
+share of the wall time spent waiting on git (and other) subprocesses
+versus running python.
+"""
+
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import tempfile
+import time
+import uuid
+
+# the id of the request being profiled, if any
+_PROFILE_ID = contextvars.ContextVar("vtp_profile_id", default="")
+# a valid profile file name
+_PROFILE_NAME = re.compile(r"^[0-9]+-[0-9a-f]+-[A-Za-z0-9_]+\.prof$")
+
+
+class Profiler:
+    """
+    Class to keep the namespace separate.  Profiles the backend
+    operations of the selected requests.
+    """
+
+    ########
+    # profiler configuration
+    ########
+    _DIR = os.getenv(
+        "VTP_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "vtp-profiles")
+    )
+    _MAX_FILES = int(os.getenv("VTP_PROFILE_MAX_FILES", "50"))
+    _SAMPLE_RATE = float(os.getenv("VTP_PROFILE_SAMPLE_RATE", "0"))
+    # the number of functions listed by the text rendering
+    _TEXT_LINES = 40
+
+    @staticmethod
+    def sampled() -> bool:
+        """Return whether a request is picked by the sampling rate"""
+        return Profiler._SAMPLE_RATE > 0 and random.random() < Profiler._SAMPLE_RATE
+
+    @staticmethod
+    def activate() -> tuple[str, contextvars.Token]:
+        """Profile the current request - returns its (profile id, token)"""
+        profile_id = uuid.uuid4().hex[:12]
+        return profile_id, _PROFILE_ID.set(profile_id)
+
+    @staticmethod
+    def deactivate(token: contextvars.Token):
+        """Stop profiling the current request"""
+        _PROFILE_ID.reset(token)
+
+    @staticmethod
+    def run(name: str, func, *args, **kwargs):
+        """
+        Return func(*args, **kwargs), profiling the call when the
+        current request is profiled
+        """
+        profile_id = _PROFILE_ID.get()
+        if not profile_id:
+            return func(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is already active in this thread
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            Profiler._save(profile, f"{time.time_ns()}-{profile_id}-{name}.prof")
+
+    @staticmethod
+    def _save(profile: cProfile.Profile, name: str):
+        """Save a profile to the ring, dropping the oldest beyond the max"""
+        os.makedirs(Profiler._DIR, exist_ok=True)
+        profile.dump_stats(os.path.join(Profiler._DIR, name))
+        for old in Profiler.profiles()[Profiler._MAX_FILES :]:
+            try:
+                os.remove(os.path.join(Profiler._DIR, old["name"]))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def profiles() -> list:
+        """Return the saved profiles, the newest first"""
+        try:
+            names = [name for name in os.listdir(Profiler._DIR) if Profiler.valid(name)]
+        except FileNotFoundError:
+            return []
+        profiles = []
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(Profiler._DIR, name))
+            except FileNotFoundError:
+                continue
+            stamp, profile_id, operation = name[: -len(".prof")].split("-")
+            profiles.append(
+                {
+                    "name": name,
+                    "profile_id": profile_id,
+                    "operation": operation,
+                    "created": int(stamp) / 1e9,
+                    "bytes": stat.st_size,
+                }
+            )
+        profiles.sort(key=lambda profile: profile["created"], reverse=True)
+        return profiles
+
+    @staticmethod
+    def valid(name: str) -> bool:
+        """Return whether name is a valid profile file name"""
+        return bool(_PROFILE_NAME.match(name))
+
+    @staticmethod
+    def path(name: str) -> str:
+        """Return the path of a saved profile"""
+        if not Profiler.valid(name):
+            raise ValueError(f"invalid profile name ({name})")
+        return os.path.join(Profiler._DIR, name)
+
+    @staticmethod
+    def text(name: str) -> str:
+        """Return the text rendering of a saved profile"""
+        stats = pstats.Stats(Profiler.path(name))
+        subprocess_secs = max(
+            (
+                cumulative
+                for (filename, _, function), (_, _, _, cumulative, _) in (
+                    stats.stats.items()  # pylint: disable=no-member
+                )
+                if filename.endswith("subprocess.py")
+                and function in ("run", "communicate", "wait", "check_output")
+            ),
+            default=0.0,
+        )
+        total = stats.total_tt  # pylint: disable=no-member
+        output = io.StringIO()
+        output.write(
+            f"total {total:.3f}s, subprocesses {subprocess_secs:.3f}s, "
+            f"python {max(total - subprocess_secs, 0):.3f}s\n\n"
+        )
+        stats.stream = output
+        stats.sort_stats("cumulative").print_stats(Profiler._TEXT_LINES)
+        return output.getvalue()
@@ -0,0 +1,162 @@
+"""
+The shared read-only ElectionData replica of the web-api read path.
+The verify, tally and show endpoints nominally run in the private GUID
+workspace of the requesting vote store, so no two voters share a
+tally cache entry, an incremental ballot store, open files, or the
+page cache of a clone.  In the replica read mode (VTP_READ_PATH=replica)
+they run in one shared, continuously updated workspace instead, and the
+vote store only authorizes the request.
+
+A read is served from the replica when all the commits the request
+refers to (the digests of a receipt, a row, the tracked contests, a
+CVR) are reachable from the replica HEAD - merely having the objects is
+not enough, as a fetched but unmerged CVR is not part of its tallies.
+The reachable commits are kept in a CommitIndex, which follows the
+fast forwards of the HEAD incrementally.  Otherwise - a voter's own
+CVRs before they are merged - the read falls back to the GUID
+workspace.
+
+The replica is updated after each merge and every interval seconds by
+the update callable (see VtpBackend.update_read_replica).
+"""
+
+import logging
+import subprocess
+import threading
+
+from content_cache import is_digest_list
+from repo_state import head_digest
+
+
+class CommitIndex:
+    """
+    The commits reachable from the HEAD of a git workspace.  When the
+    HEAD moves, only the new commits are listed if the old HEAD is an
+    ancestor of the new one ('git merge-base --is-ancestor'), otherwise
+    the index is rebuilt.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._head = ""
+        self._commits = set()
+        self._lock = threading.Lock()
+
+    def _git(self, *args, check: bool = True) -> subprocess.CompletedProcess:
+        """Run a git command in the workspace"""
+        return subprocess.run(
+            ["git", *args],
+            cwd=self._path,
+            check=check,
+            capture_output=True,
+            text=True,
+        )
+
+    def _update(self):
+        """Follow the HEAD of the workspace - requires the lock"""
+        head = head_digest(self._path)
+        if head == self._head:
+            return
+        if (
+            self._head
+            and self._git(
+                "merge-base", "--is-ancestor", self._head, head, check=False
+            ).returncode
+            == 0
+        ):
+            self._commits.update(
+                self._git("rev-list", f"{self._head}..{head}").stdout.split()
+            )
+        else:
+            self._commits = set(self._git("rev-list", head).stdout.split())
+        self._head = head
+
+    def contains(self, digests: list) -> bool:
+        """Return whether all the commits are reachable from the HEAD"""
+        with self._lock:
+            try:
+                self._update()
+            except (OSError, subprocess.CalledProcessError):
+                logging.exception("read replica: the commit index failed")
+                self._head = ""
+                self._commits = set()
+                return False
+            return self._commits.issuperset(digests)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._commits)
+
+
+class ReadReplica:  # pylint: disable=too-many-instance-attributes
+    """
+    The shared read workspace at path, updated by update() after each
+    merge (refresh) and every interval seconds (0 for merges only)
+    """
+
+    def __init__(self, path: str, update, interval: float = 5):
+        self.path = path
+        self._update = update
+        self._interval = interval
+        self._index = CommitIndex(path)
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        # statistics
+        self._stats = {
+            "reads": 0,
+            "fallbacks": 0,
+            "updates": 0,
+            "update_errors": 0,
+        }
+
+    def _start(self):
+        """Start the update thread on first use"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._loop, name="vtp-read-replica", daemon=True
+            )
+            self._thread.start()
+
+    def _loop(self):
+        """Update the replica on each refresh or interval"""
+        while True:
+            self._wake.wait(self._interval or None)
+            self._wake.clear()
+            try:
+                self._update(self.path)
+                with self._lock:
+                    self._stats["updates"] += 1
+            except Exception:  # pylint: disable=broad-exception-caught
+                logging.exception("read replica: the update failed")
+                with self._lock:
+                    self._stats["update_errors"] += 1
+
+    def refresh(self):
+        """Update the replica now - after a merge"""
+        self._start()
+        self._wake.set()
+
+    def has(self, digests: list) -> bool:
+        """
+        Return whether a read referring to the digests can be served
+        from the replica
+        """
+        self._start()
+        found = all(is_digest_list(digest) for digest in digests) and (
+            not digests
+            or self._index.contains(
+                [commit for digest in digests for commit in digest.split(",")]
+            )
+        )
+        with self._lock:
+            self._stats["reads" if found else "fallbacks"] += 1
+        return found
+
+    def stats(self) -> dict:
+        """Return the replica statistics"""
+        with self._lock:
+            stats = dict(self._stats, path=self.path, interval=self._interval)
+        return dict(stats, commits=len(self._index))
@@ -0,0 +1,168 @@
+"""
+Cheap inspection of the git state of an ElectionData workspace.  The
+web-api caches are keyed by (or invalidated on) the HEAD commit digest
+of a workspace, so this needs to be fast - the HEAD digest is read
+directly from the git metadata files and only falls back to running
+'git rev-parse HEAD' when the metadata cannot be parsed (for example
+when the ref is neither loose nor packed).
+
+The warm-up reads the object store of a workspace into the page cache
+so that the first git commands after a restart do not pay for it.
+
+The merges and the read replica run in their own clones of the
+upstream of the generic workspace (see clone_workspace), so that they
+move neither its HEAD nor its locks.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+
+
+def find_git_dir(path: str) -> str:
+    """
+    Return the git directory of the working tree containing path, or
+    the empty string if there is none.
+    """
+    path = os.path.abspath(path)
+    while True:
+        dot_git = os.path.join(path, ".git")
+        if os.path.isdir(dot_git):
+            return dot_git
+        if os.path.isfile(dot_git):
+            # a 'gitdir: <path>' file (worktrees, submodules)
+            with open(dot_git, "r", encoding="utf8") as infile:
+                line = infile.readline().strip()
+            if line.startswith("gitdir:"):
+                return os.path.normpath(os.path.join(path, line[7:].strip()))
+            return ""
+        parent = os.path.dirname(path)
+        if parent == path:
+            return ""
+        path = parent
+
+
+def _read_ref(git_dir: str, ref: str) -> str:
+    """Return the digest of a loose or packed ref, or the empty string"""
+    loose = os.path.join(git_dir, ref)
+    if os.path.isfile(loose):
+        with open(loose, "r", encoding="utf8") as infile:
+            return infile.read().strip()
+    packed = os.path.join(git_dir, "packed-refs")
+    if os.path.isfile(packed):
+        with open(packed, "r", encoding="utf8") as infile:
+            for line in infile:
+                fields = line.split()
+                if len(fields) == 2 and fields[1] == ref:
+                    return fields[0]
+    return ""
+
+
+def head_digest(path: str) -> str:
+    """
+    Return the HEAD commit digest of the workspace containing path
+    """
+    git_dir = find_git_dir(path)
+    if git_dir:
+        with open(os.path.join(git_dir, "HEAD"), "r", encoding="utf8") as infile:
+            head = infile.read().strip()
+        if not head.startswith("ref:"):
+            # a detached HEAD
+            return head
+        digest = _read_ref(git_dir, head[4:].strip())
+        if digest:
+            return digest
+    return subprocess.run(
+        ["git", "rev-parse", "HEAD"],
+        cwd=path,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+
+
+def _object_dirs(git_dir: str) -> list:
+    """Return the object directory of a git directory and its alternates"""
+    objects = os.path.join(git_dir, "objects")
+    dirs = [objects]
+    alternates = os.path.join(objects, "info", "alternates")
+    if os.path.isfile(alternates):
+        with open(alternates, "r", encoding="utf8") as infile:
+            for line in infile:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    dirs.append(os.path.normpath(os.path.join(objects, line)))
+    return dirs
+
+
+def warm_object_store(path: str, max_bytes: int = 0) -> int:
+    """
+    Read the pack files of the workspace containing path (and of its
+    alternates) into the page cache - the pack indexes first, then the
+    packs, the newest first - up to max_bytes (0 for no limit).
+    Returns the number of bytes read.
+    """
+    git_dir = find_git_dir(path)
+    if not git_dir:
+        return 0
+    indexes = []
+    packs = []
+    for objects in _object_dirs(git_dir):
+        pack_dir = os.path.join(objects, "pack")
+        if not os.path.isdir(pack_dir):
+            continue
+        with os.scandir(pack_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".idx"):
+                    indexes.append((entry.stat().st_mtime, entry.path))
+                elif entry.name.endswith(".pack"):
+                    packs.append((entry.stat().st_mtime, entry.path))
+    total = 0
+    for _, pack in sorted(indexes, reverse=True) + sorted(packs, reverse=True):
+        with open(pack, "rb") as infile:
+            while True:
+                chunk = infile.read(1024 * 1024)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if max_bytes and total >= max_bytes:
+                    return total
+    return total
+
+
+def _git(path: str, *args) -> str:
+    """Return the stdout of a git command run in path"""
+    return subprocess.run(
+        ["git", *args],
+        cwd=path,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+
+
+def clone_workspace(path: str, name: str) -> str:
+    """
+    Return the counterpart of the workspace containing path in a
+    dedicated clone of its upstream (origin), cloning it on first use.
+    The clone is the sibling '<working tree>.<name>' of the working
+    tree containing path.  Concurrent first uses (other worker
+    processes) race benignly - the losing clone is discarded.
+    """
+    top = _git(path, "rev-parse", "--show-toplevel")
+    clone = f"{top}.{name}"
+    if not os.path.isdir(os.path.join(clone, ".git")):
+        url = _git(top, "remote", "get-url", "origin")
+        staging = tempfile.mkdtemp(
+            prefix=f".{os.path.basename(clone)}-", dir=os.path.dirname(clone)
+        )
+        try:
+            _git(staging, "clone", "--quiet", url, "clone")
+            os.rename(os.path.join(staging, "clone"), clone)
+        except OSError:
+            if not os.path.isdir(os.path.join(clone, ".git")):
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    return os.path.normpath(os.path.join(clone, os.path.relpath(path, top)))
@@ -0,0 +1,169 @@
+"""
+Response compression for the web-api.  The tally_contests and
+show_contest responses are large and highly repetitive and are often
+served to phones on a congested Wi-Fi access point, so the routes that
+opt in (VTP_COMPRESSION_ROUTES) negotiate a gzip or brotli encoding
+with the client's Accept-Encoding.  Bodies smaller than
+VTP_COMPRESSION_MIN_BYTES are sent as is.
+
+Compression is paid once per cached result: an EncodedBody keeps the
+compressed encodings of a serialized body next to it, and the content
+cache keeps the compressed show responses next to the uncompressed
+ones.
+
+brotli is used when it is installed (pip install brotli), otherwise
+only gzip is offered.
+"""
+
+import gzip
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+
+class Compression:
+    """
+    Class to keep the namespace separate.  Negotiates and applies the
+    response encodings.
+    """
+
+    ########
+    # compression configuration
+    ########
+    # the offered encodings, the preferred first
+    _ENCODINGS = [
+        encoding
+        for encoding in os.getenv("VTP_COMPRESSION", "br,gzip")
+        .replace(" ", "")
+        .split(",")
+        if encoding == "gzip" or (encoding == "br" and brotli is not None)
+    ]
+    # the routes (endpoint names) whose responses are compressed
+    _ROUTES = set(
+        os.getenv(
+            "VTP_COMPRESSION_ROUTES",
+            "tally_contests,show_contest,show_versioned_receipt",
+        )
+        .replace(" ", "")
+        .split(",")
+    )
+    _MIN_BYTES = int(os.getenv("VTP_COMPRESSION_MIN_BYTES", "1024"))
+    _GZIP_LEVEL = int(os.getenv("VTP_COMPRESSION_GZIP_LEVEL", "6"))
+    _BROTLI_QUALITY = int(os.getenv("VTP_COMPRESSION_BROTLI_QUALITY", "5"))
+
+    ########
+    # compression statistics
+    ########
+    _lock = threading.Lock()
+    _counts = {}
+
+    @staticmethod
+    def enabled(route: str) -> bool:
+        """Return whether the responses of a route are compressed"""
+        return bool(Compression._ENCODINGS) and route in Compression._ROUTES
+
+    @staticmethod
+    def negotiate(route: str, accept_encoding: str) -> str:
+        """
+        Return the encoding of a route's response given the client's
+        Accept-Encoding header - the empty string for none
+        """
+        if not accept_encoding or not Compression.enabled(route):
+            return ""
+        accepted = {}
+        for item in accept_encoding.lower().split(","):
+            name, _, params = item.partition(";")
+            quality = 1.0
+            params = params.replace(" ", "")
+            if params.startswith("q="):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            accepted[name.strip()] = quality
+        # the highest client quality, ties broken by the server preference
+        best, best_quality = "", 0.0
+        for encoding in Compression._ENCODINGS:
+            quality = accepted.get(encoding, accepted.get("*", 0.0))
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    @staticmethod
+    def compressible(size: int) -> bool:
+        """Return whether a body of size bytes is worth compressing"""
+        return size >= Compression._MIN_BYTES
+
+    @staticmethod
+    def compress(body: bytes, encoding: str) -> bytes:
+        """Return the body compressed with encoding"""
+        if encoding == "br":
+            compressed = brotli.compress(body, quality=Compression._BROTLI_QUALITY)
+        elif encoding == "gzip":
+            compressed = gzip.compress(
+                body, compresslevel=Compression._GZIP_LEVEL, mtime=0
+            )
+        else:
+            raise ValueError(f"unsupported encoding ({encoding})")
+        with Compression._lock:
+            counts = Compression._counts.setdefault(
+                encoding, {"compressions": 0, "bytes_in": 0, "bytes_out": 0}
+            )
+            counts["compressions"] += 1
+            counts["bytes_in"] += len(body)
+            counts["bytes_out"] += len(compressed)
+        return compressed
+
+    @staticmethod
+    def headers(route: str, encoding: str = "") -> dict:
+        """Return the Vary and Content-Encoding headers of a route's response"""
+        headers = {}
+        if Compression.enabled(route):
+            headers["Vary"] = "Accept-Encoding"
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return headers
+
+    @staticmethod
+    def stats() -> dict:
+        """Return the compression configuration and statistics"""
+        with Compression._lock:
+            return {
+                "encodings": list(Compression._ENCODINGS),
+                "routes": sorted(Compression._ROUTES),
+                "min_bytes": Compression._MIN_BYTES,
+                "compressed": {
+                    encoding: dict(counts)
+                    for encoding, counts in Compression._counts.items()
+                },
+            }
+
+
+class EncodedBody:  # pylint: disable=too-few-public-methods
+    """
+    A serialized response body and its compressed encodings, each
+    compressed on first use
+    """
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self._encodings = {}
+        self._lock = threading.Lock()
+
+    def encode(self, encoding: str) -> tuple[str, bytes]:
+        """
+        Return the (encoding, bytes) of the body in an encoding - the
+        body itself when no encoding was negotiated or it is too small
+        """
+        if not encoding or not Compression.compressible(len(self.body)):
+            return "", self.body
+        with self._lock:
+            compressed = self._encodings.get(encoding)
+            if compressed is None:
+                compressed = Compression.compress(self.body, encoding)
+                self._encodings[encoding] = compressed
+        return encoding, compressed
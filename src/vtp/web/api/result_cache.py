@@ -0,0 +1,114 @@
+"""
+A bounded LRU cache of backend results with single-flight coalescing.
+When several threads ask for the same missing key at the same time,
+only the first one (the leader) computes the result - the others wait
+for the leader and share its result (or its exception).  Failed
+computations are not cached.
+"""
+
+import collections
+import threading
+
+
+class _Flight:
+    """An in-flight computation of a SingleFlightLruCache key"""
+
+    # pylint: disable=too-few-public-methods
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlightLruCache:  # pylint: disable=too-many-instance-attributes
+    """
+    A thread safe LRU cache of up to max_entries results with
+    hit/miss/coalesced/eviction counters.
+    """
+
+    def __init__(self, max_entries: int):
+        self._max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        # statistics
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+
+    def get(self, key):
+        """Return the cached value of key or None"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        """Cache value under key, evicting the least recently used"""
+        with self._lock:
+            self._put(key, value)
+
+    def _put(self, key, value):
+        """Cache value under key - requires the lock"""
+        if self._max_entries < 1:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value of key.  On a miss, either compute it
+        via compute() or wait for the identical in-flight computation.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                self._misses += 1
+                flight = self._in_flight[key] = _Flight()
+            else:
+                self._coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = compute()
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    self._put(key, flight.value)
+                del self._in_flight[key]
+            flight.done.set()
+        return flight.value
+
+    def clear(self):
+        """Drop all the cached values"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return the cache statistics"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self._max_entries,
+                "in_flight": len(self._in_flight),
+                "hits": self._hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+                "evictions": self._evictions,
+            }
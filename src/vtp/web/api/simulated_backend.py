@@ -0,0 +1,579 @@
+"""
+A latency realistic stand-in for VtpBackend, selected with
+VTP_BACKEND=simulated.  It implements every VtpBackend method the
+web-api calls without an ElectionData deployment (and without the
+VoteTrackerPlus repo), so that the API tier can be capacity planned
+and its concurrency features exercised on a laptop.
+
+Each operation type (setup, ballot, cast, merge, verify, tally, show)
+costs a latency drawn from a configurable distribution:
+
+    VTP_SIM_<OP>_LATENCY  - fixed:<secs>, uniform:<low>:<high>,
+                            lognormal:<median>:<sigma> or
+                            exponential:<mean>
+
+of which VTP_SIM_CPU_FRACTION is spent spinning the CPU (python work,
+holding the GIL) and the rest sleeping (waiting on a git subprocess).
+The writing operations (setup, cast, merge) also write and fsync
+VTP_SIM_IO_BYTES to a scratch file, a tally costs an extra
+VTP_SIM_TALLY_PER_BALLOT seconds per ballot in the election, and any
+operation fails with probability VTP_SIM_FAILURE_RATE.
+
+The election itself is synthetic but consistent: it starts with
+VTP_SIM_SEED_BALLOTS random ballots for the contests of the mock blank
+ballot and grows with every cast (once merged, when MERGE_CONTESTS is
+set).  The receipts, verifications, contest CVRs and tallies are
+computed from it, the tallies via the incremental tally engine.
+"""
+
+import collections
+import hashlib
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+
+from backend import verify_pairs
+from bulk_cast import cast_each
+from fast_json import dumps
+from incremental_tally import (
+    ContestBallots,
+    IncrementalTally,
+    contest_records,
+    render_lines,
+)
+from metrics import Metrics
+from profiler import Profiler
+from response_compression import EncodedBody
+from workspace_locks import WorkspaceLocks
+
+
+class SimulatedFailure(RuntimeError):
+    """An injected backend failure"""
+
+
+class _Latency:  # pylint: disable=too-few-public-methods
+    """A latency distribution parsed from a VTP_SIM_<OP>_LATENCY spec"""
+
+    def __init__(self, spec: str):
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(param) for param in params]
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2, "exponential": 1}
+        if expected.get(kind) != len(self.params):
+            raise ValueError(f"invalid simulated latency ({spec})")
+
+    def sample(self, rng: random.Random) -> float:
+        """Return a latency in seconds"""
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "lognormal":
+            return rng.lognormvariate(math.log(self.params[0]), self.params[1])
+        return rng.expovariate(1 / self.params[0])
+
+
+class SimulatedBackend:
+    """
+    Class to keep the namespace separate.  A synthetic election served
+    with simulated backend costs.
+    """
+
+    ########
+    # simulation configuration
+    ########
+    _DEFAULT_LATENCIES = {
+        "setup": "lognormal:0.8:0.3",
+        "ballot": "lognormal:0.05:0.3",
+        "cast": "lognormal:0.3:0.4",
+        "merge": "lognormal:0.5:0.3",
+        "verify": "lognormal:0.1:0.3",
+        "tally": "lognormal:0.05:0.3",
+        "show": "lognormal:0.05:0.3",
+    }
+    _LATENCIES = {
+        op: _Latency(os.getenv(f"VTP_SIM_{op.upper()}_LATENCY", default))
+        for op, default in _DEFAULT_LATENCIES.items()
+    }
+    # the VoteTrackerPlus operation each operation type stands in for,
+    # which labels its latency metrics and profiles
+    _OPERATIONS = {
+        "setup": "SetupVtpDemoOperation",
+        "ballot": "CastBallotOperation",
+        "cast": "AcceptBallotOperation",
+        "merge": "MergeContestsOperation",
+        "verify": "VerifyBallotReceiptOperation",
+        "tally": "TallyContestsOperation",
+        "show": "ShowContestsOperation",
+    }
+    _CPU_FRACTION = float(os.getenv("VTP_SIM_CPU_FRACTION", "0.2"))
+    _IO_BYTES = int(os.getenv("VTP_SIM_IO_BYTES", "0"))
+    _IO_DIR = os.getenv("VTP_SIM_IO_DIR", tempfile.gettempdir())
+    _TALLY_PER_BALLOT = float(os.getenv("VTP_SIM_TALLY_PER_BALLOT", "0.0002"))
+    _FAILURE_RATE = float(os.getenv("VTP_SIM_FAILURE_RATE", "0"))
+    _SEED_BALLOTS = int(os.getenv("VTP_SIM_SEED_BALLOTS", "100"))
+    # the number of rows of a ballot check
+    _RECEIPT_ROWS = 100
+    # the number of receipts kept for show_versioned_receipt
+    _MAX_RECEIPTS = 10000
+    # the contests of the synthetic election
+    _BLANK_BALLOT = "mock-data/blank-ballot.json"
+    # When set, the contests of the cast ballots are merged in batches
+    # via the merge queue (see merge_queue.py)
+    MERGE_CONTESTS = bool(os.getenv("MERGE_CONTESTS"))
+
+    ########
+    # simulation state
+    ########
+    _lock = threading.Lock()
+    _locks = WorkspaceLocks()
+    _rng = random.Random(int(os.getenv("VTP_SIM_SEED", "0")))
+    _blank_ballot = None
+    _contests = {}
+    _cvrs = {}
+    _guids = []
+    _pending = {}
+    _receipts = collections.OrderedDict()
+    _stats = collections.Counter()
+
+    ########
+    # simulated costs
+    ########
+    @staticmethod
+    def _cost(op: str, ballots: int = 0):
+        """
+        Spend the simulated cost of an operation, recording its latency
+        in the metrics and profiling it when the request is profiled
+        """
+        name = SimulatedBackend._OPERATIONS[op]
+        with Metrics.track("operation", name):
+            Profiler.run(name, SimulatedBackend._spend, op, ballots)
+
+    @staticmethod
+    def _spend(op: str, ballots: int):
+        """Spend the latency (and I/O) of an operation, or fail it"""
+        with SimulatedBackend._lock:
+            latency = SimulatedBackend._LATENCIES[op].sample(SimulatedBackend._rng)
+            failed = SimulatedBackend._rng.random() < SimulatedBackend._FAILURE_RATE
+            SimulatedBackend._stats[f"{op}_calls"] += 1
+        latency += ballots * SimulatedBackend._TALLY_PER_BALLOT
+        spin = latency * SimulatedBackend._CPU_FRACTION
+        deadline = time.perf_counter() + spin
+        while time.perf_counter() < deadline:
+            pass
+        if op in ("setup", "cast", "merge") and SimulatedBackend._IO_BYTES:
+            SimulatedBackend._write_scratch()
+        time.sleep(max(latency - spin, 0))
+        if failed:
+            with SimulatedBackend._lock:
+                SimulatedBackend._stats["failures"] += 1
+            raise SimulatedFailure(f"simulated {op} failure")
+
+    @staticmethod
+    def _write_scratch():
+        """Write and fsync the simulated I/O of a writing operation"""
+        with tempfile.NamedTemporaryFile(dir=SimulatedBackend._IO_DIR) as outfile:
+            outfile.write(os.urandom(SimulatedBackend._IO_BYTES))
+            outfile.flush()
+            os.fsync(outfile.fileno())
+
+    ########
+    # the synthetic election
+    ########
+    @staticmethod
+    def _digest() -> str:
+        """Return a new CVR digest - requires the lock"""
+        SimulatedBackend._stats["digests"] += 1
+        return hashlib.sha1(
+            f"simulated CVR {SimulatedBackend._stats['digests']}".encode("utf8")
+        ).hexdigest()
+
+    @staticmethod
+    def _election():
+        """Create the synthetic election on first use - requires the lock"""
+        if SimulatedBackend._blank_ballot is not None:
+            return
+        with open(SimulatedBackend._BLANK_BALLOT, "r", encoding="utf8") as infile:
+            blank_ballot = json.load(infile)
+        for contests in blank_ballot["contests"].values():
+            for contest in contests:
+                for name, body in contest.items():
+                    cvr = dict(body, name=name)
+                    # a choice is either a name or a dict with a name
+                    cvr["choices"] = [
+                        choice if isinstance(choice, dict) else {"name": choice}
+                        for choice in body["choices"]
+                    ]
+                    SimulatedBackend._contests[cvr["uid"]] = ContestBallots(cvr)
+        for _ in range(SimulatedBackend._SEED_BALLOTS):
+            for contest in SimulatedBackend._contests.values():
+                SimulatedBackend._fold(
+                    contest.uid,
+                    SimulatedBackend._digest(),
+                    SimulatedBackend._random_selection(contest),
+                )
+        SimulatedBackend._blank_ballot = blank_ballot
+
+    @staticmethod
+    def _random_selection(contest: ContestBallots) -> list:
+        """Return a random selection of a contest - requires the lock"""
+        rng = SimulatedBackend._rng
+        count = rng.randint(1, len(contest.choices)) if contest.tally == "rcv" else 1
+        return [
+            f"{index}: {contest.choices[index]}"
+            for index in rng.sample(range(len(contest.choices)), count)
+        ]
+
+    @staticmethod
+    def _fold(uid: str, digest: str, selection: list):
+        """Add a CVR to the election - requires the lock"""
+        SimulatedBackend._contests[uid].append(digest, selection)
+        SimulatedBackend._cvrs[digest] = uid
+        SimulatedBackend._stats["cvrs"] += 1
+
+    @staticmethod
+    def _selections(cast_ballot: dict) -> dict:
+        """Return the selections of a cast ballot by contest uid"""
+        selections = {}
+        for contests in cast_ballot.get("contests", {}).values():
+            for contest in contests:
+                for body in contest.values():
+                    selections[body.get("uid")] = body.get("selection", [])
+        return selections
+
+    ########
+    # the VtpBackend interface
+    ########
+    @staticmethod
+    def stats() -> dict:
+        """Return the simulation statistics"""
+        with SimulatedBackend._lock:
+            stats = dict(
+                SimulatedBackend._stats,
+                pending_casts=len(SimulatedBackend._pending),
+                receipts=len(SimulatedBackend._receipts),
+            )
+        return {"simulated": stats, "workspace_locks": SimulatedBackend._locks.stats()}
+
+    @staticmethod
+    def warm_up_steps() -> dict:
+        """Will return the warm-up steps - building and tallying the election"""
+        return {"tally": lambda: SimulatedBackend.tally_merged("")}
+
+    @staticmethod
+    def mock_response(endpoint: str) -> bytes | None:
+        """There are no static mock responses"""
+        # pylint: disable=unused-argument
+        return None
+
+    @staticmethod
+    def lock_vote_store(vote_store_id: str, write: bool = False):
+        """
+        Will return a context manager holding the read (or write) lock
+        of a vote store
+        """
+        return SimulatedBackend._locks.hold(vote_store_id, write=write)
+
+    @staticmethod
+    def get_vote_store_id() -> str:
+        """Will return a new vote_store_id"""
+        SimulatedBackend._cost("setup")
+        guid = hashlib.sha1(os.urandom(20)).hexdigest()
+        with SimulatedBackend._lock:
+            SimulatedBackend._guids.append(guid)
+        return guid
+
+    @staticmethod
+    def get_blank_ballot(voter_address: str = "") -> dict:
+        """Will return the blank ballot (for any address)"""
+        # pylint: disable=unused-argument
+        SimulatedBackend._cost("ballot")
+        with SimulatedBackend._lock:
+            SimulatedBackend._election()
+            return SimulatedBackend._blank_ballot
+
+    @staticmethod
+    def get_all_guid_workspaces() -> list:
+        """Will return the vote_store_ids handed out so far"""
+        with SimulatedBackend._lock:
+            return list(SimulatedBackend._guids)
+
+    @staticmethod
+    def get_guid_workspace_dir(guid: str) -> str:
+        """There are no workspaces on disk - so nothing to reap"""
+        # pylint: disable=unused-argument
+        return ""
+
+    @staticmethod
+    def cast_ballot(
+        vote_store_id: str, cast_ballot: dict
+    ) -> tuple[list, int, str, str]:
+        """
+        Will cast a ballot and return the ballot-check, the voter-index,
+        an (empty) qr image and the receipt digest
+        """
+        with SimulatedBackend.lock_vote_store(vote_store_id, write=True):
+            SimulatedBackend._cost("cast")
+            selections = SimulatedBackend._selections(cast_ballot)
+            rng = SimulatedBackend._rng
+            with SimulatedBackend._lock:
+                SimulatedBackend._election()
+                contests = list(SimulatedBackend._contests.values())
+                cvrs = [
+                    (
+                        contest.uid,
+                        SimulatedBackend._digest(),
+                        selections.get(contest.uid, []),
+                    )
+                    for contest in contests
+                ]
+                if SimulatedBackend.MERGE_CONTESTS:
+                    SimulatedBackend._pending.setdefault(vote_store_id, []).extend(cvrs)
+                else:
+                    for cvr in cvrs:
+                        SimulatedBackend._fold(*cvr)
+                vote_index = rng.randint(1, SimulatedBackend._RECEIPT_ROWS)
+                ballot_check = [
+                    [f"{contest.uid} - {contest.name}" for contest in contests]
+                ]
+                for row in range(1, SimulatedBackend._RECEIPT_ROWS + 1):
+                    if row == vote_index:
+                        ballot_check.append([cvr[1] for cvr in cvrs])
+                    else:
+                        ballot_check.append(
+                            [
+                                (rng.choice(contest.digests) if len(contest) else "")
+                                for contest in contests
+                            ]
+                        )
+                receipt_digest = hashlib.sha1(
+                    json.dumps(ballot_check).encode("utf8")
+                ).hexdigest()
+                SimulatedBackend._receipts[receipt_digest] = (ballot_check, vote_index)
+                while len(SimulatedBackend._receipts) > SimulatedBackend._MAX_RECEIPTS:
+                    SimulatedBackend._receipts.popitem(last=False)
+                SimulatedBackend._stats["casts"] += 1
+        return ballot_check, vote_index, "", receipt_digest
+
+    @staticmethod
+    def cast_ballots(vote_store_id: str, cast_ballots: list) -> list:
+        """Will cast a batch of ballots in one vote store"""
+        return cast_each(
+            lambda cast_ballot: SimulatedBackend.cast_ballot(
+                vote_store_id, cast_ballot
+            ),
+            cast_ballots,
+            SimulatedFailure,
+        )
+
+    @staticmethod
+    def merge_contests(flush: bool = False):
+        """
+        Will merge the pending CVRs of all the cast vote stores - there
+        is no minimum of pending CVRs to keep, so a flush only counts
+        """
+        SimulatedBackend._cost("merge")
+        with SimulatedBackend._lock:
+            SimulatedBackend._stats["flushes"] += flush
+            for cvrs in SimulatedBackend._pending.values():
+                for cvr in cvrs:
+                    SimulatedBackend._fold(*cvr)
+            SimulatedBackend._stats["merged"] += len(SimulatedBackend._pending)
+            SimulatedBackend._pending.clear()
+
+    @staticmethod
+    def _verify_lines(uids: list, digests: list) -> list:
+        """Return the verification lines of a row of digests"""
+        lines = []
+        errors = 0
+        with SimulatedBackend._lock:
+            for uid, digest in zip(uids, digests):
+                uid = str(uid).split(" - ", 1)[0]
+                contest = SimulatedBackend._contests.get(uid)
+                if contest is None or digest not in contest.digest_index:
+                    lines.append(f"[ERROR]: contest {uid} digest {digest} not found")
+                    errors += 1
+                    continue
+                lines.append(
+                    f"Contest '{uid} - {contest.name}' ({digest}) is vote "
+                    f"{contest.digest_index[digest] + 1} out of {len(contest)} votes"
+                )
+        lines.append("############")
+        if errors:
+            lines.append(f"[ERROR]: ballot receipt INVALID - {errors} digest errors")
+        else:
+            lines.append("[GOOD]: ballot receipt VALID - no digest errors found")
+        lines.append("############")
+        return lines
+
+    @staticmethod
+    def verify_ballot_receipt(
+        vote_store_id: str,
+        ballot_check: list,
+        vote_index: int,
+        cvr: bool = False,
+    ) -> dict:
+        """Will verify a ballot-check row"""
+        # pylint: disable=unused-argument
+        with SimulatedBackend.lock_vote_store(vote_store_id):
+            SimulatedBackend._cost("verify")
+            return {
+                "ballot-check-doc": SimulatedBackend._verify_lines(
+                    ballot_check[0], ballot_check[int(vote_index)]
+                )
+            }
+
+    @staticmethod
+    def verify_ballot_row(vote_store_id: str, uids: str, digests: str) -> dict:
+        """Will verify a row of digests"""
+        with SimulatedBackend.lock_vote_store(vote_store_id):
+            SimulatedBackend._cost("verify")
+            return {
+                "ballot-check-doc": SimulatedBackend._verify_lines(
+                    uids.split(","), digests.split(",")
+                )
+            }
+
+    @staticmethod
+    def verify_ballot_batch(vote_store_id: str, items: list) -> list:
+        """
+        Will verify a batch of receipts and rows in one operation, each
+        digest once
+        """
+        with SimulatedBackend.lock_vote_store(vote_store_id):
+            SimulatedBackend._cost("verify")
+            verified = {}
+            results = []
+            for item in items:
+                try:
+                    pairs, _ = verify_pairs(item)
+                    for pair in pairs:
+                        if pair not in verified:
+                            verified[pair] = {
+                                "ballot-check-doc": SimulatedBackend._verify_lines(
+                                    [pair[0]], [pair[1]]
+                                )
+                            }
+                    results.append(
+                        {"verify_ballot_stdout": [verified[pair] for pair in pairs]}
+                    )
+                except (KeyError, IndexError, TypeError, ValueError) as error:
+                    results.append({"webapi_error": f"{type(error).__name__}: {error}"})
+            return results
+
+    @staticmethod
+    def _snapshot(contests: str) -> IncrementalTally:
+        """Return a snapshot of the selected contests"""
+        snapshot = IncrementalTally("")
+        with SimulatedBackend._lock:
+            SimulatedBackend._election()
+            snapshot.contests = {
+                contest.uid: contest.snapshot()
+                for contest in IncrementalTally.select(
+                    SimulatedBackend._contests, contests
+                )
+            }
+        return snapshot
+
+    @staticmethod
+    def tally_contests(
+        vote_store_id: str, contests: str, digests: str, verbosity: str
+    ) -> list:
+        """Will tally the selected contests of the synthetic election"""
+        # pylint: disable=unused-argument
+        if digests in ("None", "null"):
+            digests = ""
+        if contests in ("None", "null"):
+            contests = ""
+        with SimulatedBackend.lock_vote_store(vote_store_id):
+            snapshot = SimulatedBackend._snapshot(contests)
+            SimulatedBackend._cost(
+                "tally", sum(len(contest) for contest in snapshot.contests.values())
+            )
+            return render_lines(snapshot.records(contests, digests))
+
+    @staticmethod
+    def tally_contests_body(
+        vote_store_id: str, contests: str, digests: str, verbosity: str
+    ) -> EncodedBody:
+        """Will return the serialized tally_contests response"""
+        return EncodedBody(
+            dumps(
+                {
+                    "tally_election_stdout": SimulatedBackend.tally_contests(
+                        vote_store_id, contests, digests, verbosity
+                    )
+                }
+            )
+        )
+
+    @staticmethod
+    def tally_merged(contests: str) -> list:
+        """Will tally the selected contests of the merged synthetic election"""
+        return SimulatedBackend.tally_contests("", contests, "", "")
+
+    @staticmethod
+    def tally_contests_stream(vote_store_id: str, contests: str, digests: str):
+        """Will return a generator of the structured tally records"""
+        if digests in ("None", "null"):
+            digests = ""
+        if contests in ("None", "null"):
+            contests = ""
+        with SimulatedBackend.lock_vote_store(vote_store_id):
+            snapshot = SimulatedBackend._snapshot(contests)
+            SimulatedBackend._cost("tally")
+        tracked = [digest for digest in digests.split(",") if digest]
+        return (
+            record
+            for contest in snapshot.contests.values()
+            for record in contest_records(contest, tracked)
+        )
+
+    @staticmethod
+    def _contest_doc(digest: str) -> dict:
+        """Return the show contest document of a CVR digest"""
+        with SimulatedBackend._lock:
+            uid = SimulatedBackend._cvrs.get(digest)
+            if uid is None:
+                return {"webapi_error": f"contest digest {digest} not found"}
+            contest = SimulatedBackend._contests[uid]
+            ranking = contest.ranking(contest.digest_index[digest])
+        return {
+            "header": [f"commit {digest}"],
+            "payload": {
+                "CVR": {
+                    "choices": [{"name": choice} for choice in contest.choices],
+                    "name": contest.name,
+                    "selection": [
+                        f"{index}: {contest.choices[index]}" for index in ranking
+                    ],
+                    "tally": contest.tally,
+                    "uid": contest.uid,
+                }
+            },
+        }
+
+    @staticmethod
+    def show_contest(vote_store_id: str, contests: str) -> dict:
+        """Will return the CVR contents of one or more contest digests"""
+        with SimulatedBackend.lock_vote_store(vote_store_id):
+            SimulatedBackend._cost("show")
+            docs = [
+                SimulatedBackend._contest_doc(digest) for digest in contests.split(",")
+            ]
+        return {"show-contest-doc": docs[0] if len(docs) == 1 else docs}
+
+    @staticmethod
+    def show_versioned_receipt(vote_store_id: str, digest: str) -> dict:
+        """Will return a versioned receipt via its digest"""
+        with SimulatedBackend.lock_vote_store(vote_store_id):
+            SimulatedBackend._cost("show")
+            with SimulatedBackend._lock:
+                receipt = SimulatedBackend._receipts.get(digest)
+        if receipt is None:
+            return {"webapi_error": f"receipt digest {digest} not found"}
+        return {"ballot-check": receipt[0], "vote-index": receipt[1]}
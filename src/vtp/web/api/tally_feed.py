@@ -0,0 +1,273 @@
+"""
+The live tally feed of the web-api.  Instead of re-requesting
+tally_contests over and over to watch the RCV rounds change, a client
+subscribes to contest UIDs (over a WebSocket or Server-Sent Events, see
+main.py) and is pushed the tally of each subscribed contest whenever it
+changes.
+
+The tallies change when the merge queue merges a batch of cast
+contests, or, without MERGE_CONTESTS, when a ballot is cast (the web-api
+notifies the feed of its casts then, as whatever merges them does so
+outside of the web-api).  On each change the feed recomputes the tally of every
+subscribed contest once, in the tally pool, and fans the same
+serialized message out to all the subscribers of that contest - so a
+few hundred phones watching a contest cost one tally per merge rather
+than one tally per poll.  Merges arriving while a round of tallies is
+running are coalesced into the next round, and a message that did not
+change is not pushed again.
+
+Each subscriber has a small queue.  A subscriber that falls behind has
+its oldest messages dropped, as only the latest tally of a contest
+matters.
+
+A subscription is limited to max_contests contests, each of which must
+be a contest of the blank ballot - a subscriber cannot have the feed
+tally arbitrary strings.
+"""
+
+import asyncio
+import logging
+import threading
+
+from executor import BackendExecutor
+from fast_json import dumps
+
+
+class TallyFeedFull(Exception):
+    """Raised when the feed has reached its max number of subscribers"""
+
+
+class InvalidSubscription(ValueError):
+    """Raised when a subscriber asks for malformed or unknown contests"""
+
+
+def feed_uids(value) -> list:
+    """
+    Return the contest uids of a subscription request - either a comma
+    separated string or a list of strings
+    """
+    if isinstance(value, str):
+        return [uid for uid in value.split(",") if uid]
+    if isinstance(value, list) and all(isinstance(uid, str) for uid in value):
+        return value
+    raise InvalidSubscription("the contests must be a list of contest uids")
+
+
+def ballot_uids(blank_ballot: dict) -> set:
+    """Return the contest uids of a blank ballot"""
+    return {
+        body["uid"]
+        for contests in blank_ballot.get("contests", {}).values()
+        for contest in contests
+        for body in contest.values()
+        if isinstance(body, dict) and "uid" in body
+    }
+
+
+class Subscription:
+    """The message queue and contest UIDs of a feed subscriber"""
+
+    def __init__(self, queue_size: int):
+        self.uids = set()
+        self.dropped = 0
+        self._queue = asyncio.Queue(queue_size)
+
+    def send(self, message: bytes):
+        """Queue a message, dropping the oldest one when full"""
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(message)
+
+    async def receive(self, timeout: float | None = None) -> bytes | None:
+        """Return the next message, or None after timeout seconds"""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class TallyFeed:  # pylint: disable=too-many-instance-attributes
+    """
+    Fans the tally of each subscribed contest out to its subscribers
+    whenever a merge changes it.  tally(contest_uid) returns the tally
+    stdout lines of a contest of the merged election and contests()
+    the uids of the contests that can be subscribed to - both blocking.
+    """
+
+    def __init__(
+        self,
+        tally,
+        contests,
+        max_subscribers: int = 1000,
+        queue_size: int = 4,
+        max_contests: int = 32,
+    ):
+        self._tally = tally
+        self._contests = contests
+        self._max_contests = max_contests
+        self._max_subscribers = max_subscribers
+        self._queue_size = queue_size
+        self._loop = None
+        self._subscriptions = set()
+        # the subscriptions and the latest message per contest uid
+        self._subscribers = {}
+        self._latest = {}
+        self._dirty = False
+        self._publisher = None
+        self._lock = threading.Lock()
+        # statistics
+        self._stats = {
+            "merges": 0,
+            "rounds": 0,
+            "tallies": 0,
+            "pushes": 0,
+            "messages": 0,
+            "errors": 0,
+            "refused": 0,
+            "invalid": 0,
+        }
+
+    def start(self):
+        """Start accepting the merge notifications - on the event loop"""
+        self._loop = asyncio.get_running_loop()
+
+    def stop(self):
+        """Stop the publishing of the tallies"""
+        self._loop = None
+        if self._publisher is not None:
+            self._publisher.cancel()
+
+    def merged(self, _vote_store_ids: list):
+        """The merge queue callback - called from the merge thread"""
+        with self._lock:
+            self._stats["merges"] += 1
+        self.changed()
+
+    def changed(self):
+        """Have the subscribed contests tallied again - from any thread"""
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._changed)
+
+    def _changed(self):
+        """Schedule a round of tallies of the subscribed contests"""
+        self._dirty = True
+        if self._publisher is None or self._publisher.done():
+            self._publisher = asyncio.create_task(self._publish())
+
+    async def _publish(self):
+        """Run rounds of tallies until no merge arrived during the last one"""
+        while self._dirty:
+            self._dirty = False
+            with self._lock:
+                self._stats["rounds"] += 1
+            for uid in list(self._subscribers):
+                await self._push(uid)
+
+    async def _push(self, uid: str):
+        """Tally a contest and push it to its subscribers when it changed"""
+        try:
+            lines = await BackendExecutor.run("tally", self._tally, uid)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logging.exception("tally feed: could not tally contest %s", uid)
+            with self._lock:
+                self._stats["errors"] += 1
+            return
+        message = dumps({"contest": uid, "tally_election_stdout": lines})
+        with self._lock:
+            self._stats["tallies"] += 1
+        subscribers = list(self._subscribers.get(uid, ()))
+        if not subscribers:
+            # the last subscriber left while the contest was tallied
+            self._latest.pop(uid, None)
+            return
+        if message == self._latest.get(uid):
+            return
+        self._latest[uid] = message
+        for subscription in subscribers:
+            subscription.send(message)
+        with self._lock:
+            self._stats["pushes"] += 1
+            self._stats["messages"] += len(subscribers)
+
+    def open(self) -> Subscription:
+        """Return a new subscription - raises TallyFeedFull when full"""
+        if len(self._subscriptions) >= self._max_subscribers:
+            with self._lock:
+                self._stats["refused"] += 1
+            raise TallyFeedFull(
+                f"the tally feed is full ({self._max_subscribers} subscribers)"
+            )
+        subscription = Subscription(self._queue_size)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def close(self, subscription: Subscription):
+        """Close a subscription"""
+        self.unsubscribe(subscription, list(subscription.uids))
+        self._subscriptions.discard(subscription)
+
+    async def _check(self, subscription: Subscription, uids: list):
+        """Raise InvalidSubscription unless the contests can be subscribed to"""
+        error = ""
+        if len(subscription.uids.union(uids)) > self._max_contests:
+            error = f"at most {self._max_contests} contests can be subscribed to"
+        elif not subscription.uids.issuperset(uids):
+            known = await BackendExecutor.run("ballot", self._contests)
+            unknown = sorted(set(uids) - subscription.uids - set(known))
+            if unknown:
+                error = f"unknown contests ({', '.join(unknown)})"
+        if error:
+            with self._lock:
+                self._stats["invalid"] += 1
+            raise InvalidSubscription(error)
+
+    async def subscribe(self, subscription: Subscription, uids: list):
+        """
+        Subscribe to contests and send their current tallies - raises
+        InvalidSubscription (and subscribes to none of them) when a
+        contest is unknown or there would be too many
+        """
+        await self._check(subscription, uids)
+        for uid in uids:
+            if uid in subscription.uids:
+                continue
+            subscription.uids.add(uid)
+            subscribers = self._subscribers.setdefault(uid, set())
+            subscribers.add(subscription)
+            if uid in self._latest:
+                subscription.send(self._latest[uid])
+            elif len(subscribers) == 1:
+                # the first subscriber of a contest - tally it now
+                await self._push(uid)
+
+    def unsubscribe(self, subscription: Subscription, uids: list):
+        """Unsubscribe from contests"""
+        for uid in uids:
+            subscription.uids.discard(uid)
+            subscribers = self._subscribers.get(uid)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                # the tally will be stale by the next subscription
+                del self._subscribers[uid]
+                self._latest.pop(uid, None)
+
+    def stats(self) -> dict:
+        """Return the feed statistics"""
+        with self._lock:
+            return {
+                "subscribers": len(self._subscriptions),
+                "max_subscribers": self._max_subscribers,
+                "max_contests": self._max_contests,
+                "contests": {
+                    uid: len(subscribers)
+                    for uid, subscribers in self._subscribers.items()
+                },
+                "dropped": sum(
+                    subscription.dropped for subscription in self._subscriptions
+                ),
+                **self._stats,
+            }
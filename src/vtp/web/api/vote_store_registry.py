@@ -0,0 +1,243 @@
+"""
+Registries of the vote store ids (GUIDs) handed out by the web-api and
+their state ("uncast", "cast", "restored", ...).  Both registries have
+the same dict like interface and expire the vote store ids that have
+not been seen for ttl seconds (the design notes' timeout of defunct
+GUIDs) - a ttl of 0 disables expiry.  The "pooled" vote store ids (the
+ready workspaces of the workspace pools, which are not seen until they
+are handed out) never expire.
+
+The InMemoryRegistry is private to a uvicorn worker process.  The
+SqliteRegistry keeps the state in a SQLite database in WAL mode so
+that all the uvicorn workers (--workers N) on one box share it - its
+methods block on the database, which the BLOCKING flag tells the
+web-api (so that it calls them off the event loop).  The registry is
+selected via open_registry:
+
+    memory               - an InMemoryRegistry (the default)
+    sqlite:<path>        - a SqliteRegistry stored in <path>
+"""
+
+import sqlite3
+import threading
+import time
+
+# the state of the ready workspaces of the workspace pools
+POOLED = "pooled"
+
+
+class InMemoryRegistry:
+    """A per process vote store registry"""
+
+    # whether the registry methods block (on I/O)
+    BLOCKING = False
+    # whether the registry is shared by the worker processes
+    SHARED = False
+
+    def __init__(self, ttl: float = 0):
+        self._ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._expired = 0
+
+    def _alive(self, entry: tuple, now: float) -> bool:
+        """Return whether a (state, last seen time) entry is alive"""
+        return not self._ttl or entry[0] == POOLED or now - entry[1] < self._ttl
+
+    def get(self, guid: str, default=None):
+        """Return the state of guid (and mark it as seen) or default"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(guid)
+            if entry is None:
+                return default
+            if not self._alive(entry, now):
+                del self._entries[guid]
+                self._expired += 1
+                return default
+            self._entries[guid] = (entry[0], now)
+            return entry[0]
+
+    def peek(self, guid: str) -> tuple:
+        """Return the (state, last seen time) of guid without marking it"""
+        with self._lock:
+            return self._entries.get(guid, (None, 0.0))
+
+    def __contains__(self, guid: str) -> bool:
+        return self.get(guid) is not None
+
+    def __getitem__(self, guid: str) -> str:
+        state = self.get(guid)
+        if state is None:
+            raise KeyError(guid)
+        return state
+
+    def __setitem__(self, guid: str, state: str):
+        self.set(guid, state)
+
+    def set(self, guid: str, state: str):
+        """Set the state of guid (and mark it as seen)"""
+        with self._lock:
+            self._entries[guid] = (state, time.time())
+
+    def __delitem__(self, guid: str):
+        with self._lock:
+            del self._entries[guid]
+
+    def expire(self) -> list:
+        """Drop and return the expired vote store ids"""
+        now = time.time()
+        with self._lock:
+            expired = [
+                guid
+                for guid, entry in self._entries.items()
+                if not self._alive(entry, now)
+            ]
+            for guid in expired:
+                del self._entries[guid]
+            self._expired += len(expired)
+        return expired
+
+    def stats(self) -> dict:
+        """Return the registry statistics"""
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "expired": self._expired,
+                "ttl": self._ttl,
+            }
+
+
+class SqliteRegistry:
+    """A vote store registry shared across processes via SQLite"""
+
+    # whether the registry methods block (on I/O)
+    BLOCKING = True
+    # whether the registry is shared by the worker processes
+    SHARED = True
+    # only refresh the last seen time of an entry this often (as a
+    # fraction of the ttl) to keep the lookups read only
+    _TOUCH_FRACTION = 0.1
+
+    def __init__(self, path: str, ttl: float = 0):
+        self._path = path
+        self._ttl = ttl
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS vote_stores ("
+                "guid TEXT PRIMARY KEY, state TEXT NOT NULL, last_seen REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS vote_stores_last_seen "
+                "ON vote_stores (last_seen)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the connection of the current thread"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, guid: str, default=None):
+        """Return the state of guid (and mark it as seen) or default"""
+        now = time.time()
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT state, last_seen FROM vote_stores WHERE guid = ?", (guid,)
+        ).fetchone()
+        if row is None:
+            return default
+        state, last_seen = row
+        if self._ttl and state != POOLED and now - last_seen >= self._ttl:
+            with connection:
+                connection.execute(
+                    "DELETE FROM vote_stores WHERE guid = ? AND last_seen = ?",
+                    (guid, last_seen),
+                )
+            return default
+        if self._ttl and now - last_seen >= self._ttl * SqliteRegistry._TOUCH_FRACTION:
+            with connection:
+                connection.execute(
+                    "UPDATE vote_stores SET last_seen = ? WHERE guid = ?", (now, guid)
+                )
+        return state
+
+    def peek(self, guid: str) -> tuple:
+        """Return the (state, last seen time) of guid without marking it"""
+        row = (
+            self._connection()
+            .execute("SELECT state, last_seen FROM vote_stores WHERE guid = ?", (guid,))
+            .fetchone()
+        )
+        return row if row is not None else (None, 0.0)
+
+    def __contains__(self, guid: str) -> bool:
+        return self.get(guid) is not None
+
+    def __getitem__(self, guid: str) -> str:
+        state = self.get(guid)
+        if state is None:
+            raise KeyError(guid)
+        return state
+
+    def __setitem__(self, guid: str, state: str):
+        self.set(guid, state)
+
+    def set(self, guid: str, state: str):
+        """Set the state of guid (and mark it as seen)"""
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO vote_stores (guid, state, last_seen) VALUES (?, ?, ?) "
+                "ON CONFLICT (guid) DO UPDATE SET "
+                "state = excluded.state, last_seen = excluded.last_seen",
+                (guid, state, time.time()),
+            )
+
+    def __delitem__(self, guid: str):
+        with self._connection() as connection:
+            if not connection.execute(
+                "DELETE FROM vote_stores WHERE guid = ?", (guid,)
+            ).rowcount:
+                raise KeyError(guid)
+
+    def expire(self) -> list:
+        """Drop and return the expired vote store ids"""
+        if not self._ttl:
+            return []
+        cutoff = time.time() - self._ttl
+        with self._connection() as connection:
+            return [
+                row[0]
+                for row in connection.execute(
+                    "DELETE FROM vote_stores WHERE last_seen <= ? AND state != ? "
+                    "RETURNING guid",
+                    (cutoff, POOLED),
+                ).fetchall()
+            ]
+
+    def stats(self) -> dict:
+        """Return the registry statistics"""
+        (entries,) = (
+            self._connection().execute("SELECT COUNT(*) FROM vote_stores").fetchone()
+        )
+        return {
+            "backend": "sqlite",
+            "path": self._path,
+            "entries": entries,
+            "ttl": self._ttl,
+        }
+
+
+def open_registry(spec: str, ttl: float = 0):
+    """Return the vote store registry described by spec"""
+    if spec in ("", "memory"):
+        return InMemoryRegistry(ttl)
+    if spec.startswith("sqlite:"):
+        return SqliteRegistry(spec[len("sqlite:") :], ttl)
+    raise ValueError(f"unknown vote store registry ({spec})")
@@ -0,0 +1,70 @@
+"""
+The startup warm-up of the web-api.  After a restart the first cast,
+tally and verify would otherwise pay for the cold imports, the parsing
+of the election configuration and the loading of the git packs while a
+voter waits.  The WarmUp runs a series of named steps (see
+VtpBackend.warm_up_steps and main.py) once at startup, records the time
+and the outcome of each, and reports readiness to the health endpoint.
+
+A failed step is logged and recorded but does not stop the warm-up -
+the web-api still serves, only colder.
+"""
+
+import logging
+import threading
+import time
+
+
+class WarmUp:
+    """
+    Runs the named warm-up steps, in order, once.  The state goes from
+    pending to warming to ready (or skipped when there are no steps).
+    """
+
+    def __init__(self, steps: dict):
+        self._steps = dict(steps)
+        self._lock = threading.Lock()
+        self._state = "pending"
+        self._results = {}
+        self._started = None
+        self._secs = None
+
+    @property
+    def ready(self) -> bool:
+        """Return whether the warm-up is over"""
+        return self._state in ("ready", "skipped")
+
+    def run(self):
+        """Run the steps - blocking"""
+        with self._lock:
+            if self._state != "pending":
+                return
+            self._state = "warming"
+            self._started = time.time()
+        start = time.monotonic()
+        for name, step in self._steps.items():
+            step_start = time.monotonic()
+            try:
+                step()
+                result = {"ok": True}
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                logging.exception("warm-up: the %s step failed", name)
+                result = {"ok": False, "error": f"{type(error).__name__}: {error}"}
+            result["secs"] = round(time.monotonic() - step_start, 3)
+            with self._lock:
+                self._results[name] = result
+        with self._lock:
+            self._secs = round(time.monotonic() - start, 3)
+            self._state = "ready" if self._steps else "skipped"
+
+    def stats(self) -> dict:
+        """Return the warm-up state and the outcome of each step"""
+        with self._lock:
+            return {
+                "state": self._state,
+                "started": self._started,
+                "secs": self._secs,
+                "steps": {
+                    name: self._results.get(name, {"ok": None}) for name in self._steps
+                },
+            }
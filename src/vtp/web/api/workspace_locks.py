@@ -0,0 +1,149 @@
+"""
+Read/write locks keyed by ElectionData workspace path.  Git operations
+in different workspaces (vote stores) run fully in parallel, while
+operations in the same workspace are serialized as needed: any number
+of readers (verify, tally, show) may share a workspace, a writer (cast,
+merge, reap) has it to itself.  Waiting writers block new readers so
+that a steady stream of reads cannot starve a cast.
+
+The per workspace locks only exist while in use.  The wait time
+statistics are kept per mode and for the most recently used
+workspaces.
+"""
+
+import collections
+import contextlib
+import threading
+import time
+
+
+class _ReadWriteLock:
+    """A writer preferring read/write lock"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+        # the number of users (holding or waiting) of the lock
+        self.users = 0
+
+    def acquire_read(self):
+        """Acquire the lock for reading"""
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        """Release a read hold of the lock"""
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        """Acquire the lock for writing"""
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        """Release the write hold of the lock"""
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+
+class WorkspaceLocks:
+    """The read/write locks of the ElectionData workspaces"""
+
+    # the number of workspaces with individual wait time statistics
+    _MAX_TRACKED = 256
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+        self._modes = {
+            mode: {"acquired": 0, "wait_secs": 0.0, "max_wait_secs": 0.0}
+            for mode in ("read", "write")
+        }
+        self._workspaces = collections.OrderedDict()
+
+    def _checkout(self, path: str) -> _ReadWriteLock:
+        """Return the lock of path, creating it as needed"""
+        with self._lock:
+            lock = self._locks.get(path)
+            if lock is None:
+                lock = self._locks[path] = _ReadWriteLock()
+            lock.users += 1
+            return lock
+
+    def _checkin(self, path: str, lock: _ReadWriteLock):
+        """Drop a use of the lock of path, deleting it when unused"""
+        with self._lock:
+            lock.users -= 1
+            if not lock.users:
+                del self._locks[path]
+
+    def _record(self, path: str, mode: str, wait: float):
+        """Record the wait time of an acquisition"""
+        with self._lock:
+            for stats in (
+                self._modes[mode],
+                self._workspaces.setdefault(
+                    path,
+                    {"acquired": 0, "wait_secs": 0.0, "max_wait_secs": 0.0},
+                ),
+            ):
+                stats["acquired"] += 1
+                stats["wait_secs"] += wait
+                stats["max_wait_secs"] = max(stats["max_wait_secs"], wait)
+            self._workspaces.move_to_end(path)
+            while len(self._workspaces) > WorkspaceLocks._MAX_TRACKED:
+                self._workspaces.popitem(last=False)
+
+    @contextlib.contextmanager
+    def hold(self, path: str, write: bool = False):
+        """Hold the read (or write) lock of the workspace at path"""
+        lock = self._checkout(path)
+        try:
+            start = time.monotonic()
+            if write:
+                lock.acquire_write()
+            else:
+                lock.acquire_read()
+            self._record(path, "write" if write else "read", time.monotonic() - start)
+            try:
+                yield
+            finally:
+                if write:
+                    lock.release_write()
+                else:
+                    lock.release_read()
+        finally:
+            self._checkin(path, lock)
+
+    def read(self, path: str):
+        """Hold the read lock of the workspace at path"""
+        return self.hold(path, write=False)
+
+    def write(self, path: str):
+        """Hold the write lock of the workspace at path"""
+        return self.hold(path, write=True)
+
+    def stats(self) -> dict:
+        """Return the lock wait time statistics"""
+        with self._lock:
+            return {
+                "active": len(self._locks),
+                "modes": {mode: dict(stats) for mode, stats in self._modes.items()},
+                "workspaces": {
+                    path: dict(stats) for path, stats in self._workspaces.items()
+                },
+            }
@@ -0,0 +1,155 @@
+"""
+A pool of pre-provisioned GUID vote store workspaces.  Creating a GUID
+workspace (SetupVtpDemoOperation with guid_client_store=True) clones
+the ElectionData repo, and doing so inside the cast_ballot request
+dominates the cast latency.  The WorkspacePool keeps a number of ready
+workspaces on hand, hands one out per cast in O(1), and refills itself
+in the background.
+
+The pool records its high and low watermarks - the most and the least
+number of ready workspaces seen since the pool was started (the low
+watermark being recorded as workspaces are handed out) - so that
+the pool size can be tuned for a rush of voters.  When the pool runs
+dry, acquire falls back to provisioning a workspace inline.  A pool of
+size 0 is disabled and always provisions inline (main.py disables it
+in mock mode, where there are no workspaces to provision).
+"""
+
+import collections
+import logging
+import threading
+import time
+
+
+class WorkspacePool:  # pylint: disable=too-many-instance-attributes
+    """
+    Maintains up to target_size ready GUID workspaces via a set of
+    background refill threads.
+    """
+
+    # seconds to wait before retrying after a failed provisioning
+    _RETRY_DELAY = 5.0
+
+    def __init__(self, provision, target_size: int, refill_threads: int = 1):
+        """
+        provision is the (blocking) callable that creates and returns
+        a new GUID workspace.
+        """
+        self._provision = provision
+        self._target_size = target_size
+        self._refill_threads = refill_threads
+        self._ready = collections.deque()
+        self._cond = threading.Condition()
+        self._provisioning = 0
+        self._threads = []
+        self._stopped = False
+        # statistics
+        self._high_watermark = 0
+        self._low_watermark = None
+        self._handed_out = 0
+        self._misses = 0
+        self._errors = 0
+
+    def start(self):
+        """Start the background refill threads"""
+        if self._target_size < 1:
+            return
+        for index in range(self._refill_threads):
+            thread = threading.Thread(
+                target=self._refill_loop,
+                name=f"vtp-workspace-pool-{index}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop the refill threads - ready workspaces are left as is"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    def _refill_loop(self):
+        """Keep the pool topped up to its target size"""
+        while True:
+            with self._cond:
+                while (
+                    not self._stopped
+                    and len(self._ready) + self._provisioning >= self._target_size
+                ):
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                self._provisioning += 1
+            try:
+                guid = self._provision()
+            except Exception:  # pylint: disable=broad-exception-caught
+                logging.exception("workspace pool: could not provision a workspace")
+                with self._cond:
+                    self._provisioning -= 1
+                    self._errors += 1
+                time.sleep(WorkspacePool._RETRY_DELAY)
+                continue
+            with self._cond:
+                self._provisioning -= 1
+                self._ready.append(guid)
+                self._high_watermark = max(self._high_watermark, len(self._ready))
+                self._cond.notify_all()
+
+    def acquire(self) -> str:
+        """
+        Return a ready GUID workspace.  If none are ready, one is
+        provisioned inline (which blocks).
+        """
+        if self._target_size < 1:
+            # a disabled pool - there is nothing to hand out or account for
+            return self._provision()
+        with self._cond:
+            if self._ready:
+                guid = self._ready.popleft()
+                self._handed_out += 1
+                if self._low_watermark is None:
+                    self._low_watermark = len(self._ready)
+                else:
+                    self._low_watermark = min(self._low_watermark, len(self._ready))
+                self._cond.notify_all()
+                return guid
+            self._misses += 1
+            self._low_watermark = 0
+        return self._provision()
+
+    def wait_filled(self, timeout: float) -> bool:
+        """
+        Wait up to timeout seconds for the pool to reach its target
+        size.  Returns whether it did.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while len(self._ready) < self._target_size and not self._stopped:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._threads:
+                    break
+                self._cond.wait(remaining)
+            return len(self._ready) >= self._target_size
+
+    def is_ready(self, guid: str) -> bool:
+        """Return whether guid is a ready (not yet handed out) workspace"""
+        with self._cond:
+            return guid in self._ready
+
+    def stats(self) -> dict:
+        """Return the pool statistics"""
+        with self._cond:
+            return {
+                "target_size": self._target_size,
+                "ready": len(self._ready),
+                "provisioning": self._provisioning,
+                "high_watermark": self._high_watermark,
+                "low_watermark": self._low_watermark,
+                "handed_out": self._handed_out,
+                "misses": self._misses,
+                "errors": self._errors,
+            }
@@ -0,0 +1,240 @@
+"""
+A background reaper of GUID workspaces.  Every cast leaves a full
+ElectionData clone behind, and over a long polling day they pile up -
+filling the disk and slowing down everything that enumerates them.
+The WorkspaceReaper periodically removes (or, when an archive
+directory is configured, moves aside) the workspaces that are either:
+
+- merged (their vote store is in the "merged" state) and have been idle
+  for merged_ttl seconds, or
+- abandoned and have not been modified for idle_ttl seconds - either
+  still registered in another state ("cast", "uncast", ...) and not
+  seen for idle_ttl seconds either, or no longer registered (never
+  registered or expired from the vote store registry).  The
+  modification time of a workspace is the newest of its directories
+  and of the git metadata files that the git commands touch (index,
+  HEAD, ...).  As the workspaces of the other uvicorn workers are not
+  registered in a per process registry, unregistered workspaces are
+  only reaped when the registry is shared.
+
+The ready workspaces of the workspace pools are registered in the
+"pooled" state (which does not expire) and are never reaped, nor are
+those of this worker's pool, and a workspace is only reaped while
+holding its write lock so that no request is using it.
+
+Each sweep also accounts for the total bytes and inodes used by the
+remaining workspaces.  Walking every file of every workspace on each
+sweep would cost more than the reaping, so the usage of a workspace is
+kept along with its modification time and it is only walked again
+once modified.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+
+
+def disk_usage(path: str) -> tuple[int, int]:
+    """Return the (bytes, inodes) used by the tree at path"""
+    total_bytes = 0
+    inodes = 0
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            try:
+                stat = os.lstat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            total_bytes += stat.st_size
+            inodes += 1
+    return total_bytes, inodes
+
+
+# the git metadata files (relative to the git directory) that the git
+# commands modifying a workspace touch
+_GIT_FILES = ("index", "HEAD", "FETCH_HEAD", "ORIG_HEAD", os.path.join("logs", "HEAD"))
+
+
+def last_modified(path: str, depth: int = 3) -> float:
+    """
+    Return the last modification time of the workspace at path - the
+    newest of the directories down to depth levels and of the git
+    metadata files of the git workspaces found there
+    """
+    newest = os.stat(path).st_mtime
+    git_dir = os.path.join(path, ".git")
+    if os.path.isdir(git_dir):
+        for name in _GIT_FILES:
+            try:
+                newest = max(newest, os.stat(os.path.join(git_dir, name)).st_mtime)
+            except FileNotFoundError:
+                continue
+        return newest
+    if depth > 0:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    newest = max(newest, last_modified(entry.path, depth - 1))
+    return newest
+
+
+class WorkspaceReaper:  # pylint: disable=too-many-instance-attributes
+    """
+    Periodically reaps the GUID workspaces listed by list_workspaces
+    (whose paths are returned by workspace_dir and whose locks are held
+    via lock(guid, write=True)).
+    """
+
+    def __init__(
+        self,
+        list_workspaces,
+        workspace_dir,
+        registry,
+        in_use,
+        *,
+        lock,
+        idle_ttl: float,
+        merged_ttl: float,
+        archive_dir: str = "",
+        interval: float = 300,
+    ):
+        # pylint: disable=too-many-arguments
+        self._list_workspaces = list_workspaces
+        self._workspace_dir = workspace_dir
+        self._registry = registry
+        self._in_use = in_use
+        self._lock_workspace = lock
+        self._idle_ttl = idle_ttl
+        self._merged_ttl = merged_ttl
+        self._archive_dir = archive_dir
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        # the (last modified, bytes, inodes) of the remaining workspaces
+        self._usage = {}
+        # statistics
+        self._stats = {
+            "workspaces": 0,
+            "bytes": 0,
+            "inodes": 0,
+            "reaped": 0,
+            "archived": 0,
+            "reaped_bytes": 0,
+            "errors": 0,
+            "sweeps": 0,
+            "last_sweep_secs": 0.0,
+        }
+
+    def start(self):
+        """Start the background reaper thread"""
+        if self._interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._loop, name="vtp-workspace-reaper", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background reaper thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self):
+        """Sweep every interval seconds until stopped"""
+        while not self._stop.wait(self._interval):
+            try:
+                self.sweep()
+            except Exception:  # pylint: disable=broad-exception-caught
+                logging.exception("workspace reaper: the sweep failed")
+                with self._lock:
+                    self._stats["errors"] += 1
+
+    def _reapable(self, guid: str, modified: float, now: float) -> bool:
+        """Return whether the workspace of guid can be reaped"""
+        if self._in_use(guid):
+            return False
+        state, last_seen = self._registry.peek(guid)
+        if state == "pooled":
+            # a ready workspace of (maybe another worker's) pool
+            return False
+        if state == "merged":
+            return now - last_seen >= self._merged_ttl
+        if not self._idle_ttl or now - modified < self._idle_ttl:
+            return False
+        if state is None:
+            return self._registry.SHARED
+        return now - last_seen >= self._idle_ttl
+
+    def _reap(self, guid: str, path: str) -> bool:
+        """Remove or archive a workspace - returns whether it was archived"""
+        try:
+            del self._registry[guid]
+        except KeyError:
+            pass
+        if self._archive_dir:
+            os.makedirs(self._archive_dir, exist_ok=True)
+            shutil.move(path, os.path.join(self._archive_dir, guid))
+            return True
+        shutil.rmtree(path)
+        return False
+
+    def _disk_usage(self, guid: str, path: str, modified: float) -> tuple[int, int]:
+        """
+        Return the (bytes, inodes) used by a workspace, walking it only
+        when it was modified since it was last walked
+        """
+        usage = self._usage.get(guid)
+        if usage is None or usage[0] != modified:
+            usage = self._usage[guid] = (modified, *disk_usage(path))
+        return usage[1:]
+
+    def sweep(self):
+        """Reap what can be reaped and account for the rest"""
+        start = time.monotonic()
+        now = time.time()
+        counts = {"workspaces": 0, "bytes": 0, "inodes": 0}
+        reaped = {"reaped": 0, "archived": 0, "reaped_bytes": 0, "errors": 0}
+        remaining = set()
+        for guid in self._list_workspaces():
+            path = self._workspace_dir(guid)
+            if not path or not os.path.isdir(path):
+                continue
+            try:
+                modified = last_modified(path)
+                if self._reapable(guid, modified, now):
+                    with self._lock_workspace(guid, write=True):
+                        # check again now that no request is using it
+                        if self._reapable(guid, last_modified(path), now):
+                            size, _ = self._disk_usage(guid, path, modified)
+                            reaped["archived"] += self._reap(guid, path)
+                            reaped["reaped"] += 1
+                            reaped["reaped_bytes"] += size
+                            continue
+                size, inodes = self._disk_usage(guid, path, modified)
+            except OSError:
+                logging.exception("workspace reaper: could not reap %s", path)
+                reaped["errors"] += 1
+                continue
+            remaining.add(guid)
+            counts["workspaces"] += 1
+            counts["bytes"] += size
+            counts["inodes"] += inodes
+        # forget the usage of the reaped and vanished workspaces
+        for guid in set(self._usage) - remaining:
+            del self._usage[guid]
+        with self._lock:
+            self._stats.update(counts)
+            for name, value in reaped.items():
+                self._stats[name] += value
+            self._stats["sweeps"] += 1
+            self._stats["last_sweep_secs"] = round(time.monotonic() - start, 3)
+
+    def stats(self) -> dict:
+        """Return the reaper statistics"""
+        with self._lock:
+            return dict(self._stats)
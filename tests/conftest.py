@@ -0,0 +1,58 @@
+"""
+Test configuration.  The web-api modules import each other by their
+flat module names (uvicorn runs main:app from src/vtp/web/api), so that
+directory is put on the import path.
+
+The web-api modules read their configuration from the environment when
+they are imported, so the simulated backend (see simulated_backend.py)
+is configured here, before any test module imports them, to cost no
+latency.  The web-api itself (main) is imported once per session by the
+webapi fixture.
+"""
+
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+API_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "src", "vtp", "web", "api")
+)
+sys.path.insert(0, API_DIR)
+
+for op in ("setup", "ballot", "cast", "merge", "verify", "tally", "show"):
+    os.environ.setdefault(f"VTP_SIM_{op.upper()}_LATENCY", "fixed:0")
+os.environ.setdefault("VTP_SIM_SEED_BALLOTS", "20")
+
+# the admin token of the web-api tests
+ADMIN_TOKEN = "test-admin-token"
+
+
+@pytest.fixture(name="webapi", scope="session")
+def fixture_webapi(tmp_path_factory):
+    """
+    The web-api (the main module) on the simulated backend, run from a
+    scratch directory holding the static pages and the mock data
+    """
+    root = tmp_path_factory.mktemp("webapi")
+    os.mkdir(root / "static")
+    os.symlink(os.path.join(API_DIR, "mock-data"), root / "mock-data")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(root)
+        monkeypatch.setenv("VTP_BACKEND", "simulated")
+        monkeypatch.setenv("VTP_ADMIN_TOKEN", ADMIN_TOKEN)
+        monkeypatch.setenv("VTP_MERGE_QUEUE_PATH", str(root / "merge-queue.db"))
+        monkeypatch.setenv("VTP_WORKSPACE_POOL_SIZE", "2")
+        monkeypatch.setenv("VTP_WORKSPACE_REAPER_INTERVAL", "0")
+        # pylint: disable=import-outside-toplevel
+        import main
+
+        yield main
+
+
+@pytest.fixture(name="client", scope="session")
+def fixture_client(webapi):
+    """A client of the running web-api"""
+    with TestClient(webapi.app) as client:
+        yield client
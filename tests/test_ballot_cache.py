@@ -0,0 +1,59 @@
+"""Tests for the blank ballot cache"""
+
+import subprocess
+
+import pytest
+from ballot_cache import BlankBallotCache
+from repo_state import head_digest
+
+CONCORD = {"ballot_subdir": "GGOs/states/Massachusetts", "active_ggos": ["Concord"]}
+ALSO_CONCORD = "123,  main street, CONCORD, Massachusetts"
+
+
+def git(path: str, *args):
+    """Run a git command in a workspace"""
+    subprocess.run(["git", *args], cwd=path, check=True, capture_output=True)
+
+
+@pytest.fixture(name="workspace")
+def fixture_workspace(tmp_path):
+    """An ElectionData like git workspace with one commit"""
+    git(str(tmp_path), "init", "-q", "-b", "main")
+    git(str(tmp_path), "config", "user.email", "test@example.com")
+    git(str(tmp_path), "config", "user.name", "test")
+    git(str(tmp_path), "commit", "-q", "--allow-empty", "-m", "initial commit")
+    return str(tmp_path)
+
+
+def test_addresses_share_a_ballot_style():
+    """The addresses of a ballot style share its blank ballot"""
+    cache = BlankBallotCache()
+    cache.put("head", "123, Main Street, Concord, Massachusetts", CONCORD)
+    assert cache.get("head", ALSO_CONCORD) is CONCORD
+    cache.put("head", "1 Elm Street, Concord, Massachusetts", dict(CONCORD))
+    assert cache.get("head", "1 elm street, concord, massachusetts") is CONCORD
+    assert cache.get("head", "1 Oak Street, Lexington, Massachusetts") is None
+    stats = cache.stats()
+    assert (stats["styles"], stats["addresses"]) == (1, 2)
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+
+
+def test_a_moved_head_drops_the_ballots(workspace):
+    """A commit to the ElectionData workspace invalidates the cache"""
+    cache = BlankBallotCache()
+    cache.put(head_digest(workspace), ALSO_CONCORD, CONCORD)
+    assert cache.get(head_digest(workspace), ALSO_CONCORD) is CONCORD
+    git(workspace, "commit", "-q", "--allow-empty", "-m", "a new GGO")
+    assert cache.get(head_digest(workspace), ALSO_CONCORD) is None
+    stats = cache.stats()
+    assert stats["head"] == head_digest(workspace)
+    assert (stats["styles"], stats["invalidations"]) == (0, 1)
+
+
+def test_packed_and_detached_heads(workspace):
+    """The HEAD digest is read from packed refs and detached HEADs"""
+    head = head_digest(workspace)
+    git(workspace, "pack-refs", "--all")
+    assert head_digest(workspace) == head
+    git(workspace, "checkout", "-q", "--detach")
+    assert head_digest(workspace) == head
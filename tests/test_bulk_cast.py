@@ -0,0 +1,177 @@
+"""Tests for the bulk cast ballot ingestion"""
+
+import asyncio
+import json
+import threading
+
+import pytest
+from bulk_cast import NOT_CAST, BulkCast, cast_each, validate_ballot
+from conftest import ADMIN_TOKEN
+
+BALLOT = {"contests": {"city": [{"Mayor": {"selection": ["0: Ann"]}}]}}
+
+
+class Backend:
+    """A backend casting receipts numbered by vote store, failing on demand"""
+
+    def __init__(self, fail: set = frozenset(), release: threading.Event = None):
+        self.fail = fail
+        self.release = release
+        self.casting = threading.Event()
+        self.vote_stores = []
+        self.done = []
+
+    def acquire(self) -> str:
+        """Return a new vote store"""
+        self.vote_stores.append(f"guid{len(self.vote_stores)}")
+        return self.vote_stores[-1]
+
+    def cast(self, vote_store_id: str, ballots: list) -> list:
+        """Cast a batch, failing the ballots whose voter is in fail"""
+
+        def cast_one(ballot: dict):
+            if ballot.get("voter") in self.fail:
+                raise RuntimeError("git push failed")
+            return [["0001 - Mayor"], [ballot.get("voter")]], 1, "", vote_store_id
+
+        self.casting.set()
+        if self.release is not None:
+            self.release.wait(10)
+        return cast_each(cast_one, ballots)
+
+    async def cast_done(self, vote_store_id: str):
+        """Record a cast batch"""
+        self.done.append(vote_store_id)
+
+
+async def upload(lines: list, chunk_size: int = 7):
+    """Yield an NDJSON upload in small chunks"""
+    data = b"".join(line + b"\n" for line in lines)
+    for start in range(0, len(data), chunk_size):
+        yield data[start : start + chunk_size]
+
+
+def ballot_line(voter: int) -> bytes:
+    """Return the NDJSON line of a valid ballot"""
+    return json.dumps(dict(BALLOT, voter=voter)).encode("utf8")
+
+
+def ingest(backend: Backend, lines: list, **kwargs) -> list:
+    """Return the parsed results of a bulk cast of the lines"""
+
+    async def scenario():
+        bulk_cast = BulkCast(backend.acquire, backend.cast, backend.cast_done, **kwargs)
+        await bulk_cast.feed(upload(lines))
+        return [json.loads(result) async for result in bulk_cast.results()]
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize(
+    "ballot, error",
+    [
+        (BALLOT, ""),
+        ([], "a cast ballot must be an object"),
+        ({"contests": {}}, "a cast ballot must have a contests object"),
+        ({"contests": {"city": {}}}, "the city contests must be a list"),
+        ({"contests": {"city": ["Mayor"]}}, "the city contests must be objects"),
+        (
+            {"contests": {"city": [{"Mayor": {"selection": "0: Ann"}}]}},
+            "the Mayor contest must have a selection list",
+        ),
+    ],
+)
+def test_validation(ballot, error):
+    """A malformed cast ballot is answered with why"""
+    assert validate_ballot(ballot) == error
+
+
+def test_invalid_lines_are_answered_and_the_rest_cast():
+    """The invalid lines get an error, tagged with their line number"""
+    backend = Backend()
+    results = ingest(
+        backend,
+        [ballot_line(1), b"{not json", b"[]", ballot_line(4)],
+        workers=1,
+        batch_size=10,
+    )
+    summary = results.pop()["summary"]
+    by_line = {result["line"]: result for result in results}
+    assert by_line[1]["vote_store_id"] == "guid0"
+    assert by_line[4]["ballot_check"][1] == [4]
+    assert by_line[2]["webapi_error"].startswith("invalid JSON")
+    assert by_line[3]["webapi_error"] == "a cast ballot must be an object"
+    assert (summary["ballots"], summary["cast"], summary["invalid"]) == (4, 2, 2)
+    assert backend.done == ["guid0"]
+
+
+def test_excess_ballots_are_refused():
+    """The ballots beyond max_ballots are refused, and not read"""
+    backend = Backend()
+    results = ingest(backend, [ballot_line(voter) for voter in range(5)], max_ballots=3)
+    summary = results.pop()["summary"]
+    refused = [result for result in results if "webapi_error" in result]
+    assert refused == [{"line": 4, "webapi_error": "more than 3 ballots - not read"}]
+    assert (summary["ballots"], summary["cast"], summary["invalid"]) == (3, 3, 1)
+
+
+def test_a_failed_ballot_stops_its_batch():
+    """
+    The ballots after a failed one are not cast, and the next batch is
+    cast in a new vote store
+    """
+    backend = Backend(fail={2})
+    results = ingest(
+        backend,
+        [ballot_line(voter) for voter in range(1, 7)],
+        workers=1,
+        batch_size=3,
+    )
+    summary = results.pop()["summary"]
+    by_line = {result["line"]: result for result in results}
+    assert by_line[1]["vote_store_id"] == "guid0"
+    assert by_line[2]["webapi_error"] == "RuntimeError: git push failed"
+    assert by_line[3]["webapi_error"] == NOT_CAST
+    assert {by_line[line]["vote_store_id"] for line in (4, 5, 6)} == {"guid1"}
+    assert (summary["cast"], summary["errors"]) == (4, 2)
+    assert backend.done == ["guid0", "guid1"]
+
+
+def test_a_disconnect_still_records_the_casting_batch():
+    """A batch casting when the client disconnects is still recorded"""
+    release = threading.Event()
+    backend = Backend(release=release)
+
+    async def disconnecting():
+        yield ballot_line(1) + b"\n"
+        await asyncio.to_thread(backend.casting.wait, 10)
+        raise ConnectionResetError("client disconnected")
+
+    async def scenario():
+        bulk_cast = BulkCast(
+            backend.acquire, backend.cast, backend.cast_done, workers=1, batch_size=1
+        )
+        with pytest.raises(ConnectionResetError):
+            await bulk_cast.feed(disconnecting())
+        release.set()
+        for _ in range(500):
+            if backend.done:
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert backend.done == ["guid0"]
+
+
+def test_bulk_cast_requires_the_admin_token(client):
+    """The bulk cast endpoint is an admin endpoint"""
+    url = "/web-api/admin/cast_ballots"
+    assert client.post(url, content=ballot_line(1)).status_code == 403
+    response = client.post(
+        url,
+        content=ballot_line(1) + b"\n" + ballot_line(2),
+        headers={"X-VTP-Admin-Token": ADMIN_TOKEN},
+    )
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert results[-1]["summary"]["cast"] == 2
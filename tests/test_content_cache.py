@@ -0,0 +1,69 @@
+"""Tests for the content addressed response cache"""
+
+import os
+
+from content_cache import ContentCache, is_digest_list
+
+
+def test_is_digest_list():
+    """Only lists of full commit digests are content addressed"""
+    assert is_digest_list("a" * 40)
+    assert is_digest_list(f"{'a' * 40},{'b' * 64}")
+    assert not is_digest_list("0001")
+    assert not is_digest_list(f"{'a' * 40},HEAD")
+
+
+def test_etag():
+    """The ETag is a strong ETag derived from the request key alone"""
+    etag = ContentCache.etag("show_contest/abc")
+    assert etag == ContentCache.etag("show_contest/abc")
+    assert etag != ContentCache.etag("show_contest/abd")
+    assert etag.startswith('"') and etag.endswith('"')
+    assert ContentCache.etag_matches(f'"other", {etag}', etag)
+    assert ContentCache.etag_matches("*", etag)
+    assert not ContentCache.etag_matches('"other"', etag)
+
+
+def test_spill_and_promote(tmp_path):
+    """The least recently used bodies spill to disk and come back on a hit"""
+    cache = ContentCache(8, str(tmp_path), max_spill_bytes=1024)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    cache.put("c", b"cccc")
+    assert len(os.listdir(tmp_path)) == 1
+    assert cache.get("a") == b"aaaa"
+    stats = cache.stats()
+    assert (stats["spill_hits"], stats["bytes"]) == (1, 8)
+    assert cache.get("missing") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_spill_dir_is_bounded(tmp_path):
+    """The oldest spill files are removed beyond the on-disk size"""
+    cache = ContentCache(0, str(tmp_path), max_spill_bytes=8)
+    for key in "abc":
+        cache.put(key, key.encode() * 4)
+    assert len(os.listdir(tmp_path)) == 2
+    assert cache.get("a") is None
+    assert cache.get("c") == b"cccc"
+    assert cache.stats()["spilled_bytes"] == 8
+
+
+def test_spill_dir_is_reused(tmp_path):
+    """A given spill directory is kept and its files are served"""
+    ContentCache(0, str(tmp_path), max_spill_bytes=1024).put("a", b"aaaa")
+    cache = ContentCache(0, str(tmp_path), max_spill_bytes=1024)
+    assert cache.stats()["spilled_bytes"] == 4
+    assert cache.get("a") == b"aaaa"
+    cache.close()
+    assert os.listdir(tmp_path)
+
+
+def test_private_spill_dir():
+    """By default the spill directory is private and removed on close"""
+    cache = ContentCache(0, max_spill_bytes=1024)
+    cache.put("a", b"aaaa")
+    spill_dir = cache.spill_dir
+    assert os.path.isdir(spill_dir)
+    cache.close()
+    assert not os.path.exists(spill_dir)
@@ -0,0 +1,67 @@
+"""Tests for the backend executor pools"""
+
+import asyncio
+import contextvars
+import threading
+
+import pytest
+from executor import BackendExecutor
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+@pytest.fixture(autouse=True)
+def pools():
+    """Start every test with fresh pools"""
+    yield
+    BackendExecutor.shutdown()
+
+
+def test_run_off_the_event_loop():
+    """The blocking call runs in a named pool thread"""
+
+    async def main():
+        return await BackendExecutor.run(
+            "verify", lambda: threading.current_thread().name
+        )
+
+    assert asyncio.run(main()).startswith("vtp-verify")
+
+
+def test_run_carries_the_context():
+    """The request context variables are visible in the pool thread"""
+
+    async def main():
+        request_id.set("abc")
+        return await BackendExecutor.run("show", request_id.get)
+
+    assert asyncio.run(main()) == "abc"
+
+
+def test_full_pool_queues(monkeypatch):
+    """Calls beyond the pool size queue without blocking the event loop"""
+    monkeypatch.setenv("VTP_EXECUTOR_TEST_WORKERS", "1")
+    release = threading.Event()
+
+    async def main():
+        calls = [
+            asyncio.create_task(BackendExecutor.run("test", release.wait))
+            for _ in range(3)
+        ]
+        # the event loop still runs while the pool is busy
+        await asyncio.sleep(0.05)
+        stats = BackendExecutor.stats()["test"]
+        release.set()
+        await asyncio.gather(*calls)
+        return stats, BackendExecutor.stats()["test"]
+
+    busy, done = asyncio.run(main())
+    assert busy == {"workers": 1, "pending": 3, "submitted": 3}
+    assert done["pending"] == 0
+
+
+def test_invalid_pool_size(monkeypatch):
+    """A pool requires at least one worker"""
+    monkeypatch.setenv("VTP_EXECUTOR_EMPTY_WORKERS", "0")
+    with pytest.raises(ValueError):
+        BackendExecutor.get_pool("empty")
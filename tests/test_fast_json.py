@@ -0,0 +1,48 @@
+"""Tests for the fast JSON response path"""
+
+import datetime
+import json
+
+import fast_json
+import pytest
+from fast_json import FastJSONResponse, dumps
+
+DOC = {
+    "tally_election_stdout": ["Contest '0001 - Mayor' (plurality)", "ünïcode"],
+    "ballot-check": [["0001 - Mayor"], ["f" * 40]],
+    "vote-index": 1,
+    "nested": {"empty": [], "none": None, "float": 0.5},
+}
+
+
+@pytest.fixture(name="serializer", params=["orjson", "json"])
+def fixture_serializer(request, monkeypatch):
+    """Serialize with orjson (when installed) and with the json module"""
+    if request.param == "json":
+        monkeypatch.setattr(fast_json, "orjson", None)
+    elif fast_json.orjson is None:
+        pytest.skip("orjson is not installed")
+
+
+@pytest.mark.usefixtures("serializer")
+def test_dumps_round_trips():
+    """The serialized bytes parse back to the same data"""
+    body = dumps(DOC)
+    assert isinstance(body, bytes)
+    assert json.loads(body) == DOC
+
+
+@pytest.mark.usefixtures("serializer")
+def test_dumps_stringifies_the_rest():
+    """Non string keys and non JSON values are serialized as strings"""
+    when = datetime.date(2023, 4, 1)
+    assert json.loads(dumps({1: when})) == {"1": "2023-04-01"}
+
+
+def test_response_serves_bytes_as_is():
+    """A response of serialized bytes is not serialized again"""
+    body = dumps(DOC)
+    response = FastJSONResponse(body)
+    assert response.body is body
+    assert response.media_type == "application/json"
+    assert FastJSONResponse(DOC).body == body
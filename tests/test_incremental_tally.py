@@ -0,0 +1,322 @@
+"""Tests for the incremental RCV tally engine"""
+
+import json
+import os
+import random
+import subprocess
+
+import pytest
+from incremental_tally import (
+    ContestBallots,
+    IncrementalTallies,
+    IncrementalTally,
+    contest_records,
+    parse_lines,
+    render_lines,
+)
+
+MOCK_TALLY = os.path.join(
+    os.path.dirname(__file__),
+    "..",
+    "src",
+    "vtp",
+    "web",
+    "api",
+    "mock-data",
+    "tally-election-doc.json",
+)
+
+# the US senate contest of the mock election
+SENATE = {
+    "uid": "0001",
+    "name": "US senate",
+    "tally": "rcv",
+    "choices": [
+        {"name": "Anthony Alpha"},
+        {"name": "Betty Beta"},
+        {"name": "Gloria Gamma"},
+        {"name": "David Delta"},
+        {"name": "Emily Echo"},
+        {"name": "Francis Foxtrot"},
+    ],
+}
+# the (count, ranked choices) of the ballots reproducing the mock tally
+SENATE_BALLOTS = [
+    (10, "A"),
+    (13, "F"),
+    (8, "BF"),
+    (5, "BA"),
+    (6, "DF"),
+    (2, "DA"),
+    (2, "D"),
+    (4, "EA"),
+    (1, "EBF"),
+    (1, "EF"),
+    (3, "EDA"),
+    (3, "GA"),
+    (3, "GF"),
+    (1, "GBA"),
+    (1, "GB"),
+    (2, "GDA"),
+    (1, "GDF"),
+    # a blank contest - scanned but not counted
+    (1, ""),
+]
+TRACKED = "6ca91dbca44515587f59294107eee63dc480aa7b"
+
+
+def selection(ranking: str) -> list:
+    """Return the selection of a ranking of choice initials"""
+    names = [choice["name"] for choice in SENATE["choices"]]
+    initials = [name[0] for name in names]
+    return [f"{initials.index(i)}: {names[initials.index(i)]}" for i in ranking]
+
+
+def senate_cvrs() -> list:
+    """Return the (digest, CVR) pairs of the senate ballots"""
+    cvrs = []
+    for count, ranking in SENATE_BALLOTS:
+        for _ in range(count):
+            cvrs.append(
+                (f"{len(cvrs):040x}", dict(SENATE, selection=selection(ranking)))
+            )
+    # track the first Francis Foxtrot ballot
+    cvrs[10] = (TRACKED, cvrs[10][1])
+    return cvrs
+
+
+def test_matches_the_backend_tally():
+    """The rendered tally is the one of the backend (the mock data)"""
+    contests = {}
+    IncrementalTally.fold(contests, senate_cvrs())
+    with open(MOCK_TALLY, "r", encoding="utf8") as infile:
+        expected = json.load(infile)["tally-election-doc"]
+    assert render_lines(contest_records(contests["0001"], [TRACKED])) == expected
+
+
+def test_plurality_ties_in_alphabetical_order():
+    """Tied plurality choices are listed alphabetically"""
+    contest = ContestBallots(
+        {
+            "uid": "0002",
+            "name": "governor",
+            "choices": [{"name": "Spencer Cogswell"}, {"name": "Cosmo Spacely"}],
+        }
+    )
+    contest.append("a" * 40, ["0: Spencer Cogswell"])
+    contest.append("b" * 40, ["1: Cosmo Spacely"])
+    _, final = contest_records(contest, [])
+    assert final["counts"] == [["Cosmo Spacely", 1], ["Spencer Cogswell", 1]]
+    assert final["final"]
+
+
+def git(path: str, *args) -> str:
+    """Run a git command in a workspace"""
+    return subprocess.run(
+        ["git", *args], cwd=path, check=True, capture_output=True, text=True
+    ).stdout
+
+
+def commit_cvrs(path: str, cvrs: list):
+    """Commit each CVR as the message of an empty commit"""
+    for _, cvr in cvrs:
+        git(path, "commit", "-q", "--allow-empty", "-m", json.dumps({"CVR": cvr}))
+
+
+@pytest.fixture(name="election_data")
+def fixture_election_data(tmp_path):
+    """An empty git workspace"""
+    git(str(tmp_path), "init", "-q")
+    git(str(tmp_path), "config", "user.email", "test@example.com")
+    git(str(tmp_path), "config", "user.name", "test")
+    git(str(tmp_path), "commit", "-q", "--allow-empty", "-m", "initial commit")
+    return str(tmp_path)
+
+
+def test_incremental_matches_a_full_tally(election_data):
+    """Folding in new CVRs gives the tally of a full re-read"""
+    cvrs = senate_cvrs()
+    commit_cvrs(election_data, cvrs[:30])
+    first = IncrementalTallies.tally(election_data, "0001", "")
+    commit_cvrs(election_data, cvrs[30:])
+    incremental = IncrementalTallies.tally(election_data, "0001", "")
+    full = IncrementalTally(election_data)
+    full.update()
+    assert first != incremental
+    assert incremental == list(full.records("0001", ""))
+    assert IncrementalTallies.stats()["folded_cvrs"] >= len(cvrs) - 30
+
+
+def test_check_prefers_the_recount(election_data):
+    """On a mismatch the recount wins and the ballot stores are rebuilt"""
+    commit_cvrs(election_data, senate_cvrs()[:5])
+    lines = render_lines(IncrementalTallies.tally(election_data, "0001", ""))
+    assert IncrementalTallies.check(election_data, lines, list(lines)) == lines
+    recount = lines[:-1] + ["  ('Anthony Alpha', 0)"]
+    assert IncrementalTallies.check(election_data, lines, recount) == recount
+    assert IncrementalTallies.stats()["heads"] == 0
+    assert IncrementalTallies.stats()["mismatches"] >= 1
+
+
+def test_clones_share_the_ballot_stores(election_data, tmp_path_factory):
+    """The workspaces at the same HEAD share one ballot store"""
+    cvrs = senate_cvrs()
+    commit_cvrs(election_data, cvrs[:40])
+    clones = [str(tmp_path_factory.mktemp("clone")) for _ in range(12)]
+    for clone in clones:
+        git(clone, "clone", "-q", election_data, ".")
+    rebuilds = IncrementalTallies.stats().get("rebuilds", 0)
+    tallies = {id(IncrementalTallies.get(clone)) for clone in clones}
+    assert len(tallies) == 1
+    assert IncrementalTallies.stats().get("rebuilds", 0) <= rebuilds + 1
+    # a new HEAD in one clone is derived from the shared store
+    git(clones[0], "config", "user.email", "test@example.com")
+    git(clones[0], "config", "user.name", "test")
+    commit_cvrs(clones[0], cvrs[40:])
+    folded = IncrementalTallies.stats().get("folded_cvrs", 0)
+    records = IncrementalTallies.tally(clones[0], "0001", "")
+    assert IncrementalTallies.stats()["folded_cvrs"] == folded + len(cvrs) - 40
+    assert IncrementalTallies.stats().get("rebuilds", 0) <= rebuilds + 1
+    full = IncrementalTally(clones[0])
+    full.update()
+    assert records == list(full.records("0001", ""))
+    # the other clones still tally their own HEAD
+    assert (
+        IncrementalTallies.get(clones[1]).checkpoint
+        == git(election_data, "rev-parse", "HEAD").strip()
+    )
+
+
+def reference_rounds(choices: list, ballots: list, win_by: float) -> list:
+    """
+    Return the (counts, eliminated, winners) of each round of an RCV
+    tally, recounting every ballot from scratch each round
+    """
+    continuing = set(choices)
+    rounds = []
+    while True:
+        counts = dict.fromkeys(continuing, 0)
+        for ballot in ballots:
+            top = next((choice for choice in ballot if choice in continuing), None)
+            if top is not None:
+                counts[top] += 1
+        total = sum(counts.values())
+        leader = max(counts.values(), default=0)
+        if total == 0 or leader > win_by * total or len(continuing) <= 1:
+            winners = [choice for choice, count in counts.items() if count == leader]
+            rounds.append((counts, [], sorted(winners) if total else []))
+            return rounds
+        losers = sorted(
+            choice for choice in continuing if counts[choice] == min(counts.values())
+        )
+        if len(losers) == len(continuing):
+            rounds.append((counts, [], losers))
+            return rounds
+        rounds.append((counts, losers, []))
+        continuing.difference_update(losers)
+
+
+def rcv_contest(choices: list, ballots: list) -> ContestBallots:
+    """Return the ballot store of an RCV contest"""
+    contest = ContestBallots(
+        {
+            "uid": "0003",
+            "name": "mayor",
+            "tally": "rcv",
+            "choices": [{"name": choice} for choice in choices],
+        }
+    )
+    for number, ballot in enumerate(ballots):
+        contest.append(
+            f"{number:040x}", [f"{choices.index(name)}: {name}" for name in ballot]
+        )
+    return contest
+
+
+def tallied_rounds(contest: ContestBallots) -> list:
+    """
+    Return the (counts of the continuing choices, eliminated, winners)
+    of each tallied round
+    """
+    rounds = []
+    eliminated = set()
+    for record in contest_records(contest, []):
+        if record["record"] != "round":
+            continue
+        counts = {
+            name: count for name, count in record["counts"] if name not in eliminated
+        }
+        rounds.append((counts, sorted(record["eliminated"]), sorted(record["winners"])))
+        eliminated.update(record["eliminated"])
+    return rounds
+
+
+def test_rcv_come_from_behind_winner():
+    """Transfers over several eliminations elect the first round runner up"""
+    choices = ["Ann", "Bob", "Cal", "Dee", "Eve"]
+    ballots = (
+        [["Ann"]] * 8
+        + [["Bob", "Ann"]] * 2
+        + [["Bob"]] * 5
+        + [["Cal", "Bob"]] * 3
+        + [["Dee", "Cal", "Bob"]] * 3
+        + [["Eve", "Dee", "Bob"]] * 2
+    )
+    contest = rcv_contest(choices, ballots)
+    rounds = [record for record in contest_records(contest, []) if "round" in record]
+    assert [record["eliminated"] for record in rounds] == [
+        ["Eve"],
+        ["Cal"],
+        ["Dee"],
+        [],
+    ]
+    assert rounds[-1]["final"] and rounds[-1]["winners"] == ["Bob"]
+    assert rounds[0]["counts"][0] == ["Ann", 8]
+    assert rounds[-1]["counts"][:2] == [["Bob", 15], ["Ann", 8]]
+    # the eliminated choices follow, the most recently eliminated first
+    assert [name for name, _ in rounds[-1]["counts"][2:]] == ["Dee", "Cal", "Eve"]
+
+
+def test_rcv_matches_a_recount_per_round():
+    """The rerouted piles give the rounds of a from scratch recount"""
+    generator = random.Random(1)
+    choices = ["Ann", "Bob", "Cal", "Dee", "Eve", "Fay"]
+    for _ in range(200):
+        ballots = [
+            generator.sample(choices, generator.randint(0, len(choices)))
+            for _ in range(generator.randint(0, 40))
+        ]
+        assert tallied_rounds(rcv_contest(choices, ballots)) == reference_rounds(
+            choices, ballots, 0.5
+        )
+
+
+def test_parse_lines_inverts_render_lines():
+    """The records parsed from the backend lines are those of the engine"""
+    with open(MOCK_TALLY, "r", encoding="utf8") as infile:
+        lines = json.load(infile)["tally-election-doc"]
+    records = parse_lines(lines)
+    assert render_lines(records) == lines
+    contests = {}
+    IncrementalTally.fold(contests, senate_cvrs())
+    expected = list(contest_records(contests["0001"], [TRACKED]))
+    # the lines only show the tracked digests of the first round
+    for record in expected[2:]:
+        record["tracked"] = []
+    assert records == expected
+
+
+def test_parse_plurality_lines():
+    """A plurality tally parses into a single final round"""
+    contest = ContestBallots(
+        {
+            "uid": "0002",
+            "name": "governor",
+            "choices": [{"name": "Spencer Cogswell"}, {"name": "Cosmo Spacely"}],
+        }
+    )
+    contest.append("a" * 40, ["0: Spencer Cogswell"])
+    contest.append("b" * 40, ["1: Cosmo Spacely"])
+    contest.append("c" * 40, ["1: Cosmo Spacely"])
+    records = list(contest_records(contest, ["a" * 40]))
+    assert parse_lines(render_lines(records)) == records
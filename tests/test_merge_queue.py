@@ -0,0 +1,129 @@
+"""Tests for the batched merge queue"""
+
+import fcntl
+import os
+import threading
+import time
+
+from merge_queue import MergeQueue
+
+
+def recording_merge(failures: int = 0) -> tuple:
+    """Return a merge callable failing its first calls, and its calls"""
+    calls = []
+
+    def merge(flush: bool):
+        calls.append(flush)
+        if len(calls) <= failures:
+            raise RuntimeError("merge failed")
+
+    return merge, calls
+
+
+def merged_queue(path, merge, **kwargs) -> tuple[MergeQueue, list]:
+    """Return a queue on the journal at path and its merged batches"""
+    batches = []
+    queue = MergeQueue(str(path), merge, **kwargs)
+    queue.on_merged(batches.append)
+    return queue, batches
+
+
+def test_journal_is_created_on_use(tmp_path):
+    """A queue that is never used creates no journal"""
+    queue = MergeQueue(str(tmp_path / "queue.db"), recording_merge()[0])
+    assert queue.stats()["depth"] == 0
+    queue.stop()
+    assert not os.listdir(tmp_path)
+
+
+def test_pending_casts_are_replayed_after_a_restart(tmp_path):
+    """The casts journaled before a crash are merged on start up"""
+    path = tmp_path / "queue.db"
+    crashed = MergeQueue(str(path), recording_merge()[0], batch_size=10)
+    for vote_store_id in ("a", "b", "c"):
+        crashed.enqueue(vote_store_id)
+    # never started - the writer died before merging
+    merge, calls = recording_merge()
+    queue, batches = merged_queue(path, merge, batch_size=10)
+    assert queue.stats()["depth"] == 3
+    queue.start()
+    assert queue.flush(timeout=10)
+    queue.stop()
+    assert batches == [["a", "b", "c"]]
+    assert calls == [True]
+
+
+def test_batches_are_bounded(tmp_path):
+    """A full batch is merged without waiting for the max age"""
+    merged = threading.Event()
+    merge, calls = recording_merge()
+    queue, batches = merged_queue(
+        tmp_path / "queue.db",
+        lambda flush: (merge(flush), merged.set()),
+        batch_size=2,
+        max_age=60,
+    )
+    queue.start()
+    for vote_store_id in ("a", "b", "c"):
+        queue.enqueue(vote_store_id)
+    assert merged.wait(10)
+    assert queue.flush(timeout=10)
+    queue.stop()
+    # only the flushed batch flushes the merge operation
+    assert calls == [False, True]
+    assert batches == [[], ["a", "b", "c"]]
+
+
+def test_unflushed_merges_are_not_reported(tmp_path):
+    """
+    The casts merged without a flush, which may keep them unmerged, are
+    only reported once flushed - even when nothing is pending then -
+    though every merge runs the callbacks
+    """
+    merge, calls = recording_merge()
+    queue, batches = merged_queue(tmp_path / "queue.db", merge, max_age=0)
+    queue.start()
+    queue.enqueue("a")
+    deadline = time.monotonic() + 10
+    while queue.stats()["unflushed"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stats = queue.stats()
+    assert queue.flush(timeout=10)
+    queue.stop()
+    assert (stats["depth"], stats["unflushed"]) == (0, 1)
+    assert calls == [False, True]
+    assert batches == [[], ["a"]]
+
+
+def test_failing_batches_are_dead_lettered(tmp_path, monkeypatch):
+    """A batch failing max attempts times no longer blocks the queue"""
+    monkeypatch.setattr(MergeQueue, "_RETRY_DELAY", 0.01)
+    merge, _ = recording_merge(failures=2)
+    queue, batches = merged_queue(tmp_path / "queue.db", merge, max_attempts=2)
+    queue.enqueue("a")
+    queue.start()
+    assert queue.flush(timeout=10)
+    queue.enqueue("b")
+    assert queue.flush(timeout=10)
+    stats = queue.stats()
+    queue.stop()
+    assert batches == [["b"]]
+    assert stats["errors"] == 2
+    assert stats["dead_lettered"] == 1
+    assert stats["dead_letter"] == 1
+
+
+def test_one_writer_holds_the_lease(tmp_path):
+    """A queue waits while another worker process holds the lease"""
+    path = tmp_path / "queue.db"
+    queue, batches = merged_queue(path, recording_merge()[0], max_age=0)
+    with open(f"{path}.lock", "a", encoding="utf8") as lock_file:
+        # flock locks are per open file, as between processes
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        queue.enqueue("a")
+        queue.start()
+        assert not queue.flush(timeout=1)
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    assert queue.flush(timeout=10)
+    queue.stop()
+    assert batches == [["a"]]
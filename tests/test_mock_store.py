@@ -0,0 +1,71 @@
+"""Tests for the resident mock data store"""
+
+import json
+import os
+import types
+
+import mock_store as store_module
+import pytest
+from mock_store import MockStore
+
+
+@pytest.fixture(name="clock")
+def fixture_clock(monkeypatch):
+    """A settable monotonic clock of the store"""
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(
+        store_module, "time", types.SimpleNamespace(monotonic=lambda: clock.now)
+    )
+    return clock
+
+
+def write(path, doc: dict, mtime_ns: int):
+    """Write a JSON document with the given mtime"""
+    path.write_text(json.dumps(doc), encoding="utf8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_documents_and_bodies_are_loaded_once(tmp_path):
+    """The documents are parsed once and their bodies serialized once"""
+    write(tmp_path / "doc.json", {"a": 1}, 1)
+    store = MockStore({"doc": tmp_path / "doc.json"}, bodies=[("doc", "key")])
+    assert store.get("doc") == {"a": 1}
+    body = store.body("doc", "key")
+    assert json.loads(body) == {"key": {"a": 1}}
+    assert store.body("doc", "key") is body
+    assert json.loads(store.body("doc")) == {"a": 1}
+    assert store.stats() == {
+        "documents": 1,
+        "bodies": 2,
+        "loads": 1,
+        "reload_interval": 0,
+    }
+
+
+def test_changed_files_are_reloaded(tmp_path, clock):
+    """A changed file is reloaded on access once the interval has passed"""
+    path = tmp_path / "doc.json"
+    write(path, {"a": 1}, 1)
+    store = MockStore({"doc": path}, reload_interval=5)
+    body = store.body("doc")
+    write(path, {"a": 2}, 2)
+    clock.now += 1
+    assert store.get("doc") == {"a": 1}
+    clock.now += 5
+    assert store.get("doc") == {"a": 2}
+    assert store.body("doc") != body
+    assert store.stats()["loads"] == 2
+
+
+def test_partial_edits_keep_the_previous_documents(tmp_path, clock):
+    """A file that does not parse (yet) keeps the previous documents"""
+    path = tmp_path / "doc.json"
+    write(path, {"a": 1}, 1)
+    store = MockStore({"doc": path}, reload_interval=5)
+    path.write_text('{"a": ', encoding="utf8")
+    os.utime(path, ns=(2, 2))
+    clock.now += 10
+    assert store.get("doc") == {"a": 1}
+    write(path, {"a": 3}, 3)
+    clock.now += 10
+    assert store.get("doc") == {"a": 3}
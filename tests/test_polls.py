@@ -0,0 +1,118 @@
+"""Tests for the polls lifecycle and the cast admission control"""
+
+import asyncio
+
+import pytest
+from polls import Polls, PollsBusy, PollsClosed
+
+
+async def cast(polls: Polls, release: asyncio.Event):
+    """Hold a cast slot until release is set"""
+    async with polls.admit_cast():
+        await release.wait()
+
+
+async def flushed(timeout: float) -> bool:
+    """A flush of the pending merges that drains right away"""
+    return timeout >= 0
+
+
+def test_closed_polls_refuse_casts():
+    """A cast is refused unless the polls are open"""
+
+    async def scenario():
+        polls = Polls(2, 2, 1)
+        polls.close()
+        with pytest.raises(PollsClosed):
+            async with polls.admit_cast():
+                pass
+        polls.open()
+        async with polls.admit_cast():
+            pass
+        return polls.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["refused_closed"] == 1
+    assert stats["completed"] == 1
+
+
+def test_saturated_polls_refuse_casts_as_busy():
+    """Beyond the concurrent and waiting casts a cast is refused as busy"""
+
+    async def scenario():
+        polls = Polls(1, 1, 10)
+        release = asyncio.Event()
+        running = asyncio.create_task(cast(polls, release))
+        waiting = asyncio.create_task(cast(polls, release))
+        await asyncio.sleep(0)
+        assert polls.stats()["in_flight"] == 1
+        assert polls.stats()["waiting"] == 1
+        with pytest.raises(PollsBusy) as refused:
+            async with polls.admit_cast():
+                pass
+        release.set()
+        await asyncio.gather(running, waiting)
+        return polls.stats(), refused.value.retry_after
+
+    stats, retry_after = asyncio.run(scenario())
+    assert retry_after >= 1
+    assert stats["refused_busy"] == 1
+    assert stats["completed"] == 2
+    assert stats["max_in_flight"] == 1
+
+
+def test_waiting_casts_time_out():
+    """A cast waiting longer than the queue timeout is refused as busy"""
+
+    async def scenario():
+        polls = Polls(1, 1, 0.01)
+        release = asyncio.Event()
+        running = asyncio.create_task(cast(polls, release))
+        await asyncio.sleep(0)
+        with pytest.raises(PollsBusy):
+            async with polls.admit_cast():
+                pass
+        release.set()
+        await running
+        return polls.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["refused_busy"] == 1
+    assert stats["waiting"] == 0
+
+
+def test_drain_waits_for_the_in_flight_casts():
+    """A drain closes the polls and waits for the in-flight casts"""
+
+    async def scenario():
+        polls = Polls(2, 2, 1)
+        release = asyncio.Event()
+        running = asyncio.create_task(cast(polls, release))
+        await asyncio.sleep(0)
+        drain = asyncio.create_task(polls.drain(flushed, 10))
+        await asyncio.sleep(0)
+        assert polls.state == "draining"
+        with pytest.raises(PollsClosed):
+            async with polls.admit_cast():
+                pass
+        release.set()
+        await running
+        return await drain, polls.state
+
+    assert asyncio.run(scenario()) == (True, "drained")
+
+
+def test_drain_times_out():
+    """A drain that times out leaves the polls closed"""
+
+    async def scenario():
+        polls = Polls(2, 2, 1)
+        release = asyncio.Event()
+        running = asyncio.create_task(cast(polls, release))
+        await asyncio.sleep(0)
+        drained = await polls.drain(flushed, 0.01)
+        release.set()
+        await running
+        return drained, polls.state
+
+    assert asyncio.run(scenario()) == (False, "closed")
@@ -0,0 +1,68 @@
+"""Tests for the shared read replica"""
+
+import subprocess
+
+import pytest
+from read_replica import CommitIndex, ReadReplica
+
+
+def git(path: str, *args) -> str:
+    """Run a git command in a workspace"""
+    return subprocess.run(
+        ["git", *args], cwd=path, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+def commit(path: str, message: str) -> str:
+    """Commit an empty commit and return its digest"""
+    git(path, "commit", "-q", "--allow-empty", "-m", message)
+    return git(path, "rev-parse", "HEAD")
+
+
+@pytest.fixture(name="replica")
+def fixture_replica(tmp_path):
+    """An empty git workspace"""
+    git(str(tmp_path), "init", "-q", "-b", "main")
+    git(str(tmp_path), "config", "user.email", "test@example.com")
+    git(str(tmp_path), "config", "user.name", "test")
+    commit(str(tmp_path), "initial commit")
+    return str(tmp_path)
+
+
+def test_unmerged_commits_are_not_served(replica):
+    """A commit present but not reachable from HEAD falls back"""
+    merged = commit(replica, "merged CVR")
+    git(replica, "checkout", "-q", "-b", "CVRs/0001")
+    unmerged = commit(replica, "unmerged CVR")
+    git(replica, "checkout", "-q", "main")
+    read_replica = ReadReplica(replica, lambda path: None, interval=0)
+    assert read_replica.has([merged])
+    assert not read_replica.has([unmerged])
+    assert not read_replica.has([merged, unmerged])
+    assert not read_replica.has(["not a digest"])
+    stats = read_replica.stats()
+    assert (stats["reads"], stats["fallbacks"]) == (1, 3)
+
+
+def test_fast_forwards_are_followed(replica):
+    """A merged commit is served once the HEAD moves past it"""
+    index = CommitIndex(replica)
+    first = commit(replica, "first CVR")
+    assert index.contains([first])
+    git(replica, "checkout", "-q", "-b", "CVRs/0001")
+    second = commit(replica, "second CVR")
+    git(replica, "checkout", "-q", "main")
+    assert not index.contains([second])
+    git(replica, "merge", "-q", "--ff-only", "CVRs/0001")
+    assert index.contains([first, second])
+
+
+def test_rewritten_heads_rebuild_the_index(replica):
+    """A HEAD that is not a fast forward drops the unreachable commits"""
+    index = CommitIndex(replica)
+    dropped = commit(replica, "dropped CVR")
+    assert index.contains([dropped])
+    git(replica, "reset", "-q", "--hard", "HEAD~1")
+    kept = commit(replica, "kept CVR")
+    assert index.contains([kept])
+    assert not index.contains([dropped])
@@ -0,0 +1,90 @@
+"""Tests for the response compression"""
+
+import gzip
+
+import pytest
+from response_compression import Compression, EncodedBody
+
+
+@pytest.fixture(name="offered")
+def fixture_offered(monkeypatch):
+    """Offer brotli (preferred) and gzip for the show_contest route"""
+    monkeypatch.setattr(Compression, "_ENCODINGS", ["br", "gzip"])
+    monkeypatch.setattr(Compression, "_ROUTES", {"show_contest"})
+
+
+@pytest.mark.usefixtures("offered")
+@pytest.mark.parametrize(
+    "accept_encoding, encoding",
+    [
+        ("", ""),
+        ("identity", ""),
+        ("gzip", "gzip"),
+        ("gzip, br", "br"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("br;q=0, gzip;q=0.1", "gzip"),
+        ("*", "br"),
+        ("*;q=0.2, br;q=0", "gzip"),
+        ("GZIP;q=oops", ""),
+    ],
+)
+def test_negotiation(accept_encoding, encoding):
+    """The client's highest quality wins, ties go to the server preference"""
+    assert Compression.negotiate("show_contest", accept_encoding) == encoding
+    # a route that does not opt in is never compressed
+    assert Compression.negotiate("get_blank_ballot", accept_encoding) == ""
+
+
+def test_bodies_are_compressed_once_per_encoding(monkeypatch):
+    """An encoded body compresses once per encoding, and small bodies never"""
+    monkeypatch.setattr(Compression, "_MIN_BYTES", 100)
+    compressions = []
+    compress = Compression.compress
+    monkeypatch.setattr(
+        Compression,
+        "compress",
+        lambda body, encoding: compressions.append(encoding)
+        or compress(body, encoding),
+    )
+    body = EncodedBody(b'{"lines": "' + b"x" * 1000 + b'"}')
+    encoding, gzipped = body.encode("gzip")
+    assert encoding == "gzip"
+    assert gzip.decompress(gzipped) == body.body
+    assert body.encode("gzip") == (encoding, gzipped)
+    assert body.encode("") == ("", body.body)
+    assert compressions == ["gzip"]
+    assert EncodedBody(b"{}").encode("gzip") == ("", b"{}")
+
+
+def test_brotli_bodies():
+    """A brotli encoded body decompresses to the body"""
+    brotli = pytest.importorskip("brotli")
+    body = b'{"lines": "' + b"x" * 2000 + b'"}'
+    assert brotli.decompress(Compression.compress(body, "br")) == body
+
+
+def test_immutable_responses_have_an_etag_per_encoding(client):
+    """Each encoding of an immutable response has its own ETag and 304"""
+    receipt = client.post("/web-api/cast_ballot", json={}).json()
+    url = (
+        f"/web-api/show_versioned_receipt/{receipt['vote_store_id']}"
+        f"/{receipt['receipt_digest']}"
+    )
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    gzipped = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert plain.status_code == gzipped.status_code == 200
+    assert "Content-Encoding" not in plain.headers
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.headers["Vary"] == "Accept-Encoding"
+    assert plain.headers["ETag"] != gzipped.headers["ETag"]
+    assert plain.json() == gzipped.json()
+    for response, accept_encoding in ((plain, "identity"), (gzipped, "gzip")):
+        revalidated = client.get(
+            url,
+            headers={
+                "Accept-Encoding": accept_encoding,
+                "If-None-Match": response.headers["ETag"],
+            },
+        )
+        assert revalidated.status_code == 304
+        assert revalidated.headers["ETag"] == response.headers["ETag"]
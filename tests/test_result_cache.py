@@ -0,0 +1,86 @@
+"""Tests for the single-flight LRU result cache"""
+
+import threading
+
+import pytest
+from result_cache import SingleFlightLruCache
+
+
+def test_lru_eviction():
+    """The least recently used entry is evicted first"""
+    cache = SingleFlightLruCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_hit_and_miss():
+    """A computed value is cached"""
+    cache = SingleFlightLruCache(4)
+    assert cache.get_or_compute("key", lambda: "value") == "value"
+    assert cache.get_or_compute("key", lambda: "other") == "value"
+    stats = cache.stats()
+    assert (stats["misses"], stats["hits"]) == (1, 1)
+
+
+def test_single_flight():
+    """Concurrent misses of a key share one computation"""
+    cache = SingleFlightLruCache(4)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return "value"
+
+    results = []
+    leader = threading.Thread(
+        target=lambda: results.append(cache.get_or_compute("key", compute))
+    )
+    leader.start()
+    started.wait()
+    followers = [
+        threading.Thread(
+            target=lambda: results.append(cache.get_or_compute("key", compute))
+        )
+        for _ in range(3)
+    ]
+    for follower in followers:
+        follower.start()
+    # wait for the followers to join the flight
+    while cache.stats()["coalesced"] < 3:
+        threading.Event().wait(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join()
+    assert results == ["value"] * 4
+    assert len(calls) == 1
+
+
+def test_errors_are_not_cached():
+    """A failed computation is raised and computed again next time"""
+    cache = SingleFlightLruCache(4)
+
+    def fail():
+        raise RuntimeError("git failed")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("key", fail)
+    assert cache.get_or_compute("key", lambda: "value") == "value"
+    assert cache.stats()["misses"] == 2
+
+
+def test_disabled():
+    """A zero sized cache computes every time"""
+    cache = SingleFlightLruCache(0)
+    cache.put("key", "value")
+    assert cache.get("key") is None
+    assert cache.get_or_compute("key", lambda: "value") == "value"
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,86 @@
+"""Tests for the simulated backend"""
+
+import json
+import os
+import random
+
+import pytest
+from conftest import API_DIR
+from simulated_backend import SimulatedBackend, SimulatedFailure, _Latency
+
+
+@pytest.fixture(name="backend")
+def fixture_backend(monkeypatch):
+    """The simulated backend of the mock blank ballot, merging on cast"""
+    monkeypatch.setattr(
+        SimulatedBackend,
+        "_BLANK_BALLOT",
+        os.path.join(API_DIR, "mock-data", "blank-ballot.json"),
+    )
+    monkeypatch.setattr(SimulatedBackend, "MERGE_CONTESTS", False)
+    return SimulatedBackend
+
+
+def cast_ballot(backend) -> tuple[list, int]:
+    """Cast the mock cast ballot and return its ballot check and row"""
+    with open(
+        os.path.join(API_DIR, "mock-data", "cast-ballot.json"), "r", encoding="utf8"
+    ) as infile:
+        cast = json.load(infile)
+    ballot_check, vote_index, _, _ = backend.cast_ballot(
+        backend.get_vote_store_id(), cast
+    )
+    return ballot_check, vote_index
+
+
+def test_latency_specs():
+    """The latency specs parse, and a malformed one is refused"""
+    rng = random.Random(0)
+    assert _Latency("fixed:0.5").sample(rng) == 0.5
+    assert 1 <= _Latency("uniform:1:2").sample(rng) <= 2
+    assert _Latency("lognormal:0.1:0.3").sample(rng) > 0
+    assert _Latency("exponential:0.1").sample(rng) >= 0
+    for spec in ("fixed", "uniform:1", "gamma:1:2", "fixed:x"):
+        with pytest.raises(ValueError):
+            _Latency(spec)
+
+
+def test_cast_ballots_verify(backend):
+    """The row of a cast ballot verifies, and a forged digest does not"""
+    ballot_check, vote_index = cast_ballot(backend)
+    doc = backend.verify_ballot_receipt("", ballot_check, vote_index)
+    assert "[GOOD]" in " ".join(doc["ballot-check-doc"])
+    forged = [list(row) for row in ballot_check]
+    forged[vote_index][0] = "0" * 40
+    doc = backend.verify_ballot_receipt("", forged, vote_index)
+    assert (
+        "[ERROR]: ballot receipt INVALID - 1 digest errors" in doc["ballot-check-doc"]
+    )
+
+
+def test_casts_are_tallied_once_merged(backend, monkeypatch):
+    """With MERGE_CONTESTS the CVRs of a cast are only tallied once merged"""
+    monkeypatch.setattr(SimulatedBackend, "MERGE_CONTESTS", True)
+    ballot_check, vote_index = cast_ballot(backend)
+    digest = ballot_check[vote_index][0]
+    assert "webapi_error" in backend.show_contest("", digest)["show-contest-doc"]
+    backend.merge_contests()
+    doc = backend.show_contest("", digest)["show-contest-doc"]
+    assert doc["header"] == [f"commit {digest}"]
+
+
+def test_failures_are_injected(backend, monkeypatch):
+    """An operation fails with the failure rate"""
+    monkeypatch.setattr(SimulatedBackend, "_FAILURE_RATE", 1.0)
+    with pytest.raises(SimulatedFailure):
+        backend.get_blank_ballot()
+
+
+def test_batch_verifies_each_digest_once(backend):
+    """A batch verification verifies a digest shared by its items once"""
+    ballot_check, vote_index = cast_ballot(backend)
+    receipt = {"ballot_check": ballot_check, "row_index": vote_index}
+    results = backend.verify_ballot_batch("", [receipt, receipt, {"uids": ["0001"]}])
+    assert results[0] == results[1]
+    assert len(results[0]["verify_ballot_stdout"]) == len(ballot_check[0])
+    assert "webapi_error" in results[2]
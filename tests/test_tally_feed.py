@@ -0,0 +1,134 @@
+"""Tests for the live tally feed"""
+
+import asyncio
+import json
+import threading
+
+import pytest
+from tally_feed import InvalidSubscription, Subscription, TallyFeed, feed_uids
+
+CONTESTS = {"0001", "0002"}
+
+
+def recording_tally(tallies: list, release: threading.Event = None):
+    """Return a tally callable recording its contests, waiting on release"""
+
+    def tally(uid: str) -> list:
+        tallies.append(uid)
+        if release is not None:
+            release.wait(10)
+        return [f"{uid}: {len(tallies)}"]
+
+    return tally
+
+
+def message(data: bytes) -> dict:
+    """Return a parsed feed message"""
+    return json.loads(data)
+
+
+def test_subscribers_get_the_current_tally():
+    """A subscriber is sent the tally of each subscribed contest"""
+
+    async def scenario():
+        tallies = []
+        feed = TallyFeed(recording_tally(tallies), lambda: CONTESTS)
+        feed.start()
+        first, second = feed.open(), feed.open()
+        await feed.subscribe(first, ["0001"])
+        await feed.subscribe(second, ["0001"])
+        # the second subscriber gets the tally of the first one
+        assert tallies == ["0001"]
+        assert message(await first.receive(1)) == message(await second.receive(1))
+        feed.close(first)
+        feed.close(second)
+        assert feed.stats()["subscribers"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_merges_during_a_round_are_coalesced():
+    """The merges arriving while the tallies run cost one more round"""
+
+    async def scenario():
+        tallies = []
+        release = threading.Event()
+        feed = TallyFeed(recording_tally(tallies, release), lambda: CONTESTS)
+        feed.start()
+        subscription = feed.open()
+        release.set()
+        await feed.subscribe(subscription, ["0001"])
+        release.clear()
+        feed.merged([])
+        await asyncio.sleep(0.1)
+        # the round is tallying - these merges are coalesced
+        for _ in range(5):
+            feed.merged([])
+        release.set()
+        while feed.stats()["rounds"] < 2 or len(tallies) < 3:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        stats = feed.stats()
+        assert (stats["merges"], stats["rounds"], stats["tallies"]) == (6, 2, 3)
+        feed.stop()
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscribers_drop_the_oldest_messages():
+    """A full subscriber queue drops its oldest message"""
+
+    async def scenario():
+        subscription = Subscription(2)
+        for index in range(4):
+            subscription.send(str(index).encode("utf8"))
+        assert subscription.dropped == 2
+        assert await subscription.receive(1) == b"2"
+        assert await subscription.receive(1) == b"3"
+        assert await subscription.receive(0.01) is None
+
+    asyncio.run(scenario())
+
+
+def test_unknown_and_too_many_contests_are_refused():
+    """A subscription to an unknown contest, or to too many, is refused"""
+
+    async def scenario():
+        tallies = []
+        feed = TallyFeed(recording_tally(tallies), lambda: CONTESTS, max_contests=1)
+        feed.start()
+        subscription = feed.open()
+        with pytest.raises(InvalidSubscription, match="unknown contests"):
+            await feed.subscribe(subscription, ["9999"])
+        with pytest.raises(InvalidSubscription, match="at most 1"):
+            await feed.subscribe(subscription, ["0001", "0002"])
+        # nothing was subscribed to, or tallied
+        assert not subscription.uids
+        assert not tallies
+        assert feed.stats()["invalid"] == 2
+
+    asyncio.run(scenario())
+    with pytest.raises(InvalidSubscription):
+        feed_uids({"subscribe": "0001"})
+    assert feed_uids("0001,,0002") == ["0001", "0002"]
+
+
+def test_tallies_of_abandoned_contests_are_not_kept():
+    """A tally finishing after the last subscriber left is not kept"""
+
+    async def scenario():
+        tallies = []
+        release = threading.Event()
+        feed = TallyFeed(recording_tally(tallies, release), lambda: CONTESTS)
+        feed.start()
+        subscription = feed.open()
+        subscribing = asyncio.create_task(feed.subscribe(subscription, ["0001"]))
+        while not tallies:
+            await asyncio.sleep(0.01)
+        feed.close(subscription)
+        release.set()
+        await subscribing
+        # pylint: disable=protected-access
+        assert not feed._latest
+
+    asyncio.run(scenario())
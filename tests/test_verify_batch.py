@@ -0,0 +1,109 @@
+"""Tests for the batch receipt and digest row verification"""
+
+import uuid
+
+import pytest
+from backend import VtpBackend, verify_pairs
+
+
+@pytest.fixture(name="receipt")
+def fixture_receipt(client):
+    """A cast (blank) ballot - its vote store id, ballot check and row"""
+    response = client.post("/web-api/cast_ballot", json={})
+    assert response.status_code == 200
+    return response.json()
+
+
+def batch(client, vote_store_id: str, body: dict):
+    """Post a batch verification"""
+    return client.post(f"/web-api/verify_ballot_batch/{vote_store_id}", json=body)
+
+
+def test_verifies_receipts_and_rows(client, receipt):
+    """Each item gets the verifications of its digests, in order"""
+    ballot_check, row = receipt["ballot_check"], receipt["ballot_row"]
+    pairs, _ = verify_pairs({"ballot_check": ballot_check, "row_index": row})
+    uid, digest = pairs[0]
+    response = batch(
+        client,
+        receipt["vote_store_id"],
+        {
+            "receipts": [{"ballot_check": ballot_check, "row_index": row}],
+            "rows": [
+                {"uids": [uid], "digests": [digest]},
+                {"uids": [uid], "digests": []},
+                {"uids": "0001"},
+            ],
+        },
+    )
+    assert response.status_code == 200
+    results = response.json()
+    verified = results["receipts"][0]["verify_ballot_stdout"]
+    assert len(verified) == len(pairs)
+    assert all("[GOOD]" in " ".join(doc["ballot-check-doc"]) for doc in verified)
+    assert results["rows"][0]["verify_ballot_stdout"] == verified[:1]
+    assert "webapi_error" in results["rows"][1]
+    assert "webapi_error" in results["rows"][2]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"receipts": "not a list"},
+        {"rows": {"uids": [], "digests": []}},
+        {"rows": [["0001"], ["digest"]]},
+    ],
+)
+def test_malformed_batches_are_refused(client, receipt, body):
+    """A batch whose receipts or rows are not lists of objects is a 400"""
+    response = batch(client, receipt["vote_store_id"], body)
+    assert response.status_code == 400
+    assert "webapi_error" in response.json()
+
+
+def test_the_batch_size_is_capped(client, receipt, webapi, monkeypatch):
+    """A batch of more than the batch max items is a 413"""
+    monkeypatch.setattr(webapi, "VERIFY_BATCH_MAX", 2)
+    rows = [{"uids": [], "digests": []}] * 3
+    response = batch(client, receipt["vote_store_id"], {"rows": rows})
+    assert response.status_code == 413
+    response = batch(client, receipt["vote_store_id"], {"rows": rows[:2]})
+    assert response.status_code == 200
+
+
+class CountingOperation:  # pylint: disable=too-few-public-methods
+    """A verify operation counting the digests it verifies"""
+
+    def __init__(self):
+        self.digests = []
+
+    def run(self, receipt_data: list, **_):
+        """Verify a row of digests"""
+        self.digests.extend(receipt_data[1])
+        return {"ballot-check-doc": list(receipt_data[1])}
+
+
+def test_each_digest_is_verified_once():
+    """Digests shared by the items, or by batches, are verified once"""
+    # pylint: disable=protected-access
+    head = uuid.uuid4().hex
+    operation = CountingOperation()
+    ballot_check = [["0001 - US senate", "0002 - governor"], ["a", "b"], ["c", "d"]]
+    items = [
+        {"ballot_check": ballot_check, "row_index": 2},
+        {"uids": ["0001", "0002", "0001"], "digests": ["a", "d", "e"]},
+        {"uids": ["0002"], "digests": ["d"]},
+    ]
+    results = VtpBackend._verify_items(head, operation, items)
+    assert sorted(operation.digests) == ["a", "c", "d", "e"]
+    assert [result["verify_ballot_stdout"] for result in results] == [
+        [{"ballot-check-doc": ["c"]}, {"ballot-check-doc": ["d"]}],
+        [
+            {"ballot-check-doc": ["a"]},
+            {"ballot-check-doc": ["d"]},
+            {"ballot-check-doc": ["e"]},
+        ],
+        [{"ballot-check-doc": ["d"]}],
+    ]
+    VtpBackend._verify_items(head, operation, items[1:])
+    assert len(operation.digests) == 4
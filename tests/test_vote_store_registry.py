@@ -0,0 +1,83 @@
+"""Tests for the vote store registries"""
+
+import time
+
+import pytest
+from vote_store_registry import InMemoryRegistry, SqliteRegistry, open_registry
+
+GUID = "01d963fd74100ee3f36428740a8efd8afd781839"
+
+
+@pytest.fixture(name="registry", params=["memory", "sqlite"])
+def fixture_registry(request, tmp_path):
+    """A registry of each kind with a 10 seconds ttl"""
+    if request.param == "memory":
+        return open_registry("memory", ttl=10)
+    return open_registry(f"sqlite:{tmp_path / 'registry.db'}", ttl=10)
+
+
+@pytest.fixture(name="clock")
+def fixture_clock(monkeypatch):
+    """Control the registry time - clock[0] is the current time"""
+    clock = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    return clock
+
+
+def test_set_and_get(registry):
+    """The registry is dict like"""
+    assert registry.get(GUID) is None
+    assert GUID not in registry
+    registry.set(GUID, "uncast")
+    registry[GUID] = "cast"
+    assert registry.get(GUID) == "cast"
+    assert registry[GUID] == "cast"
+    del registry[GUID]
+    with pytest.raises(KeyError):
+        _ = registry[GUID]
+
+
+def test_ttl(registry, clock):
+    """A vote store expires ttl seconds after it was last seen"""
+    registry.set(GUID, "cast")
+    clock[0] += 5
+    assert registry.get(GUID) == "cast"
+    # seen at +5, so alive until +15
+    clock[0] += 9
+    assert registry.get(GUID) == "cast"
+    clock[0] += 11
+    assert registry.get(GUID) is None
+    assert registry.peek(GUID) == (None, 0.0)
+
+
+def test_expire(registry, clock):
+    """expire drops the vote stores not seen for ttl seconds"""
+    registry.set("a" * 40, "cast")
+    clock[0] += 8
+    registry.set("b" * 40, "cast")
+    clock[0] += 5
+    assert registry.expire() == ["a" * 40]
+    assert registry.peek("b" * 40)[0] == "cast"
+
+
+def test_no_ttl(clock):
+    """A zero ttl never expires"""
+    registry = InMemoryRegistry(ttl=0)
+    registry.set(GUID, "cast")
+    clock[0] += 1e9
+    assert registry.get(GUID) == "cast"
+    assert not registry.expire()
+
+
+def test_sqlite_is_shared(tmp_path):
+    """The SQLite registries of the worker processes share the state"""
+    path = str(tmp_path / "registry.db")
+    SqliteRegistry(path).set(GUID, "cast")
+    assert SqliteRegistry(path).get(GUID) == "cast"
+    assert SqliteRegistry.BLOCKING and not InMemoryRegistry.BLOCKING
+
+
+def test_unknown_registry():
+    """An unknown registry spec is refused"""
+    with pytest.raises(ValueError):
+        open_registry("redis://localhost")
@@ -0,0 +1,60 @@
+"""Tests for the startup warm-up"""
+
+import threading
+
+from warm_up import WarmUp
+
+
+def failing_step():
+    """A warm-up step that fails"""
+    raise RuntimeError("no ElectionData")
+
+
+def test_failed_steps_do_not_stop_the_warm_up():
+    """A failed step is recorded and the next steps still run"""
+    ran = []
+    warm_up = WarmUp(
+        {
+            "imports": lambda: ran.append("imports"),
+            "config": failing_step,
+            "packs": lambda: ran.append("packs"),
+        }
+    )
+    assert not warm_up.ready
+    assert warm_up.stats()["steps"]["imports"] == {"ok": None}
+    warm_up.run()
+    assert warm_up.ready
+    assert ran == ["imports", "packs"]
+    stats = warm_up.stats()
+    assert stats["state"] == "ready"
+    assert stats["steps"]["config"]["ok"] is False
+    assert stats["steps"]["config"]["error"] == "RuntimeError: no ElectionData"
+    assert stats["steps"]["packs"]["ok"] is True
+    # the steps run once
+    warm_up.run()
+    assert ran == ["imports", "packs"]
+
+
+def test_no_steps_are_skipped():
+    """A warm-up without steps is skipped, and ready"""
+    warm_up = WarmUp({})
+    warm_up.run()
+    assert warm_up.ready
+    assert warm_up.stats()["state"] == "skipped"
+
+
+def test_health_is_unavailable_while_warming(client, webapi, monkeypatch):
+    """The health endpoint answers 503 until the warm-up is over"""
+    release = threading.Event()
+    warm_up = WarmUp({"packs": lambda: release.wait(10)})
+    monkeypatch.setattr(webapi, "warm_up", warm_up)
+    response = client.get("/web-api/health")
+    assert response.status_code == 503
+    assert response.json()["status"] == "warming"
+    warming = threading.Thread(target=warm_up.run)
+    warming.start()
+    release.set()
+    warming.join(10)
+    response = client.get("/web-api/health")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
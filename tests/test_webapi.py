@@ -0,0 +1,64 @@
+"""Tests of the web-api endpoints, on the simulated backend"""
+
+from backend import VtpBackend
+from mock_store import MockStore
+
+
+def test_webapi_stats(client):
+    """Test the web-api server statistics"""
+    response = client.get("/web-api/stats")
+    assert response.status_code == 200
+    stats = response.json()
+    assert "executor" in stats
+    # the warm-up ran in the setup pool
+    assert stats["executor"]["setup"]["submitted"] >= 1
+
+
+def test_mock_tally_stream(webapi, monkeypatch):
+    """The mock tally streams the structured records of the real tally"""
+    assert webapi.app
+    # the web-api runs from a directory with the mock data
+    monkeypatch.setattr(VtpBackend, "_MOCK_MODE", True)
+    monkeypatch.setattr(
+        VtpBackend,
+        "_mock_store",
+        MockStore({"tally_contests": "mock-data/tally-election-doc.json"}),
+    )
+    records = list(VtpBackend.tally_contests_stream("", "None", "None"))
+    assert [record["record"] for record in records] == ["contest"] + ["round"] * 4
+    assert [record["eliminated"] for record in records[1:]] == [
+        ["Emily Echo"],
+        ["Gloria Gamma"],
+        ["Betty Beta", "David Delta"],
+        [],
+    ]
+    assert records[-1]["final"] and records[-1]["winners"] == ["Francis Foxtrot"]
+
+
+def test_unmerged_contests_are_not_cached(client, webapi, monkeypatch):
+    """A show contest of a digest not merged yet is not immutable"""
+    monkeypatch.setattr(webapi.VtpBackend, "MERGE_CONTESTS", True)
+    cast = client.post("/web-api/cast_ballot", json={}).json()
+    vote_store_id = cast["vote_store_id"]
+    digests = cast["ballot_check"][int(cast["ballot_row"])]
+    merged = cast["ballot_check"][1 if int(cast["ballot_row"]) > 1 else 2][0]
+    for contests in (digests[0], f"{merged},{digests[0]}"):
+        response = client.get(f"/web-api/show_contest/{vote_store_id}/{contests}")
+        assert response.status_code == 200
+        assert "webapi_error" in response.text
+        assert "immutable" not in response.headers.get("cache-control", "")
+    webapi.VtpBackend.merge_contests(flush=True)
+    for contests in (digests[0], f"{merged},{digests[0]}"):
+        response = client.get(f"/web-api/show_contest/{vote_store_id}/{contests}")
+        assert "webapi_error" not in response.text
+        assert "immutable" in response.headers["cache-control"]
+
+
+def test_simulated_operations_are_metered(client):
+    """The simulated backend operations report their latency metrics"""
+    client.get("/web-api/get_blank_ballot")
+    metrics = client.get("/web-api/metrics").text
+    assert (
+        'vtp_backend_operation_duration_seconds_count{operation="CastBallotOperation"}'
+        in metrics
+    )
@@ -0,0 +1,77 @@
+"""Tests for the workspace read/write locks"""
+
+import threading
+import time
+
+from workspace_locks import WorkspaceLocks
+
+
+def holder(locks, path: str, write: bool, order: list, release: threading.Event):
+    """Return a thread holding a lock of path until release is set"""
+
+    def hold():
+        with locks.hold(path, write=write):
+            order.append("write" if write else "read")
+            release.wait(10)
+
+    thread = threading.Thread(target=hold, daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_for(condition, timeout: float = 10):
+    """Wait until condition() holds"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_readers_share_a_workspace():
+    """Any number of readers hold a workspace at once"""
+    locks = WorkspaceLocks()
+    order = []
+    release = threading.Event()
+    threads = [holder(locks, "ws", False, order, release) for _ in range(3)]
+    wait_for(lambda: len(order) == 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert locks.stats()["modes"]["read"]["acquired"] == 3
+    assert locks.stats()["active"] == 0
+
+
+def test_waiting_writer_blocks_new_readers():
+    """A waiting writer goes before the readers arriving after it"""
+    locks = WorkspaceLocks()
+    order = []
+    first_release = threading.Event()
+    release = threading.Event()
+    first = holder(locks, "ws", False, order, first_release)
+    wait_for(lambda: order == ["read"])
+    writer = holder(locks, "ws", True, order, release)
+    # the writer is waiting - give it time to register as such
+    time.sleep(0.1)
+    reader = holder(locks, "ws", False, order, release)
+    time.sleep(0.1)
+    # neither the writer nor the late reader got in past the first reader
+    assert order == ["read"]
+    first_release.set()
+    release.set()
+    for thread in (first, writer, reader):
+        thread.join()
+    assert order == ["read", "write", "read"]
+
+
+def test_workspaces_are_independent():
+    """A writer of one workspace does not block another workspace"""
+    locks = WorkspaceLocks()
+    order = []
+    release = threading.Event()
+    writer = holder(locks, "a", True, order, release)
+    wait_for(lambda: order == ["write"])
+    with locks.write("b"):
+        pass
+    release.set()
+    writer.join()
+    assert locks.stats()["modes"]["write"]["acquired"] == 2
@@ -0,0 +1,82 @@
+"""Tests for the pool of pre-provisioned GUID workspaces"""
+
+import itertools
+import threading
+
+import pytest
+from workspace_pool import WorkspacePool
+
+
+def provisioner(fail: int = 0):
+    """Return a provision callable handing out numbered guids"""
+    counter = itertools.count()
+    lock = threading.Lock()
+
+    def provision() -> str:
+        with lock:
+            number = next(counter)
+        if number < fail:
+            raise OSError("could not clone")
+        return f"guid-{number}"
+
+    return provision
+
+
+@pytest.fixture(name="pool")
+def fixture_pool():
+    """A started pool of two workspaces"""
+    pool = WorkspacePool(provisioner(), target_size=2)
+    pool.start()
+    yield pool
+    pool.stop()
+
+
+def test_the_pool_refills(pool):
+    """A workspace handed out is replaced in the background"""
+    assert pool.wait_filled(10)
+    guid = pool.acquire()
+    assert not pool.is_ready(guid)
+    assert pool.wait_filled(10)
+    stats = pool.stats()
+    assert (stats["ready"], stats["handed_out"], stats["misses"]) == (2, 1, 0)
+    assert (stats["high_watermark"], stats["low_watermark"]) == (2, 1)
+
+
+def test_acquire_after_stop(pool):
+    """A stopped pool hands out its ready workspaces, then provisions inline"""
+    assert pool.wait_filled(10)
+    pool.stop()
+    handed_out = {pool.acquire(), pool.acquire()}
+    assert handed_out == {"guid-0", "guid-1"}
+    assert pool.acquire() == "guid-2"
+    assert not pool.wait_filled(0.1)
+    stats = pool.stats()
+    assert (stats["handed_out"], stats["misses"], stats["low_watermark"]) == (2, 1, 0)
+
+
+def test_failed_provisioning_is_retried(monkeypatch):
+    """A failed provisioning is counted and retried"""
+    monkeypatch.setattr(WorkspacePool, "_RETRY_DELAY", 0.01)
+    pool = WorkspacePool(provisioner(fail=2), target_size=1)
+    pool.start()
+    try:
+        assert pool.wait_filled(10)
+    finally:
+        pool.stop()
+    assert pool.stats()["errors"] == 2
+    assert pool.is_ready("guid-2")
+
+
+def test_a_disabled_pool_provisions_inline():
+    """A pool of size 0 neither refills nor accounts for the workspaces"""
+    pool = WorkspacePool(provisioner(), target_size=0)
+    pool.start()
+    assert pool.wait_filled(10)
+    assert pool.acquire() == "guid-0"
+    stats = pool.stats()
+    assert (stats["handed_out"], stats["misses"], stats["low_watermark"]) == (
+        0,
+        0,
+        None,
+    )
+    pool.stop()
@@ -0,0 +1,146 @@
+"""Tests for the GUID workspace reaper"""
+
+import contextlib
+import os
+import time
+import types
+
+import pytest
+import vote_store_registry as registry_module
+import workspace_reaper as reaper_module
+from vote_store_registry import InMemoryRegistry, SqliteRegistry
+from workspace_reaper import WorkspaceReaper, last_modified
+
+DAY = 24 * 3600
+
+
+def workspace(root, guid: str, age: float) -> str:
+    """Create a GUID workspace (with a git clone) last modified age seconds ago"""
+    clone = os.path.join(root, guid, "ElectionData")
+    git_dir = os.path.join(clone, ".git")
+    os.makedirs(git_dir)
+    for name in ("index", "HEAD"):
+        with open(os.path.join(git_dir, name), "w", encoding="utf8") as outfile:
+            outfile.write(name)
+    then = time.time() - age
+    for path in (os.path.join(git_dir, "index"), os.path.join(git_dir, "HEAD")):
+        os.utime(path, (then, then))
+    for path in (git_dir, clone, os.path.join(root, guid)):
+        os.utime(path, (then, then))
+    return os.path.join(root, guid)
+
+
+def reaper(root, registry, ready=()) -> WorkspaceReaper:
+    """Return a reaper of the workspaces under root"""
+    return WorkspaceReaper(
+        lambda: sorted(os.listdir(root)),
+        lambda guid: os.path.join(root, guid),
+        registry,
+        lambda guid: guid in ready,
+        lock=lambda guid, write: contextlib.nullcontext(),
+        idle_ttl=DAY,
+        merged_ttl=0,
+        interval=0,
+    )
+
+
+def test_last_modified_sees_git_changes(tmp_path):
+    """A git command touching the index makes the workspace modified"""
+    path = workspace(tmp_path, "a" * 40, DAY)
+    assert time.time() - last_modified(path) >= DAY - 1
+    os.utime(os.path.join(path, "ElectionData", ".git", "index"))
+    assert time.time() - last_modified(path) < 60
+
+
+def test_merged_workspaces_are_reaped(tmp_path):
+    """A merged (and idle) workspace is reaped"""
+    registry = InMemoryRegistry()
+    workspace(tmp_path, "a" * 40, 0)
+    workspace(tmp_path, "b" * 40, 0)
+    registry.set("a" * 40, "merged")
+    registry.set("b" * 40, "cast")
+    workspace_reaper = reaper(tmp_path, registry)
+    workspace_reaper.sweep()
+    assert os.listdir(tmp_path) == ["b" * 40]
+    stats = workspace_reaper.stats()
+    assert (stats["reaped"], stats["workspaces"]) == (1, 1)
+    assert stats["reaped_bytes"] > 0
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_unregistered_workspaces(tmp_path, shared):
+    """Idle unregistered workspaces are only reaped with a shared registry"""
+    registry = (
+        SqliteRegistry(str(tmp_path / "registry.db")) if shared else InMemoryRegistry()
+    )
+    root = tmp_path / "workspaces"
+    workspace(root, "a" * 40, 2 * DAY)
+    workspace(root, "b" * 40, 60)
+    workspace(root, "c" * 40, 2 * DAY)
+    reaper(root, registry, ready=["c" * 40]).sweep()
+    expected = ["b" * 40, "c" * 40] if shared else ["a" * 40, "b" * 40, "c" * 40]
+    assert sorted(os.listdir(root)) == expected
+
+
+def test_idle_cast_workspaces_are_reaped(tmp_path, monkeypatch):
+    """With a memory registry the abandoned cast workspaces are reaped"""
+    registry = InMemoryRegistry()
+    workspace(tmp_path, "a" * 40, 2 * DAY)
+    workspace(tmp_path, "b" * 40, 2 * DAY)
+    workspace(tmp_path, "c" * 40, -2 * DAY)
+    for guid in ("a" * 40, "b" * 40, "c" * 40):
+        registry.set(guid, "cast")
+    # two days later the vote store of b is seen again and c was modified
+    later = types.SimpleNamespace(
+        time=lambda: time.time() + 2 * DAY, monotonic=time.monotonic
+    )
+    monkeypatch.setattr(registry_module, "time", later)
+    monkeypatch.setattr(reaper_module, "time", later)
+    registry.set("b" * 40, "cast")
+    reaper(tmp_path, registry).sweep()
+    assert sorted(os.listdir(tmp_path)) == ["b" * 40, "c" * 40]
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_pooled_workspaces_are_kept(tmp_path, shared):
+    """The pooled workspaces (of any worker) are neither reaped nor expired"""
+    registry = (
+        SqliteRegistry(str(tmp_path / "registry.db"), ttl=1)
+        if shared
+        else InMemoryRegistry(ttl=1)
+    )
+    root = tmp_path / "workspaces"
+    workspace(root, "a" * 40, 2 * DAY)
+    registry.set("a" * 40, "pooled")
+    time.sleep(1.1)
+    assert not registry.expire()
+    reaper(root, registry).sweep()
+    assert os.listdir(root) == ["a" * 40]
+    assert registry.peek("a" * 40)[0] == "pooled"
+
+
+def test_the_usage_of_the_remaining_workspaces(tmp_path, monkeypatch):
+    """The bytes and inodes in use are counted, walking modified workspaces"""
+    registry = InMemoryRegistry()
+    path = workspace(tmp_path, "a" * 40, 60)
+    workspace_reaper = reaper(tmp_path, registry)
+    walked = []
+    real_disk_usage = reaper_module.disk_usage
+    monkeypatch.setattr(
+        reaper_module,
+        "disk_usage",
+        lambda path: walked.append(path) or real_disk_usage(path),
+    )
+    workspace_reaper.sweep()
+    stats = workspace_reaper.stats()
+    # the clone and .git directories and the index and HEAD files
+    assert (stats["workspaces"], stats["inodes"]) == (1, 4)
+    assert stats["bytes"] == real_disk_usage(path)[0]
+    workspace_reaper.sweep()
+    assert len(walked) == 1
+    with open(os.path.join(path, "ElectionData", "README"), "w", encoding="utf8"):
+        pass
+    os.utime(os.path.join(path, "ElectionData", ".git", "index"))
+    workspace_reaper.sweep()
+    assert len(walked) == 2
+    assert workspace_reaper.stats()["inodes"] == 5